@@ -1,4 +1,3 @@
-import requests
 import os
 import logging
 import time
@@ -8,6 +7,28 @@ from slack_bolt.adapter.socket_mode import SocketModeHandler
 from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from loki_exporter import get_exporter
+from agent_dag import build_collaboration_plan
+from fast_router import get_router
+from llm_cache import cached_chat_completion, cached_chat_stream
+from slack_stream import SlackMessageStream
+from slack_api import SlackClient, share_client
+from event_trace import listener_executor, record_events
+from context_packer import context_budget, pack_lines
+from channel_history import ChannelHistory
+from rolling_summary import RollingSummaries, estimate_tokens, summary_update_messages, ts_key
+from scheduler import ChannelScheduler, BUSY_MESSAGE
+from llm_usage import scoped
+from metrics import start_metrics
+from webhook_outbox import get_outbox
+from tracing import span, traced
+from bot_prompts import (
+    SUMMARY_SYSTEM_PROMPT,
+    ROUTER_SYSTEM_PROMPT,
+    TECH_SYSTEM_PROMPT,
+    BUSINESS_SYSTEM_PROMPT,
+    SYNTHESIZER_SYSTEM_PROMPT
+)
 
 # 1. Setup Environment
 load_dotenv()
@@ -15,11 +36,27 @@ logging.basicConfig(level=logging.INFO)
 
 # Initialize OpenAI and Slack
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+# SlackClient caches bot/channel metadata, retries 429s and coalesces chat_update bursts
+# EVENT_TRACE_PATH=events.jsonl records incoming events for replay (benchmarks/soak.py)
+app = record_events(share_client(App(
+    client=SlackClient(token=os.environ.get("SLACK_BOT_TOKEN")),
+    listener_executor=listener_executor(),
+)))
 
 # Configuration
 BOT_ID = None  # Will be set on startup
-CONTEXT_LIMIT = 15  # How many previous messages to read
+CONTEXT_LIMIT = int(os.environ.get("CONTEXT_LIMIT", "200"))  # How many previous messages to consider...
+CONTEXT_TOKENS = context_budget(SUMMARY_SYSTEM_PROMPT)        # ...and how many tokens of them to send
+N8N_WEBHOOK_URL = os.environ.get("N8N_WEBHOOK_URL", "https://ermai.app.n8n.cloud/webhook/generate-post")
+
+# Local per-channel message cache, fed by conversations.history deltas and message events
+history = ChannelHistory(app.client)
+
+# Running per-channel summaries for "summarize" requests
+summaries = RollingSummaries()
+
+# Bounded worker pool between the listener and the pipelines (caps concurrent OpenAI calls)
+scheduler = ChannelScheduler(name="agent-scheduler")
 
 # Grafana / Loki Configuration
 LOKI_URL = os.environ.get("GRAFANA_URL")
@@ -42,61 +79,52 @@ def create_latency_payload(data_points, timestamp=None):
         output_list.append(record)
     return output_list
 
-def create_token_payload(count, timestamp=None):
+def create_token_savings_payload(window_tokens, sent_tokens, timestamp=None):
     if timestamp is None:
         timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        
+
+    # A long summary plus the new tail can outweigh a short window; that is no saving, not a negative one
     data = {
        "timestamp": timestamp,
-       "Tokens": "Tokens",
-       "count": count
+       "Tokens": "Saved",
+       "count": max(0, window_tokens - sent_tokens),
+       "window": window_tokens,
+       "sent": sent_tokens
+    }
+    return [data]
+
+def create_scheduler_payload(stats, timestamp=None):
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    data = {
+        "timestamp": timestamp,
+        "queue_depth": stats["queue_depth"],
+        "running": stats["running"],
+        "shed": stats["shed"],
+        "avg_wait": stats["avg_wait"],
+        "max_wait": stats["max_wait"]
     }
     return [data]
 
 def push_to_grafana(data_list, loki_url, user_id, api_token, labels={'app': 'token-tracker'}):
-    streams = []
-    for item in data_list:
-        try:
-            dt = datetime.strptime(item['timestamp'], "%Y-%m-%dT%H:%M:%SZ")
-            timestamp_ns = str(int(dt.timestamp() * 1e9))
-            streams.append({
-                "stream": labels,
-                "values": [[timestamp_ns, json.dumps(item)]]
-            })
-        except ValueError as e:
-            logging.warning(f"⚠️ Skipping item due to date error: {e}")
-            continue
-
-    if not streams:
+    """
+    Hands records to the background Loki exporter and returns immediately.
+    The actual HTTP push happens in batches on the exporter's worker thread.
+    """
+    if not loki_url:
         return
 
-    payload = {"streams": streams}
-    
-    try:
-        response = requests.post(
-            loki_url, 
-            json=payload, 
-            headers={"Content-Type": "application/json"}, 
-            auth=(user_id, api_token)
-        )
-        if response.status_code == 204:
-            logging.info(f"✅ Pushed {len(streams)} records to Grafana.")
-        else:
-            logging.error(f"❌ Grafana Error {response.status_code}: {response.text}")
-    except Exception as e:
-        logging.error(f"❌ Grafana Connection Error: {e}")
+    # Stamp with time_ns() rather than re-parsing item['timestamp'] (second
+    # resolution), so records pushed within the same second stay distinct.
+    exporter = get_exporter(loki_url, user_id, api_token)
+    for item in data_list:
+        exporter.enqueue(labels, time.time_ns(), json.dumps(item))
 
 
 # 2. The "Brain" - Decides to speak and generates content
-def query_llm_agent(conversation_history):
-    system_prompt = """
-    You are a helpful assistant managed by a Viral LinkedIn Bot.
-    YOUR GOAL:
-    - Read the conversation transcript.
-    - Generate a clear, detailed summary of the conversation context or a LinkedIn post draft.
-    OUTPUT FORMAT:
-    - Just the content. No "Here is the summary:" prefixes.
-    """
+def query_llm_agent(conversation_history, on_chunk=None):
+    system_prompt = SUMMARY_SYSTEM_PROMPT
     
     # [DEBUG] Log that we are about to call OpenAI
     logging.info("[DEBUG STAGE 3] Sending context to LLM...")
@@ -105,26 +133,38 @@ def query_llm_agent(conversation_history):
         start_time = time.perf_counter()
         request_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
-        response = client.chat.completions.create(
+        # Streamed so callers can render tokens as they arrive (on_chunk)
+        usage_reports = []
+        parts = []
+        for chunk in cached_chat_stream(
+            client,
+            usage_callback=usage_reports.append,
+            persona="summary",
             model="gpt-4o", 
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"TRANSCRIPT:\n{conversation_history}"}
             ]
-        )
+        ):
+            parts.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+
+        content = "".join(parts)
+        usage = usage_reports[-1] if usage_reports else None
 
         end_time = time.perf_counter()
         latency = end_time - start_time
 
-        if response.usage:
-            prompt_tokens = response.usage.prompt_tokens
-            token_data = create_token_payload(prompt_tokens, request_timestamp)
-            push_to_grafana(token_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-tokens'})
-            
+        # usage is None when the answer came from the response cache
+        # (token usage and cost are accounted centrally, see llm_usage.py)
+        if usage is None:
+            logging.info("[DEBUG STAGE 3] Served from LLM response cache.")
+        else:
             latency_data = create_latency_payload([("LLM_Agent", latency)], request_timestamp)
             push_to_grafana(latency_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-latency'})
 
-        content = response.choices[0].message.content.strip()
+        content = content.strip()
         
         # [DEBUG] Log what the LLM returned
         logging.info(f"[DEBUG STAGE 4] LLM Response received (First 50 chars): {content[:50]}...")
@@ -136,29 +176,183 @@ def query_llm_agent(conversation_history):
 
 
 # 3. Helper: Fetch and format chat history
-def get_chat_context(channel_id):
+def get_chat_messages(channel_id):
+    """Recent channel messages as (ts, "User X: text") pairs, oldest first."""
+    return history.messages(channel_id, CONTEXT_LIMIT)
+
+
+def fold_channel_summary(previous_summary, new_lines):
+    """Incremental rolling-summary update: sends only the summary and the new messages."""
     try:
-        result = app.client.conversations_history(
-            channel=channel_id,
-            limit=CONTEXT_LIMIT
+        content, _ = cached_chat_completion(
+            client,
+            persona="rolling_summary",
+            model="gpt-4o",
+            messages=summary_update_messages(previous_summary, new_lines)
+        )
+    except Exception as e:
+        logging.error(f"Rolling summary error: {e}")
+        return None
+    return content
+
+
+# 4. Pipelines (run on the scheduler's workers, one at a time per channel)
+# Each run is one trace (TRACE_EXPORTER): history, fold, LLM, Slack and n8n stages become spans
+@traced("summarize")
+def summarize_conversation(text, user_id, channel_id, say):
+    # --- EXISTING SUMMARIZATION LOGIC ---
+    logging.info("========================================")
+    logging.info(f"[DEBUG STAGE 1] Accepted User Message: '{text}'")
+    logging.info(f"[DEBUG STAGE 1] From User ID: {user_id}")
+    logging.info("========================================")
+    
+    process_start = time.perf_counter()
+    request_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # 1. Acknowledge receipt
+    say(f"On it! analyzing the recent conversation for you... 🧠")
+
+    # 2. Fetch Context and fold only the messages since the last summary into it
+    logging.info(f"[DEBUG STAGE 2] Fetching conversation history for channel {channel_id}...")
+    # Newest messages that fit the token budget; huge ones (pasted logs) are elided
+    with span("history", channel=channel_id) as s:
+        messages = pack_lines(get_chat_messages(channel_id), CONTEXT_TOKENS)
+        s.set(messages=len(messages))
+    previous_summary, _ = summaries.get(channel_id)
+    with span("summary_fold") as s:
+        summary, folded = summaries.update(
+            channel_id, [(ts_key(ts), line) for ts, line in messages], fold_channel_summary
         )
-        messages = result.get("messages", [])
+        s.set(folded=folded)
+    window = "".join(f"{line}\n" for _, line in messages)
+    if summary:
+        transcript = f"CHANNEL SUMMARY:\n{summary}\n"
+        logging.info(f"[DEBUG STAGE 2] Rolling summary: folded {folded} new message(s)")
+    else:
+        transcript = window  # First fold failed; fall back to the raw window
+
+    # Estimated prompt tokens avoided vs resending the whole window
+    sent = estimate_tokens(transcript)
+    if folded:
+        sent += estimate_tokens(previous_summary) + estimate_tokens("\n".join(line for _, line in messages[-folded:]))
+    savings_data = create_token_savings_payload(estimate_tokens(window), sent, request_timestamp)
+    push_to_grafana(savings_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-tokens'})
+
+    # 3. Ask the Brain (tokens are streamed straight into a Slack message)
+    # An unchanged summary gives an identical prompt, which the LLM cache answers without a call
+    reply = SlackMessageStream(app.client, channel_id, prefix="📝 *Here is the generated content:*\n\n").start()
+    response = query_llm_agent(
+        transcript + "\n[SYSTEM: THE USER HAS EXPLICITLY REQUESTED A POST. GENERATE IT NOW.]",
+        on_chunk=reply.append
+    )
+
+    # 4. Speak / Trigger Webhook
+    if response:
+        # --- PRINT TO SLACK FIRST (already streamed, just finalize) ---
+        reply.finish()
+        
+        payload = {
+            "summary": response,      
+            "user_id": user_id,       
+            "original_text": text     
+        }
+        
+        # --- [DEBUG STAGE 5] ---
+        logging.info("[DEBUG STAGE 5] Preparing to send payload to N8N:")
+        logging.info(json.dumps(payload, indent=2)) 
         
-        transcript = ""
-        for msg in reversed(messages):
-            user = msg.get("user", "Unknown")
-            text = msg.get("text", "")
-            if "subtype" in msg: 
-                continue
-            transcript += f"User {user}: {text}\n"
+        # Written to the local outbox; its dispatcher delivers (and retries) in the background
+        try:
+            with span("n8n_enqueue"):
+                get_outbox().enqueue(N8N_WEBHOOK_URL, payload)
+            logging.info(f"✅ [DEBUG STAGE 6] Queued for n8n.")
+            say("✅ (Also queued for n8n for further processing)")
+            
+        except Exception as e:
+            logging.error(f"Failed to queue for n8n: {e}")
+            say(f"❌ I showed you the content, but failed to queue it for n8n. Error: {e}")
+    else:
+        reply.fail("I couldn't generate a response based on this context. Try chatting a bit more first!")
+
+    # 5. Log Full Process Latency
+    process_end = time.perf_counter()
+    total_latency = process_end - process_start
+    latency_data = create_latency_payload([("Full_Process", total_latency)], request_timestamp)
+    push_to_grafana(latency_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-full-process'})
+
+
+@traced("orchestrate")
+def orchestrate_request(cleaned_text, channel_id, say, logger):
+    # --- NEW ORCHESTRATOR LOGIC ---
+    logging.info(f"Orchestrator triggered for: {cleaned_text}")
+    status_msg = say(f"🧠 *Orchestrator:* Analyzing request...")
+    reply = None
+    
+    try:
+        # Call Router (local fast-path, LLM only when the classifier is unsure)
+        decision, reasoning, route_source = get_router().route(cleaned_text, llm_route)
+        logging.info(f"Routed to {decision} via {route_source} router")
+
+        # Update Status
+        app.client.chat_update(
+            channel=channel_id,
+            ts=status_msg["ts"],
+            text=f"🧠 *Orchestrator:* Routing to *{decision}* Agent.\n_Reasoning: {reasoning}_"
+        )
+
+        # The final answer is streamed into a placeholder message as tokens arrive
+        reply = SlackMessageStream(app.client, channel_id, prefix="*Final Response:*\n\n")
+
+        if decision == "TECH":
+            say(f"🛠️ *Tech Agent* is working...", thread_ts=status_msg["ts"])
+            reply.start()
+            for chunk in stream_llm_response(TECH_SYSTEM_PROMPT, cleaned_text, persona="tech", similar=True):
+                reply.append(chunk)
+
+        elif decision == "BUSINESS":
+            say(f"💼 *Business Agent* is working...", thread_ts=status_msg["ts"])
+            reply.start()
+            for chunk in stream_llm_response(BUSINESS_SYSTEM_PROMPT, cleaned_text, persona="business",
+                                             similar=True):
+                reply.append(chunk)
+
+        elif decision == "BOTH":
+            say(f"🔄 *Collaborating* (Tech ⇄ Business)...", thread_ts=status_msg["ts"])
+            reply.start()
             
-        return transcript
+            # Tech + independent Business pre-analysis run concurrently,
+            # then the Synthesizer reconciles them and streams into the reply.
+            plan = build_collaboration_plan(
+                cleaned_text,
+                TECH_SYSTEM_PROMPT,
+                BUSINESS_SYSTEM_PROMPT,
+                SYNTHESIZER_SYSTEM_PROMPT,
+                stream_llm_response,
+                deliver=reply.append
+            )
+            dag_run = plan.run()
+            dag_run.result("synthesizer")  # re-raises if any agent failed
+            dag_run.result("deliver")      # ...or if streaming into Slack did
+            logging.info(f"[BOTH] {dag_run.timing_summary()}")
+
+            latency_data = create_latency_payload(
+                [(f"Agent_{name}", timing["duration"]) for name, timing in dag_run.timings.items()]
+                + [("Agent_Plan", dag_run.wall_time)]
+            )
+            push_to_grafana(latency_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-latency'})
+
+        # Final Reply
+        reply.finish()
+
     except Exception as e:
-        logging.error(f"History Fetch Error: {e}")
-        return ""
+        logger.error(f"Orchestrator Error: {e}")
+        if reply is not None and reply.ts:
+            reply.fail(f"❌ Something went wrong with the agents: {e}")
+        else:
+            say(f"❌ Something went wrong with the agents: {e}")
 
 
-# 4. Event Listener: The "Ear"
+# 5. Event Listener: The "Ear"
 @app.event("message")
 def handle_message_events(body, say, logger):
     event = body.get("event", {})
@@ -166,6 +360,9 @@ def handle_message_events(body, say, logger):
     user_id = event.get("user")
     channel_id = event.get("channel")
 
+    # Every message (including our own) keeps the local history current
+    history.ingest(event)
+
     # --- FILTER 1: IGNORE SELF ---
     if user_id == BOT_ID:
         return
@@ -178,157 +375,23 @@ def handle_message_events(body, say, logger):
     cleaned_text = text.replace(f"<@{BOT_ID}>", "").strip()
 
     # --- BRANCH: SUMMARIZE vs ORCHESTRATE ---
+    # The work is queued behind earlier requests from this channel; Bolt's thread returns right away
+    # (scoped: its LLM calls are accounted to this pipeline, channel and user)
     if "summarize" in cleaned_text.lower():
-        # --- EXISTING SUMMARIZATION LOGIC ---
-        logging.info("========================================")
-        logging.info(f"[DEBUG STAGE 1] Accepted User Message: '{text}'")
-        logging.info(f"[DEBUG STAGE 1] From User ID: {user_id}")
-        logging.info("========================================")
-        
-        process_start = time.perf_counter()
-        request_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
-
-        # 1. Acknowledge receipt
-        say(f"On it! analyzing the last {CONTEXT_LIMIT} messages for you... 🧠")
-
-        # 2. Fetch Context
-        logging.info(f"[DEBUG STAGE 2] Fetching conversation history for channel {channel_id}...")
-        transcript = get_chat_context(channel_id)
-
-        # 3. Ask the Brain
-        response = query_llm_agent(transcript + "\n[SYSTEM: THE USER HAS EXPLICITLY REQUESTED A POST. GENERATE IT NOW.]")
-
-        # 4. Speak / Trigger Webhook
-        if response:
-            # --- NEW STEP: PRINT TO SLACK FIRST ---
-            say(f"📝 *Here is the generated content:*\n\n{response}")
-            
-            n8n_webhook_url = "https://ermai.app.n8n.cloud/webhook/generate-post" 
-            
-            payload = {
-                "summary": response,      
-                "user_id": user_id,       
-                "original_text": text     
-            }
-            
-            # --- [DEBUG STAGE 5] ---
-            logging.info("[DEBUG STAGE 5] Preparing to send payload to N8N:")
-            logging.info(json.dumps(payload, indent=2)) 
-            
-            try:
-                requests.post(n8n_webhook_url, json=payload)
-                logging.info(f"✅ [DEBUG STAGE 6] Successfully sent to n8n.")
-                say("✅ (Also sent to n8n for further processing)")
-                
-            except Exception as e:
-                logging.error(f"Failed to send to n8n: {e}")
-                say(f"❌ I showed you the content, but failed to send it to n8n. Error: {e}")
-        else:
-            say("I couldn't generate a response based on this context. Try chatting a bit more first!")
-
-        # 5. Log Full Process Latency
-        process_end = time.perf_counter()
-        total_latency = process_end - process_start
-        latency_data = create_latency_payload([("Full_Process", total_latency)], request_timestamp)
-        push_to_grafana(latency_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-full-process'})
-
+        pipeline = scoped(summarize_conversation, pipeline="summarize", channel=channel_id, user=user_id)
+        accepted = scheduler.submit(channel_id, pipeline, text, user_id, channel_id, say)
     else:
-        # --- NEW ORCHESTRATOR LOGIC ---
-        logging.info(f"Orchestrator triggered for: {cleaned_text}")
-        status_msg = say(f"🧠 *Orchestrator:* Analyzing request...")
-        
-        try:
-            # Call Router
-            router_json = get_llm_response(ROUTER_SYSTEM_PROMPT, cleaned_text, json_mode=True)
-            routing_data = json.loads(router_json)
-            decision = routing_data.get("decision", "TECH")
-            reasoning = routing_data.get("reasoning", "")
-
-            # Update Status
-            app.client.chat_update(
-                channel=channel_id,
-                ts=status_msg["ts"],
-                text=f"🧠 *Orchestrator:* Routing to *{decision}* Agent.\n_Reasoning: {reasoning}_"
-            )
-
-            final_response = ""
-
-            if decision == "TECH":
-                say(f"🛠️ *Tech Agent* is working...", thread_ts=status_msg["ts"])
-                final_response = get_llm_response(TECH_SYSTEM_PROMPT, cleaned_text)
+        pipeline = scoped(orchestrate_request, pipeline="orchestrate", channel=channel_id, user=user_id)
+        accepted = scheduler.submit(channel_id, pipeline, cleaned_text, channel_id, say, logger)
 
-            elif decision == "BUSINESS":
-                say(f"💼 *Business Agent* is working...", thread_ts=status_msg["ts"])
-                final_response = get_llm_response(BUSINESS_SYSTEM_PROMPT, cleaned_text)
+    if not accepted:
+        say(BUSY_MESSAGE)
+    scheduler_data = create_scheduler_payload(scheduler.stats())
+    push_to_grafana(scheduler_data, LOKI_URL, USER_ID, API_TOKEN, labels={'app': 'slack-bot-scheduler'})
 
-            elif decision == "BOTH":
-                say(f"🔄 *Collaborating* (Tech ⇄ Business)...", thread_ts=status_msg["ts"])
-                
-                # Step A: Tech
-                tech_res = get_llm_response(TECH_SYSTEM_PROMPT, cleaned_text)
-                
-                # Step B: Business (Critique)
-                biz_context = f"User Query: {cleaned_text}\n\nTech Proposal: {tech_res}\n\nTask: Analyze cost/ROI."
-                biz_res = get_llm_response(BUSINESS_SYSTEM_PROMPT, biz_context)
 
-                # Step C: Synthesize
-                syn_context = f"Query: {cleaned_text}\n\nTech: {tech_res}\n\nBusiness: {biz_res}"
-                final_response = get_llm_response(SYNTHESIZER_SYSTEM_PROMPT, syn_context)
-
-            # Final Reply
-            say(f"*Final Response:*\n\n{final_response}")
-
-        except Exception as e:
-            logger.error(f"Orchestrator Error: {e}")
-            say(f"❌ Something went wrong with the agents: {e}")
-
-
-# --- ORCHESTRATOR PROMPTS ---
-ROUTER_SYSTEM_PROMPT = """
-You are the Principal Orchestrator for a multi-agent system.
-Your goal is to route user requests to the correct specialized agent.
-
-AGENTS AVAILABLE:
-1. Tech Agent: Senior Staff Engineer. Handles system design, architecture, code patterns.
-2. Business Agent: Financial Planner. Handles budgeting, costs, ROI, strategy.
-
-INSTRUCTIONS:
-- Analyze the user's input.
-- Decide if it requires the "TECH" agent, the "BUSINESS" agent, or "BOTH".
-- "BOTH" is used when a request involves technical implementation AND cost/business implications.
-
-OUTPUT FORMAT (JSON ONLY):
-{
-  "decision": "TECH" | "BUSINESS" | "BOTH",
-  "reasoning": "Brief explanation"
-}
-"""
-
-TECH_SYSTEM_PROMPT = """
-You are an AI agent acting as a Senior Staff Software Engineer specializing in system design 
-and technical architecture. 
-Your Core Responsibilities:
-- High-level system design (APIs, data flow, services, scalability).
-- Architectural decision-making (Monolith vs Microservices, SQL vs NoSQL).
-- Engineering best practices (Observability, Testing strategies).
-"""
-
-BUSINESS_SYSTEM_PROMPT = """
-You are an AI agent acting as a Corporate Financial Planner and Business Strategist.
-Your Core Responsibilities:
-- Analyze costs (Cloud spend, headcount, licensing).
-- Evaluate ROI (Return on Investment) and TCO (Total Cost of Ownership).
-- Assess business risks and strategic alignment.
-"""
-
-SYNTHESIZER_SYSTEM_PROMPT = """
-You are the Final Synthesizer.
-You have received inputs from two specialized agents (Tech and Business).
-Combine their insights into a single, cohesive, professional Slack response.
-Use Slack formatting (bolding, bullet points) to make it readable.
-"""
-
-def get_llm_response(system_prompt, user_input, model="gpt-4o", json_mode=False):
+def get_llm_response(system_prompt, user_input, model="gpt-4o", json_mode=False, bypass_cache=False, persona=None,
+                     similar=False):
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_input}
@@ -342,18 +405,44 @@ def get_llm_response(system_prompt, user_input, model="gpt-4o", json_mode=False)
         kwargs["response_format"] = {"type": "json_object"}
 
     try:
-        response = client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content
+        content, _ = cached_chat_completion(client, bypass_cache=bypass_cache, persona=persona, similar=similar,
+                                            **kwargs)
+        return content
     except Exception as e:
         logging.error(f"LLM Error: {e}")
         return "Error contacting the AI brain."
 
+def llm_route(user_input):
+    """LLM fallback for the fast-path router. Returns (decision, reasoning)."""
+    router_json = get_llm_response(ROUTER_SYSTEM_PROMPT, user_input, json_mode=True, persona="router", similar=True)
+    routing_data = json.loads(router_json)
+    return routing_data.get("decision", "TECH"), routing_data.get("reasoning", "")
+
+def stream_llm_response(system_prompt, user_input, model="gpt-4o", bypass_cache=False, persona=None, similar=False):
+    """
+    Streaming variant of get_llm_response; yields text chunks as they arrive.
+    similar=True (raw user queries only) also accepts a near-duplicate cached answer.
+    """
+    yield from cached_chat_stream(
+        client,
+        bypass_cache=bypass_cache,
+        persona=persona,
+        similar=similar,
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_input}
+        ],
+        temperature=0.5
+    )
+
 
 # Startup
 if __name__ == "__main__":
-    auth_test = app.client.auth_test()
-    BOT_ID = auth_test["user_id"]
+    BOT_ID = app.client.bot_user_id()
     logging.info(f"Bot started! I am {BOT_ID}")
 
+    start_metrics("agent")   # Scraped through server.py's /metrics
+    get_outbox().start()     # Deliver n8n payloads left over from the previous run
     handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
     handler.start()
\ No newline at end of file
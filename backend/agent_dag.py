@@ -0,0 +1,417 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_usage import usage_scope
+from tracing import span
+
+
+# --- NODE OUTPUT BUFFER ---
+
+class NodeOutput:
+    """
+    Streamed output of one node. The running node writes chunks into it and
+    dependants can either wait for the full text or consume chunks as they arrive.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._chunks = []
+        self._started = False
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._waiters = []     # astream() futures; async runs write on the loop thread only
+
+    def _start(self):
+        with self._cond:
+            self._started = True
+            self._cond.notify_all()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+        self._wake()
+
+    def _finish(self, text=None):
+        with self._cond:
+            if text is not None and text != "".join(self._chunks):
+                self._chunks = [text]
+            self._done = True
+            self._cond.notify_all()
+        self._wake()
+
+    def _fail(self, error):
+        with self._cond:
+            self._error = error
+            self._done = True
+            self._cond.notify_all()
+        self._wake()
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def error(self):
+        return self._error
+
+    def partial(self):
+        """Whatever has been produced so far (never blocks)."""
+        with self._cond:
+            return "".join(self._chunks)
+
+    def stream(self):
+        """Yields chunks as they are produced, until the node finishes."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                if self._error is not None:
+                    raise self._error
+                if index >= len(self._chunks):
+                    return
+                chunk = self._chunks[index]
+            index += 1
+            yield chunk
+
+    async def astream(self):
+        """stream() for AgentDAG.run_async: awaits new chunks instead of blocking the event loop."""
+        index = 0
+        while True:
+            while index >= len(self._chunks) and not self._done:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                await waiter
+            if self._error is not None:
+                raise self._error
+            if index >= len(self._chunks):
+                return
+            chunk = self._chunks[index]
+            index += 1
+            yield chunk
+
+    def result(self, timeout=None):
+        """Blocks until the node is done and returns its full text."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._done, timeout):
+                raise TimeoutError(f"Node '{self.name}' did not finish in time")
+            if self._error is not None:
+                raise self._error
+            return "".join(self._chunks)
+
+
+# --- PLAN ---
+
+class Node:
+    """
+    One agent call in a plan.
+
+    fn(inputs, emit) receives a dict of NodeOutput for its dependencies and an
+    emit(chunk) callback for streaming partial output. Its return value (if not
+    None) becomes the node's final text. Plans run with AgentDAG.run_async()
+    need coroutine functions, reading stream deps with inputs[name].astream().
+
+    deps        -> must be finished before this node starts.
+    stream_deps -> only need to have started; read them with inputs[name].stream().
+    """
+
+    def __init__(self, name, fn, deps=(), stream_deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.stream_deps = tuple(stream_deps)
+
+
+class AgentDAG:
+    def __init__(self, nodes):
+        self.nodes = {node.name: node for node in nodes}
+        for node in nodes:
+            for dep in node.deps + node.stream_deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Node '{node.name}' depends on unknown node '{dep}'")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle detected at node '{name}'")
+            visiting.add(name)
+            node = self.nodes[name]
+            for dep in node.deps + node.stream_deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.nodes:
+            visit(name)
+
+    def run(self, max_workers=None):
+        """Executes the plan and returns a DAGRun once every node has finished."""
+        dag_run = DAGRun(self)
+        dag_run.execute(max_workers or len(self.nodes))
+        return dag_run
+
+    async def run_async(self):
+        """run() on the running event loop: every node is a task, so fn must be a coroutine function."""
+        for node in self.nodes.values():
+            if not inspect.iscoroutinefunction(node.fn):
+                raise TypeError(f"Node '{node.name}' needs a coroutine function to run on the event loop")
+        dag_run = DAGRun(self)
+        await dag_run.execute_async()
+        return dag_run
+
+
+# --- EXECUTION ---
+
+class DAGRun:
+    def __init__(self, dag):
+        self.dag = dag
+        self.outputs = {name: NodeOutput(name) for name in dag.nodes}
+        self.timings = {}
+        self.wall_time = None
+        self._events = threading.Condition()
+        self._changed = None   # asyncio.Event of an async run
+        self._t0 = None
+
+    def _ready(self, node):
+        for dep in node.deps:
+            if not self.outputs[dep].done:
+                return False
+        for dep in node.stream_deps:
+            if not (self.outputs[dep].started or self.outputs[dep].done):
+                return False
+        return True
+
+    def _upstream_error(self, node):
+        for dep in node.deps + node.stream_deps:
+            error = self.outputs[dep].error
+            if error is not None:
+                return error
+        return None
+
+    def _launch_ready(self, pending, running, launch):
+        """Fails nodes whose dependencies failed and hands the ready ones to launch(node)."""
+        for name, node in list(pending.items()):
+            error = self._upstream_error(node)
+            if error is not None:
+                del pending[name]
+                self.outputs[name]._fail(error)
+                continue
+            if self._ready(node):
+                del pending[name]
+                running.add(name)
+                launch(node)
+
+    def execute(self, max_workers):
+        self._t0 = time.perf_counter()
+        pending = dict(self.dag.nodes)
+        running = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-dag") as pool:
+            # Each node runs in a copy of this context so its span joins the caller's trace
+            def launch(node):
+                pool.submit(contextvars.copy_context().run, self._run_node, node, running)
+
+            with self._events:
+                while pending or running:
+                    self._launch_ready(pending, running, launch)
+                    if pending or running:
+                        self._events.wait(timeout=0.5)
+
+        self.wall_time = time.perf_counter() - self._t0
+
+    async def execute_async(self):
+        self._t0 = time.perf_counter()
+        self._changed = asyncio.Event()
+        pending = dict(self.dag.nodes)
+        running = set()
+        tasks = []
+
+        # Tasks copy the current context, so node spans join the caller's trace here too
+        def launch(node):
+            tasks.append(asyncio.ensure_future(self._run_node_async(node, running)))
+
+        try:
+            while pending or running:
+                self._changed.clear()
+                self._launch_ready(pending, running, launch)
+                if pending or running:
+                    await self._changed.wait()
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:   # Only matters if the caller was cancelled
+                task.cancel()
+
+        self.wall_time = time.perf_counter() - self._t0
+
+    def _notify(self):
+        with self._events:
+            self._events.notify_all()
+        if self._changed is not None:
+            self._changed.set()
+
+    def _begin(self, node):
+        """Marks the node started; returns its (timing, emit, inputs)."""
+        output = self.outputs[node.name]
+        timing = self.timings[node.name] = {"start": time.perf_counter() - self._t0, "first_chunk": None, "end": None}
+        output._start()
+        self._notify()
+
+        def emit(chunk):
+            if timing["first_chunk"] is None and chunk:
+                timing["first_chunk"] = time.perf_counter() - self._t0
+                self._notify()
+            output.write(chunk)
+
+        return timing, emit, {dep: self.outputs[dep] for dep in node.deps + node.stream_deps}
+
+    def _end(self, node, timing, running):
+        timing["end"] = time.perf_counter() - self._t0
+        timing["duration"] = timing["end"] - timing["start"]
+        with self._events:
+            running.discard(node.name)
+            self._events.notify_all()
+        if self._changed is not None:
+            self._changed.set()
+
+    def _run_node(self, node, running):
+        timing, emit, inputs = self._begin(node)
+        try:
+            with span(f"agent.{node.name}") as s, usage_scope(persona=node.name):
+                result = node.fn(inputs, emit)
+                if timing["first_chunk"] is not None:
+                    s.set(first_chunk_s=round(timing["first_chunk"] - timing["start"], 4))
+            self.outputs[node.name]._finish(result)
+        except Exception as e:
+            logging.error(f"Agent node '{node.name}' failed: {e}")
+            self.outputs[node.name]._fail(e)
+        finally:
+            self._end(node, timing, running)
+
+    async def _run_node_async(self, node, running):
+        timing, emit, inputs = self._begin(node)
+        try:
+            with span(f"agent.{node.name}") as s, usage_scope(persona=node.name):
+                result = await node.fn(inputs, emit)
+                if timing["first_chunk"] is not None:
+                    s.set(first_chunk_s=round(timing["first_chunk"] - timing["start"], 4))
+            self.outputs[node.name]._finish(result)
+        except Exception as e:
+            logging.error(f"Agent node '{node.name}' failed: {e}")
+            self.outputs[node.name]._fail(e)
+        finally:
+            self._end(node, timing, running)
+
+    def result(self, name):
+        return self.outputs[name].result()
+
+    def timing_summary(self):
+        """One-line, human readable per-node timings (seconds)."""
+        parts = [
+            f"{name}={t['duration']:.2f}s (start +{t['start']:.2f}s)"
+            for name, t in sorted(self.timings.items(), key=lambda item: item[1]["start"])
+            if t.get("duration") is not None
+        ]
+        total = f"wall={self.wall_time:.2f}s" if self.wall_time is not None else ""
+        return " | ".join(parts + [total])
+
+
+# --- STANDARD PLANS ---
+
+def streaming_node(stream_fn, system_prompt, build_input):
+    """
+    Node fn that streams an agent response; build_input(inputs) -> user message.
+    An async generator stream_fn gives a coroutine node fn (for run_async).
+    """
+    if inspect.isasyncgenfunction(stream_fn):
+        async def afn(inputs, emit):
+            parts = []
+            async for chunk in stream_fn(system_prompt, build_input(inputs)):
+                parts.append(chunk)
+                emit(chunk)
+            return "".join(parts)
+        return afn
+
+    def fn(inputs, emit):
+        parts = []
+        for chunk in stream_fn(system_prompt, build_input(inputs)):
+            parts.append(chunk)
+            emit(chunk)
+        return "".join(parts)
+    return fn
+
+
+def business_preanalysis_input(query):
+    """Business prompt that does not need the Tech answer, so both can run at once."""
+    return (
+        f"User Query: {query}\n\n"
+        "Task: The engineering team is designing a technical solution for this in parallel. "
+        "Analyze the likely cost, ROI, risks and budget constraints of the realistic implementation options."
+    )
+
+
+def reconciliation_input(query, tech_response, business_response):
+    return (
+        f"Query: {query}\n\n"
+        f"Tech: {tech_response}\n\n"
+        f"Business: {business_response}\n\n"
+        "The Business analysis was written without seeing the Tech proposal. "
+        "Reconcile the two: apply the relevant cost/ROI points to the proposed architecture."
+    )
+
+
+def build_collaboration_plan(query, tech_prompt, business_prompt, synthesizer_prompt, stream_fn, deliver=None):
+    """
+    The BOTH path as a DAG: Tech and an independent Business pre-analysis run
+    concurrently, then the Synthesizer reconciles them. Wall time is roughly
+    max(tech, business) + synthesizer instead of the sum of all three.
+
+    stream_fn(system_prompt, user_input) must yield text chunks; an async
+    generator function gives a plan for run_async(). If deliver is given, it is
+    called with each Synthesizer chunk as soon as it is produced.
+    """
+    business_input = business_preanalysis_input(query)
+
+    def synthesis_input(inputs):
+        return reconciliation_input(query, inputs["tech"].result(), inputs["business"].result())
+
+    nodes = [
+        Node("tech", streaming_node(stream_fn, tech_prompt, lambda inputs: query)),
+        Node("business", streaming_node(stream_fn, business_prompt, lambda inputs: business_input)),
+        Node("synthesizer", streaming_node(stream_fn, synthesizer_prompt, synthesis_input),
+             deps=("tech", "business")),
+    ]
+    if deliver is not None and inspect.isasyncgenfunction(stream_fn):
+        async def deliver_node(inputs, emit):
+            async for chunk in inputs["synthesizer"].astream():
+                deliver(chunk)
+        nodes.append(Node("deliver", deliver_node, stream_deps=("synthesizer",)))
+    elif deliver is not None:
+        def deliver_node(inputs, emit):
+            for chunk in inputs["synthesizer"].stream():
+                deliver(chunk)
+        nodes.append(Node("deliver", deliver_node, stream_deps=("synthesizer",)))
+    return AgentDAG(nodes)
@@ -0,0 +1,283 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from agent_dag import build_collaboration_plan
+from bot_prompts import SUMMARY_SYSTEM_PROMPT
+from channel_history import ChannelHistory
+from context_packer import context_budget, pack_lines
+from fast_router import get_router
+from llm_cache import cached_chat_stream
+from llm_usage import usage_scope
+from metrics import COUNTER, GAUGE, register_collector
+from orchestrator import (
+    BUSINESS_SYSTEM_PROMPT,
+    SYNTHESIZER_SYSTEM_PROMPT,
+    TECH_SYSTEM_PROMPT,
+    client,
+    llm_route,
+    stream_agent_response,
+)
+from slack_api import SlackClient
+from tracing import span, trace
+
+load_dotenv()
+
+# --- CONFIG ---
+API_REQUEST_TIMEOUT = float(os.environ.get("API_REQUEST_TIMEOUT", "120"))     # A stream is cut off after this long
+API_MAX_STREAMS = int(os.environ.get("API_MAX_STREAMS", "24"))                # Open streams per process; more get 503
+API_HEARTBEAT_SECONDS = float(os.environ.get("API_HEARTBEAT_SECONDS", "15"))  # Keep-alive comment while waiting
+API_MAX_INPUT_CHARS = int(os.environ.get("API_MAX_INPUT_CHARS", "20000"))
+API_CONTEXT_LIMIT = int(os.environ.get("CONTEXT_LIMIT", "200"))              # Channel messages considered by summarize
+API_HISTORY_RESYNC_SECONDS = float(os.environ.get("API_HISTORY_RESYNC_SECONDS", "30"))
+CONTEXT_TOKENS = context_budget(SUMMARY_SYSTEM_PROMPT)
+
+# Agent names of the orchestrator's prompts, for progress events
+AGENT_NAMES = {
+    TECH_SYSTEM_PROMPT: "tech",
+    BUSINESS_SYSTEM_PROMPT: "business",
+    SYNTHESIZER_SYSTEM_PROMPT: "synthesizer",
+}
+
+_DONE = object()
+
+
+class StreamCancelled(Exception):
+    """Raised inside a pipeline once its client has gone away or its deadline has passed."""
+
+
+# --- SERVER-SENT EVENTS ---
+
+def sse_frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventStream:
+    """
+    Runs work(emit) on its own thread and yields its events as SSE frames.
+
+    emit(event, data) only puts the event on a queue, so the pipeline never
+    waits on the client. While nothing arrives a keep-alive comment is sent
+    every `heartbeat` seconds; after `timeout` seconds an "error" event ends
+    the stream. When the client disconnects (or the deadline passes) the next
+    emit() raises StreamCancelled, which unwinds the pipeline and closes its
+    LLM streams. The pipeline is the root span of its own trace and its LLM
+    calls are accounted to `pipeline`.
+    """
+
+    def __init__(self, pipeline, work, timeout=API_REQUEST_TIMEOUT, heartbeat=API_HEARTBEAT_SECONDS,
+                 on_close=None, **attributes):
+        self.pipeline = pipeline
+        self.work = work
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.on_close = on_close
+        self.attributes = attributes
+        self.request_id = uuid.uuid4().hex[:12]
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._start = time.perf_counter()
+        self.first_token = None
+
+    def emit(self, event, data):
+        if self._cancelled.is_set():
+            raise StreamCancelled(f"{self.pipeline} stream {self.request_id} closed")
+        if event == "token" and self.first_token is None:
+            self.first_token = time.perf_counter() - self._start
+        self._queue.put((event, data))
+
+    def _run(self):
+        with trace(f"api_{self.pipeline}", **self.attributes) as root, \
+                usage_scope(pipeline=f"api_{self.pipeline}"):
+            try:
+                self.work(self.emit)
+                root.set(first_token_s=round(self.first_token, 4) if self.first_token is not None else None)
+                self.emit("done", {
+                    "latency_s": round(time.perf_counter() - self._start, 4),
+                    "first_token_s": round(self.first_token, 4) if self.first_token is not None else None,
+                })
+            except StreamCancelled:
+                root.set(cancelled=True)
+            except Exception as e:
+                logging.error(f"API {self.pipeline} error: {e}")
+                root.set(error=str(e))
+                self._queue.put(("error", {"message": str(e)}))
+            finally:
+                self._queue.put(_DONE)
+
+    def __iter__(self):
+        deadline = self._start + self.timeout
+        try:
+            yield sse_frame("start", {"id": self.request_id, "pipeline": self.pipeline})
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(self._run,),
+                                      name=f"api-{self.pipeline}", daemon=True)
+            worker.start()
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    yield sse_frame("error", {"message": f"Request timed out after {self.timeout:g}s"})
+                    return
+                try:
+                    item = self._queue.get(timeout=min(self.heartbeat, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is _DONE:
+                    return
+                yield sse_frame(*item)
+        finally:
+            # Client gone, deadline passed or finished: stop the pipeline at its next emit()
+            self._cancelled.set()
+            if self.on_close is not None:
+                self.on_close()
+
+
+# --- PIPELINES ---
+
+def _stream_tokens(emit, chunks):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        emit("token", {"text": chunk})
+    return "".join(parts)
+
+
+def orchestrate_work(query):
+    """work(emit) for /api/orchestrate: route, then one agent or the Tech/Business/Synthesizer plan."""
+    def work(emit):
+        emit("status", {"stage": "routing"})
+        decision, reasoning, source = get_router().route(query, llm_route)
+        emit("route", {"decision": decision, "reasoning": reasoning, "source": source})
+
+        if decision in ("TECH", "BUSINESS"):
+            name = decision.lower()
+            prompt = TECH_SYSTEM_PROMPT if decision == "TECH" else BUSINESS_SYSTEM_PROMPT
+            emit("agent", {"name": name, "state": "started"})
+            start = time.perf_counter()
+            _stream_tokens(emit, stream_agent_response(prompt, query, persona=name, similar=True))
+            emit("agent", {"name": name, "state": "done", "duration_s": round(time.perf_counter() - start, 4)})
+            return
+
+        # BOTH: Tech and Business run concurrently, the Synthesizer's tokens are streamed
+        def tracked_stream(system_prompt, user_input):
+            name = AGENT_NAMES.get(system_prompt, "agent")
+            emit("agent", {"name": name, "state": "started"})
+            start = time.perf_counter()
+            yield from stream_agent_response(system_prompt, user_input, persona=name)
+            emit("agent", {"name": name, "state": "done", "duration_s": round(time.perf_counter() - start, 4)})
+
+        plan = build_collaboration_plan(
+            query,
+            TECH_SYSTEM_PROMPT,
+            BUSINESS_SYSTEM_PROMPT,
+            SYNTHESIZER_SYSTEM_PROMPT,
+            tracked_stream,
+            deliver=lambda chunk: emit("token", {"text": chunk})
+        )
+        dag_run = plan.run()
+        for name in ("deliver", "synthesizer"):
+            if isinstance(dag_run.outputs[name].error, StreamCancelled):
+                raise dag_run.outputs[name].error
+        dag_run.result("synthesizer")  # re-raises if any agent failed
+        dag_run.result("deliver")
+        emit("timings", {name: round(t["duration"], 4) for name, t in dag_run.timings.items()
+                         if t.get("duration") is not None})
+    return work
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Channel history over the bot token, for summaries of a Slack channel (None without SLACK_BOT_TOKEN)."""
+    global _history
+    token = os.environ.get("SLACK_BOT_TOKEN")
+    if _history is None and token:
+        with _history_lock:
+            if _history is None:
+                _history = ChannelHistory(SlackClient(token=token), resync_seconds=API_HISTORY_RESYNC_SECONDS)
+    return _history
+
+
+def transcript_lines(messages):
+    """(key, line) items from API messages: plain strings or {"user", "text"} objects."""
+    lines = []
+    for i, message in enumerate(messages):
+        if isinstance(message, dict):
+            line = f"User {message.get('user', 'Unknown')}: {message.get('text', '')}"
+        else:
+            line = str(message)
+        lines.append((i, line))
+    return lines
+
+
+def summarize_work(messages=None, channel=None):
+    """work(emit) for /api/summarize: a summary of the given messages, or of a channel's recent history."""
+    def work(emit):
+        if channel is not None:
+            emit("status", {"stage": "history"})
+            with span("history", channel=channel) as s:
+                items = get_history().messages(channel, API_CONTEXT_LIMIT)
+                s.set(messages=len(items))
+        else:
+            items = transcript_lines(messages)
+        # Newest messages that fit the token budget; huge ones are elided
+        items = pack_lines(items, CONTEXT_TOKENS)
+        if not items:
+            raise ValueError("No messages to summarize")
+        transcript = "".join(f"{line}\n" for _, line in items)
+
+        emit("status", {"stage": "summarizing", "messages": len(items)})
+        _stream_tokens(emit, cached_chat_stream(
+            client,
+            persona="summary",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"TRANSCRIPT:\n{transcript}"}
+            ]
+        ))
+    return work
+
+
+# --- ADMISSION ---
+
+class StreamSlots:
+    """At most `limit` open streams per process; acquire() never blocks (the caller answers 503)."""
+
+    def __init__(self, limit=API_MAX_STREAMS):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.open = 0
+        self.rejected = 0
+        register_collector(self.collect_metrics)
+
+    def acquire(self):
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.open += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+        self._semaphore.release()
+
+    def collect_metrics(self):
+        return [
+            ("slackbot_api_streams_open", GAUGE, "Server-sent event streams currently open.", [({}, self.open)]),
+            ("slackbot_api_streams_rejected_total", COUNTER, "API requests refused because every stream slot was taken.",
+             [({}, self.rejected)]),
+        ]
@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.http_retry.builtin_async_handlers import AsyncRateLimitErrorRetryHandler
+from slack_sdk.web.async_client import AsyncWebClient
+
+import async_runtime as rt
+import orchestrator
+from agent_dag import build_collaboration_plan
+from channel_history import ChannelHistory
+from context_packer import CONTEXT_MAX_MESSAGE_TOKENS, context_budget, pack_lines, truncate_to_tokens
+from bot_prompts import (
+    SUMMARY_SYSTEM_PROMPT,
+    RECAP_ANALYZER_SYSTEM_PROMPT,
+    ROUTER_SYSTEM_PROMPT,
+    TECH_SYSTEM_PROMPT,
+    BUSINESS_SYSTEM_PROMPT,
+    SYNTHESIZER_SYSTEM_PROMPT
+)
+from conversation_store import ConversationStore
+from fast_router import get_router
+from llm_cache import cached_chat_completion
+from llm_usage import event_scope, usage_scope
+from metrics import start_metrics
+from webhook_outbox import get_outbox
+from recap_filter import get_recap_filter, log_decision
+from rolling_summary import RollingSummaries, estimate_tokens, summary_update_messages, ts_key
+from scheduler import AsyncChannelScheduler, BUSY_MESSAGE
+from slack_api import MAX_RETRIES, SLACK_API_URL, SlackClient
+from tracing import span, traced
+
+# asyncio-native runtime for the Slack bots.
+#
+#   python async_bots.py agent          # the agent.py pipelines
+#   python async_bots.py mp3            # the mp3-support.py pipelines
+#   python async_bots.py orchestrator   # the slack_orchestrator.py pipeline
+#
+# Every in-flight conversation is a coroutine, so one process holds hundreds of
+# concurrent LLM / ElevenLabs / n8n waits on a single event-loop thread.
+#
+# The pipelines share their building blocks with the threaded bots: the
+# ChannelHistory cache, RollingSummaries folds, token-budget packing, the
+# per-channel scheduler (AsyncChannelScheduler) and tracing spans. Blocking
+# pieces (history sync, summary folds) run on worker threads via
+# asyncio.to_thread. BOTH runs the same collaboration plan (agent_dag) with
+# AgentDAG.run_async. Known difference from the threaded bots: no per-call LLM
+# latency records (the Full_Process and per-agent records are pushed).
+
+# --- SETUP ---
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+N8N_WEBHOOK_URL = os.environ.get("N8N_WEBHOOK_URL", "https://ermai.app.n8n.cloud/webhook/generate-post")
+AGENT_CONTEXT_LIMIT = int(os.environ.get("CONTEXT_LIMIT", "200"))   # Same as agent.py
+AGENT_CONTEXT_TOKENS = context_budget(SUMMARY_SYSTEM_PROMPT)
+MP3_CONTEXT_LIMIT = 20     # Same as mp3-support.py
+MP3_CONTEXT_TOKENS = context_budget(RECAP_ANALYZER_SYSTEM_PROMPT)
+FOLD_AT = 15               # Same as mp3-support.py
+KEEP_RECENT = 5
+
+loki = rt.AsyncLokiExporter(
+    os.environ.get("GRAFANA_URL"),
+    os.environ.get("GRAFANA_USER_ID"),
+    os.environ.get("GRAFANA_API_TOKEN")
+)
+
+
+class BotState:
+    def __init__(self):
+        self.bot_id = None
+        self.history = None       # agent bot: ChannelHistory (set by register_agent)
+        self.scheduler = None     # agent / mp3 bots: AsyncChannelScheduler
+        self.summaries = RollingSummaries()
+        self.conversations = ConversationStore(max_messages=MP3_CONTEXT_LIMIT)  # mp3 bot only
+
+
+def create_app():
+    client = AsyncWebClient(token=os.environ.get("SLACK_BOT_TOKEN"), base_url=SLACK_API_URL)
+    # Honour Retry-After on HTTP 429 instead of failing the reply
+    client.retry_handlers.append(AsyncRateLimitErrorRetryHandler(max_retry_count=MAX_RETRIES))
+    return AsyncApp(client=client)
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _latency_records(points):
+    # Same records as agent.create_latency_payload
+    timestamp = _timestamp()
+    return [{"timestamp": timestamp, "agent": name, "latency": latency} for name, latency in points]
+
+
+def _token_savings_record(window_tokens, sent_tokens):
+    # Same record as agent.create_token_savings_payload
+    return [{"timestamp": _timestamp(), "Tokens": "Saved", "count": max(0, window_tokens - sent_tokens),
+             "window": window_tokens, "sent": sent_tokens}]
+
+
+def _scheduler_record(stats):
+    return [{"timestamp": _timestamp(), **{key: stats[key] for key in
+                                           ("queue_depth", "running", "shed", "avg_wait", "max_wait")}}]
+
+
+def fold_channel_summary(previous_summary, new_lines):
+    """Rolling-summary fold; RollingSummaries.update calls it on a worker thread (asyncio.to_thread)."""
+    try:
+        content, _ = cached_chat_completion(
+            orchestrator.client,
+            persona="rolling_summary",
+            model="gpt-4o",
+            messages=summary_update_messages(previous_summary, new_lines)
+        )
+    except Exception as e:
+        logging.error(f"Rolling summary error: {e}")
+        return None
+    return content
+
+
+async def _stream_into(reply, chunks):
+    async for chunk in chunks:
+        reply.append(chunk)
+
+
+# --- AGENT BOT (agent.py) ---
+
+def register_agent(app, state):
+    # The cache is synced over a blocking SlackClient on worker threads; events are ingested on the loop
+    state.history = ChannelHistory(SlackClient(token=os.environ.get("SLACK_BOT_TOKEN")))
+    state.scheduler = AsyncChannelScheduler(name="async-agent-scheduler")
+
+    async def llm_route(text):
+        router_json = await rt.chat(ROUTER_SYSTEM_PROMPT, text, json_mode=True, persona="router", similar=True)
+        routing = json.loads(router_json)
+        return routing.get("decision", "TECH"), routing.get("reasoning", "")
+
+    async def get_chat_context(channel_id):
+        """Rolling summary of the channel (or the packed raw window if no fold succeeded yet), as in agent.py."""
+        # Newest messages that fit the token budget; huge ones (pasted logs) are elided
+        with span("history", channel=channel_id) as s:
+            messages = pack_lines(
+                await asyncio.to_thread(state.history.messages, channel_id, AGENT_CONTEXT_LIMIT), AGENT_CONTEXT_TOKENS
+            )
+            s.set(messages=len(messages))
+        previous_summary, _ = state.summaries.get(channel_id)
+        with span("summary_fold") as s:
+            summary, folded = await asyncio.to_thread(
+                state.summaries.update, channel_id, [(ts_key(ts), line) for ts, line in messages], fold_channel_summary
+            )
+            s.set(folded=folded)
+        window = "".join(f"{line}\n" for _, line in messages)
+        transcript = f"CHANNEL SUMMARY:\n{summary}\n" if summary else window
+
+        # Estimated prompt tokens avoided vs resending the whole window
+        sent = estimate_tokens(transcript)
+        if folded:
+            sent += estimate_tokens(previous_summary)
+            sent += estimate_tokens("\n".join(line for _, line in messages[-folded:]))
+        loki.push(_token_savings_record(estimate_tokens(window), sent), {'app': 'slack-bot-tokens'})
+        return transcript
+
+    @traced("summarize")
+    async def summarize(text, user_id, channel_id, say):
+        process_start = time.perf_counter()
+        await say("On it! analyzing the recent conversation for you... 🧠")
+        transcript = await get_chat_context(channel_id)
+        transcript += "\n[SYSTEM: THE USER HAS EXPLICITLY REQUESTED A POST. GENERATE IT NOW.]"
+
+        reply = await rt.AsyncSlackMessageStream(
+            app.client, channel_id, prefix="📝 *Here is the generated content:*\n\n"
+        ).start()
+        try:
+            await _stream_into(reply, rt.stream_chat(SUMMARY_SYSTEM_PROMPT, f"TRANSCRIPT:\n{transcript}",
+                                                       temperature=None, persona="summary"))
+        except Exception as e:
+            logging.error(f"LLM Error: {e}")
+
+        response = reply.full_text().strip()
+        if response:
+            await reply.finish()
+            payload = {"summary": response, "user_id": user_id, "original_text": text}
+            with span("n8n_enqueue"):
+                queued = await rt.post_webhook(N8N_WEBHOOK_URL, payload)
+            if queued:
+                await say("✅ (Also queued for n8n for further processing)")
+            else:
+                await say("❌ I showed you the content, but failed to queue it for n8n.")
+        else:
+            await reply.fail("I couldn't generate a response based on this context. Try chatting a bit more first!")
+
+        loki.push(_latency_records([("Full_Process", time.perf_counter() - process_start)]),
+                  {'app': 'slack-bot-full-process'})
+
+    @traced("orchestrate")
+    async def orchestrate(cleaned_text, channel_id, say, logger):
+        status_msg = await say("🧠 *Orchestrator:* Analyzing request...")
+        reply = None
+        try:
+            decision, reasoning, _ = await get_router().route_async(cleaned_text, llm_route)
+            await app.client.chat_update(
+                channel=channel_id,
+                ts=status_msg["ts"],
+                text=f"🧠 *Orchestrator:* Routing to *{decision}* Agent.\n_Reasoning: {reasoning}_"
+            )
+            reply = rt.AsyncSlackMessageStream(app.client, channel_id, prefix="*Final Response:*\n\n")
+            dag_run = await _run_decision(decision, cleaned_text, reply, say, status_msg["ts"],
+                                          TECH_SYSTEM_PROMPT, BUSINESS_SYSTEM_PROMPT, SYNTHESIZER_SYSTEM_PROMPT)
+            if dag_run is not None:
+                loki.push(_latency_records([(f"Agent_{name}", timing["duration"])
+                                            for name, timing in dag_run.timings.items()]
+                                           + [("Agent_Plan", dag_run.wall_time)]),
+                          {'app': 'slack-bot-latency'})
+            await reply.finish()
+        except Exception as e:
+            logger.error(f"Orchestrator Error: {e}")
+            if reply is not None and reply.ts:
+                await reply.fail(f"❌ Something went wrong with the agents: {e}")
+            else:
+                await say(f"❌ Something went wrong with the agents: {e}")
+
+    @app.event("message")
+    async def handle_message_events(body, say, logger):
+        event = body.get("event", {})
+        text = event.get("text", "")
+        user_id = event.get("user")
+        channel_id = event.get("channel")
+
+        # Every message (including our own) keeps the local history current
+        state.history.ingest(event)
+
+        if user_id == state.bot_id:
+            return
+        if f"<@{state.bot_id}>" not in text:
+            return
+
+        # Queued behind earlier requests from this channel; the scope's labels go with the job
+        cleaned_text = text.replace(f"<@{state.bot_id}>", "").strip()
+        if "summarize" in cleaned_text.lower():
+            with usage_scope(pipeline="summarize", channel=channel_id, user=user_id):
+                accepted = state.scheduler.submit(channel_id, summarize, text, user_id, channel_id, say)
+        else:
+            with usage_scope(pipeline="orchestrate", channel=channel_id, user=user_id):
+                accepted = state.scheduler.submit(channel_id, orchestrate, cleaned_text, channel_id, say, logger)
+
+        if not accepted:
+            await say(BUSY_MESSAGE)
+        loki.push(_scheduler_record(state.scheduler.stats()), {'app': 'slack-bot-scheduler'})
+
+    return {"message": handle_message_events}
+
+
+async def _run_decision(decision, query, reply, say, status_ts, tech_prompt, business_prompt, synthesizer_prompt):
+    """
+    Shared TECH / BUSINESS / BOTH execution for the agent and orchestrator bots.
+    BOTH runs the threaded bots' collaboration plan on the event loop and
+    returns its DAGRun (None for the other decisions).
+    """
+    if decision == "TECH":
+        await say("🛠️ *Tech Agent* is working...", thread_ts=status_ts)
+        await reply.start()
+        await _stream_into(reply, rt.stream_chat(tech_prompt, query, persona="tech", similar=True))
+
+    elif decision == "BUSINESS":
+        await say("💼 *Business Agent* is working...", thread_ts=status_ts)
+        await reply.start()
+        await _stream_into(reply, rt.stream_chat(business_prompt, query, persona="business", similar=True))
+
+    elif decision == "BOTH":
+        await say("🔄 *Collaborating* (Tech ⇄ Business)...", thread_ts=status_ts)
+        await reply.start()
+        # Tech + Business run concurrently, Synthesizer reconciles and streams into the reply
+        plan = build_collaboration_plan(query, tech_prompt, business_prompt, synthesizer_prompt, rt.stream_chat,
+                                        deliver=reply.append)
+        dag_run = await plan.run_async()
+        dag_run.result("synthesizer")  # re-raises if any agent failed
+        dag_run.result("deliver")      # ...or if streaming into Slack did
+        logging.info(f"[BOTH] {dag_run.timing_summary()}")
+        return dag_run
+    return None
+
+
+# --- ORCHESTRATOR BOT (slack_orchestrator.py) ---
+
+def register_orchestrator(app, state):
+    async def llm_route(text):
+        router_json = await rt.chat(orchestrator.ROUTER_SYSTEM_PROMPT, text, temperature=None, json_mode=True,
+                                    persona="router", similar=True)
+        routing = json.loads(router_json)
+        return routing.get("decision"), routing.get("reasoning")
+
+    @app.event("app_mention")
+    @event_scope("orchestrate")
+    @traced("orchestrate")   # One trace per mention, as in slack_orchestrator.py
+    async def handle_mentions(body, say, logger):
+        event = body.get("event", {})
+        text = event.get("text", "")
+        user = event.get("user")
+        channel = event.get("channel")
+
+        cleaned_text = text.replace(f"<@{state.bot_id}>", "").strip()
+        if not cleaned_text:
+            await say(f"Hi <@{user}>! I'm the Multi-Agent Orchestrator. Ask me a question!")
+            return
+
+        status_msg = await say("🧠 *Orchestrator:* Analyzing request...")
+        reply = None
+        try:
+            decision, reasoning, _ = await get_router().route_async(cleaned_text, llm_route)
+            await app.client.chat_update(
+                channel=channel,
+                ts=status_msg["ts"],
+                text=f"🧠 *Orchestrator:* Routing to *{decision}* Agent.\n_Reasoning: {reasoning}_"
+            )
+            reply = rt.AsyncSlackMessageStream(app.client, channel, prefix="*Final Response:*\n\n")
+            await _run_decision(decision, cleaned_text, reply, say, status_msg["ts"],
+                                orchestrator.TECH_SYSTEM_PROMPT, orchestrator.BUSINESS_SYSTEM_PROMPT,
+                                orchestrator.SYNTHESIZER_SYSTEM_PROMPT)
+            await reply.finish()
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            if reply is not None and reply.ts:
+                await reply.fail(f"❌ Something went wrong: {e}")
+            else:
+                await say(f"❌ Something went wrong: {e}")
+
+    return {"app_mention": handle_mentions}
+
+
+# --- MP3 BOT (mp3-support.py) ---
+
+def register_mp3(app, state):
+    state.scheduler = AsyncChannelScheduler(name="async-mp3-scheduler")
+
+    def remember_message(channel_id, line):
+        """Stores the message and returns the analyzer context (pre-joined recent lines plus the rolling summary)."""
+        state.conversations.append(channel_id, truncate_to_tokens(line, CONTEXT_MAX_MESSAGE_TOKENS))
+        summary, watermark = state.summaries.get(channel_id)
+        budget = max(MP3_CONTEXT_TOKENS - estimate_tokens(summary), 0)
+        recent = state.conversations.transcript(channel_id, after=watermark)
+        if estimate_tokens(recent) > budget:
+            unfolded = [(seq, text) for seq, text in state.conversations.recent(channel_id)
+                        if watermark is None or seq > watermark]
+            recent = "\n".join(text for _, text in pack_lines(unfolded, budget))
+        if watermark is None:
+            return recent
+        return f"EARLIER SUMMARY:\n{summary}\n\nRECENT MESSAGES:\n{recent}"
+
+    async def fold_old_messages(channel_id):
+        """Once FOLD_AT messages sit outside the summary, folds all but the newest KEEP_RECENT into it."""
+        _, watermark = state.summaries.get(channel_id)
+        unfolded = [(seq, text) for seq, text in state.conversations.recent(channel_id)
+                    if watermark is None or seq > watermark]
+        if len(unfolded) >= FOLD_AT:
+            await asyncio.to_thread(state.summaries.update, channel_id, unfolded[:-KEEP_RECENT], fold_channel_summary)
+
+    async def run_then_fold(pipeline, event, *args):
+        # Folding runs after the reply, so it never delays it
+        try:
+            await pipeline(event, *args)
+        finally:
+            await fold_old_messages(event.get("channel"))
+
+    async def analyze_and_generate_json(transcript, user_input):
+        try:
+            content = await rt.chat(
+                RECAP_ANALYZER_SYSTEM_PROMPT,
+                f"TRANSCRIPT:\n{transcript}\n\nLATEST USER MESSAGE:\n{user_input}",
+                temperature=None,
+                json_mode=True,
+                persona="recap_analyzer"
+            )
+            return json.loads(content)
+        except Exception as e:
+            logging.error(f"LLM JSON Error: {e}")
+            return None
+
+    async def post(channel_id, text):
+        try:
+            await app.client.chat_postMessage(channel=channel_id, text=text)
+        except Exception as e:
+            logging.error(f"Failed to post message: {e}")
+
+    async def deliver_audio(channel_id, summary_text, logger):
+        await post(channel_id, f"📝 *Here is the generated content:*\n\n{summary_text}")
+        audio_data = await rt.text_to_speech(summary_text)
+        if not audio_data:
+            await post(channel_id, "Error generating audio file.")
+            return
+        try:
+            await app.client.files_upload_v2(
+                channel=channel_id,
+                file=io.BytesIO(audio_data),  # Cached clips are mmaps
+                filename="summary.mp3",
+                title="Audio Recap",
+                initial_comment="🎧 Audio summary generated."
+            )
+        except Exception as e:
+            logger.error(f"Slack upload exception: {e}")
+            await post(channel_id, "Error uploading audio file to Slack.")
+
+    async def process(event, logger, reply, mentioned=False):
+        user_id = event.get("user")
+        text = event.get("text", "") or ""
+        channel_id = event.get("channel")
+        if not user_id or user_id == state.bot_id:
+            return
+
+        transcript = remember_message(channel_id, f"User {user_id}: {text}")
+        # Local pre-filter; mentions are answered by the app_mention handler
+        if not mentioned and f"<@{state.bot_id}>" in text:
+            return
+        with span("recap_filter") as s:
+            call_llm, reason = get_recap_filter().check(channel_id, text, mentioned)
+            s.set(call_llm=call_llm, reason=reason)
+        if not call_llm:
+            return
+        decision_json = await analyze_and_generate_json(transcript, text)
+        if not decision_json:
+            logger.error("Decision JSON is empty; aborting.")
+            if mentioned:
+                await reply("Sorry, I couldn't analyze that message.")
+            return
+        if not mentioned:
+            log_decision(text, decision_json.get("trigger_audio", False), gate=reason)
+
+        if decision_json.get("reply_text"):
+            await reply(decision_json["reply_text"])
+        if decision_json.get("trigger_audio") and decision_json.get("summary_text"):
+            await deliver_audio(event.get("channel"), decision_json["summary_text"], logger)
+
+    @traced("recap_message")
+    async def process_message_event(event, logger):
+        await process(event, logger, lambda text: post(event.get("channel"), text))
+
+    @traced("recap_mention")
+    async def process_app_mention(event, say, logger):
+        await process(event, logger, say, mentioned=True)
+
+    # Handlers only queue the work; replies in a channel stay in arrival order
+    @app.event("message")
+    @event_scope("recap_message")
+    async def handle_message_events(body, logger):
+        event = body.get("event", {})
+        if not state.scheduler.submit(event.get("channel"), run_then_fold, process_message_event, event, logger):
+            # Plain channel chatter is dropped quietly; only mentions get a "busy" reply
+            logger.warning("Scheduler full; skipped message event.")
+
+    @app.event("app_mention")
+    @event_scope("recap_mention")
+    async def handle_app_mention_events(body, say, logger):
+        event = body.get("event", {}) or {}
+        if not state.scheduler.submit(event.get("channel"), run_then_fold, process_app_mention, event, say, logger):
+            await say(BUSY_MESSAGE)
+
+    return {"message": handle_message_events, "app_mention": handle_app_mention_events}
+
+
+BOTS = {
+    "agent": register_agent,
+    "mp3": register_mp3,
+    "orchestrator": register_orchestrator,
+}
+
+
+# --- STARTUP ---
+
+async def build(bot):
+    """Creates the AsyncApp for `bot`, resolves the bot user id and registers its handlers."""
+    app = create_app()
+    state = BotState()
+    auth = await app.client.auth_test()
+    state.bot_id = auth["user_id"]
+    handlers = BOTS[bot](app, state)
+    return app, state, handlers
+
+
+async def main(bot):
+    app, state, _ = await build(bot)
+    logging.info(f"Async {bot} bot started! I am {state.bot_id}")
+    start_metrics(f"async-{bot}")   # Scraped through server.py's /metrics
+    get_outbox().start()            # Deliver n8n payloads left over from the previous run
+    handler = AsyncSocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    try:
+        await handler.start_async()
+    finally:
+        if state.scheduler is not None:
+            await state.scheduler.close()
+        await loki.close()
+        await rt.http.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Slack bot on the asyncio runtime.")
+    parser.add_argument("bot", choices=sorted(BOTS))
+    asyncio.run(main(parser.parse_args().bot))
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from llm_cache import CACHE_ENABLED, lookup_cached, store_cached
+from llm_usage import acreate_completion, record_cache_hit, usage_attributes
+from loki_encoding import encode
+from loki_exporter import BATCH_SIZE, FLUSH_INTERVAL, MAX_QUEUE_SIZE, PUSH_FORMAT, REQUEST_TIMEOUT
+from metrics import EXTERNAL_ERRORS, EXTERNAL_RETRIES
+from slack_stream import CURSOR, MAX_MESSAGE_CHARS, MIN_INTERVAL, UPDATE_INTERVAL
+from tts import (
+    RETRY_BACKOFF, TTS_CHUNK_RETRIES, TTS_CHUNK_TIMEOUT, TTS_WORKERS, clip_key, split_for_tts, stitch_mp3, tts_request
+)
+from tracing import span
+from tts_cache import get_audio_cache
+from webhook_outbox import get_outbox
+
+load_dotenv()
+
+# --- CONFIG ---
+HTTP_MAX_CONNECTIONS = int(os.environ.get("ASYNC_HTTP_MAX_CONNECTIONS", "100"))
+
+# --- SHARED CLIENTS ---
+# One AsyncOpenAI client and one pooled httpx client per process; every
+# in-flight conversation is just a coroutine waiting on these.
+openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+http = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=20),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+)
+
+
+# --- LLM ---
+
+def _chat_kwargs(system_prompt, user_input, model, temperature, json_mode):
+    kwargs = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_input}
+        ]
+    }
+    # Only send temperature when the sync code path does, so cache keys match
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+
+async def chat(system_prompt, user_input, model="gpt-4o", temperature=0.5, json_mode=False, bypass_cache=False,
+               persona=None, similar=False):
+    """Async counterpart of get_llm_response / get_agent_response (shares their cache and accounting)."""
+    kwargs = _chat_kwargs(system_prompt, user_input, model, temperature, json_mode)
+    with span("llm", model=model, stream=False) as s:
+        use_cache = CACHE_ENABLED and not bypass_cache
+        if use_cache:
+            key, target, content = lookup_cached(kwargs, similar)
+            if content is not None:
+                s.set(cache_hit=True)
+                record_cache_hit(model, persona)
+                return content
+
+        response = await acreate_completion(openai_client, persona, **kwargs)
+        content = response.choices[0].message.content
+        if use_cache and content:
+            store_cached(key, target, content)
+        s.set(cache_hit=False, **usage_attributes(response.usage))
+        return content
+
+
+async def stream_chat(system_prompt, user_input, model="gpt-4o", temperature=0.5, bypass_cache=False,
+                      persona=None, similar=False):
+    """Async generator of text chunks (a cache hit is yielded in one piece)."""
+    kwargs = _chat_kwargs(system_prompt, user_input, model, temperature, False)
+    # Not activated: the consumer does its own work (Slack updates, ...) between chunks
+    with span("llm", activate=False, model=model, stream=True) as s:
+        use_cache = CACHE_ENABLED and not bypass_cache
+        if use_cache:
+            key, target, content = lookup_cached(kwargs, similar)
+            if content is not None:
+                s.set(cache_hit=True)
+                record_cache_hit(model, persona)
+                yield content
+                return
+
+        parts = []
+        start = time.perf_counter()
+        stream = await acreate_completion(openai_client, persona, stream=True, **kwargs)
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                s.set(**usage_attributes(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                if not parts:
+                    s.set(first_token_s=round(time.perf_counter() - start, 4))
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        s.set(cache_hit=False)
+
+        if use_cache and parts:
+            store_cached(key, target, "".join(parts))
+
+
+# --- ELEVENLABS / N8N ---
+
+async def _synthesize_chunk(text, previous_text, next_text, limit):
+    cache = get_audio_cache()
+    key = clip_key(text)
+    if cache is not None:
+        audio = cache.get(key)
+        if audio is not None:
+            return audio
+
+    url, headers, payload = tts_request(text, previous_text=previous_text, next_text=next_text)
+    for attempt in range(TTS_CHUNK_RETRIES + 1):
+        if attempt:
+            EXTERNAL_RETRIES.inc(service="elevenlabs")
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            async with limit:
+                response = await http.post(url, json=payload, headers=headers, timeout=TTS_CHUNK_TIMEOUT)
+            if response.status_code == 200:
+                if cache is not None:
+                    cache.set(key, response.content)
+                return response.content
+            logging.error(f"ElevenLabs Error [{response.status_code}]: {response.text[:200]}")
+            EXTERNAL_ERRORS.inc(service="elevenlabs")
+            if response.status_code in (400, 401, 403, 422):
+                return None
+        except Exception as e:
+            logging.error(f"ElevenLabs connection failed: {e}")
+            EXTERNAL_ERRORS.inc(service="elevenlabs")
+    return None
+
+
+async def text_to_speech(text_content):
+    """Async counterpart of tts.synthesize_speech (same chunking and audio cache); returns MP3 bytes or None."""
+    with span("tts", chars=len(text_content)) as s:
+        audio = await _text_to_speech(text_content, s)
+        s.set(bytes=len(audio) if audio else 0)
+        return audio
+
+
+async def _text_to_speech(text_content, s):
+    cache = get_audio_cache()
+    key = clip_key(text_content)
+    if cache is not None:
+        audio = cache.get(key)
+        if audio is not None:
+            s.set(cache_hit=True)
+            return audio
+
+    chunks = split_for_tts(text_content)
+    if not chunks:
+        return None
+    s.set(cache_hit=False, chunks=len(chunks))
+    limit = asyncio.Semaphore(TTS_WORKERS)
+    parts = await asyncio.gather(*(
+        _synthesize_chunk(chunk, chunks[i - 1] if i else None, chunks[i + 1] if i + 1 < len(chunks) else None, limit)
+        for i, chunk in enumerate(chunks)
+    ))
+    if any(part is None for part in parts):
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    audio = stitch_mp3(parts)
+    if cache is not None:
+        cache.set(key, audio)
+    return audio
+
+
+async def post_webhook(url, payload):
+    """
+    Queues the payload in the durable webhook outbox (webhook_outbox.py),
+    which delivers and retries it in the background; returns True once stored.
+    """
+    try:
+        await asyncio.to_thread(get_outbox().enqueue, url, payload)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to queue for n8n: {e}")
+    return False
+
+
+# --- LOKI ---
+
+class AsyncLokiExporter:
+    """
+    asyncio flavour of loki_exporter.LokiExporter: push() never awaits the
+    network; a background task flushes batches over the shared httpx client.
+    """
+
+    def __init__(self, loki_url, user_id, api_token, max_queue_size=MAX_QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, push_format=PUSH_FORMAT):
+        self.loki_url = loki_url
+        self.auth = (user_id or "", api_token or "")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.push_format = push_format
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task = None
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+    def push(self, data_list, labels):
+        if not self.loki_url:
+            return
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        for item in data_list:
+            try:
+                self._queue.put_nowait((labels, time.time_ns(), json.dumps(item)))
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._send(batch)
+
+    async def _send(self, batch):
+        body, headers = encode(batch, self.push_format)
+        try:
+            response = await http.post(self.loki_url, content=body, headers=headers, auth=self.auth,
+                                       timeout=REQUEST_TIMEOUT)
+            if response.status_code == 204:
+                self.sent += len(batch)
+            else:
+                self.failed += len(batch)
+                logging.error(f"❌ Grafana Error {response.status_code}: {response.text}")
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"❌ Grafana Connection Error: {e}")
+
+    async def close(self):
+        """Flush what is queued and stop the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._send(batch)
+
+
+# --- SLACK STREAMING ---
+
+class AsyncSlackMessageStream:
+    """
+    asyncio flavour of slack_stream.SlackMessageStream. append() only buffers;
+    a background task coalesces the buffered text into chat_update calls at
+    most every `interval` seconds, so token consumption never waits on Slack.
+    """
+
+    def __init__(self, client, channel, prefix="", placeholder="_Thinking..._", thread_ts=None,
+                 interval=UPDATE_INTERVAL, max_chars=MAX_MESSAGE_CHARS):
+        self.client = client
+        self.channel = channel
+        self.prefix = prefix
+        self.placeholder = placeholder
+        self.thread_ts = thread_ts
+        self.interval = interval
+        self.max_chars = max_chars
+        self.ts = None
+        self.updates = 0
+        self._sealed = []
+        self._text = ""
+        self._rendered = 0
+        self._dirty = asyncio.Event()
+        self._pump = None
+
+    async def start(self):
+        await self._post(self.prefix + self.placeholder)
+        self._pump = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def append(self, chunk):
+        if chunk:
+            self._text += chunk
+            self._dirty.set()
+
+    async def finish(self, fallback_text=None):
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+        if not self._sealed and not self._text and fallback_text:
+            self._text = fallback_text
+        if self.ts is None:
+            await self._post(self.prefix + self.placeholder)
+        await self._flush(final=True)
+
+    async def fail(self, text):
+        if self._sealed or self._text:
+            await self.finish()
+            await self._post(text)
+            return
+        self.prefix = ""
+        await self.finish(text)
+
+    def full_text(self):
+        return "".join(self._sealed) + self._text
+
+    async def _run(self):
+        first = True
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(MIN_INTERVAL if first else self.interval)
+            first = False
+            self._dirty.clear()
+            await self._flush()
+
+    async def _flush(self, final=False):
+        while len(self.prefix) + len(self._text) > self.max_chars:
+            limit = self.max_chars - len(self.prefix)
+            cut = max(self._text.rfind("\n", 0, limit), self._text.rfind(" ", 0, limit))
+            if cut <= limit // 2:
+                cut = limit
+            head, tail = self._text[:cut], self._text[cut:].lstrip()
+            self._sealed.append(self._text[:len(self._text) - len(tail)])
+            self._text = tail
+            await self._update(head)
+            self.prefix = ""
+            await self._post(self.placeholder)
+        if final or len(self._text) != self._rendered:
+            self._rendered = len(self._text)
+            await self._update((self._text or self.placeholder) if final else self._text + CURSOR)
+
+    async def _post(self, text):
+        try:
+            response = await self.client.chat_postMessage(channel=self.channel, text=text, thread_ts=self.thread_ts)
+            self.ts = response["ts"]
+        except Exception as e:
+            logging.error(f"Slack stream post failed: {e}")
+
+    async def _update(self, text):
+        if self.ts is None:
+            return
+        try:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=self.prefix + text)
+            self.updates += 1
+        except Exception as e:
+            logging.error(f"Slack stream update failed: {e}")
@@ -0,0 +1,198 @@
+"""
+Sync vs async concurrency ceiling for the agent bot.
+
+Fires N simultaneous "@bot <question>" events at agent.py's
+handle_message_events (run on a 10-thread pool, like Bolt's socket-mode
+listener executor, which hands the pipelines to agent.scheduler) and at the async_bots.py twin (all gathered on one event
+loop), against local mock services. Reports throughput, latency percentiles
+and the peak thread count of the bot process.
+
+    python benchmarks/concurrency_ceiling.py --requests 200 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_services import serve_in_subprocess, service_environ  # noqa: E402
+
+SYNC_WORKERS = 10  # slack_bolt SocketModeHandler default concurrency
+QUERY = "How do I fix this python api bug in the database code?"
+
+
+class ThreadSampler:
+    """Tracks the peak threading.active_count() while running."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(mode, latencies, wall_time, peak_threads):
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(latencies) / wall_time, 2),
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "mean_s": round(statistics.mean(latencies), 3),
+        "peak_threads": peak_threads,
+    }
+
+
+def event_body(i, bot_id):
+    return {"event": {"type": "message", "user": f"U{i:05d}", "channel": f"C{i % 50:04d}",
+                      "text": f"<@{bot_id}> {QUERY}", "ts": f"{1700000000 + i}.000100"}}
+
+
+# --- SYNC (agent.py) ---
+
+def run_sync(n):
+    import agent
+
+    logging.getLogger().setLevel(logging.WARNING)  # agent.py configures INFO on import
+    agent.BOT_ID = agent.app.client.bot_user_id()
+    logger = logging.getLogger("benchmark.sync")
+
+    # The listener only queues work on agent.scheduler; time each request to
+    # the end of its pipeline run, not to the listener's return.
+    latencies = []
+    done = threading.Semaphore(0)
+    pipeline = agent.orchestrate_request
+
+    def timed_pipeline(*args, **kwargs):
+        try:
+            pipeline(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+            done.release()
+
+    agent.orchestrate_request = timed_pipeline
+
+    def handle(i):
+        body = event_body(i, agent.BOT_ID)
+        channel = body["event"]["channel"]
+
+        def say(text=None, thread_ts=None, **kwargs):
+            return agent.app.client.chat_postMessage(channel=channel, text=text, thread_ts=thread_ts)
+
+        agent.handle_message_events(body, say, logger)
+
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        start = time.perf_counter()
+        list(pool.map(handle, range(n)))
+        for _ in range(n):
+            done.acquire()
+        wall_time = time.perf_counter() - start
+    agent.orchestrate_request = pipeline
+    return summarize("sync", latencies, wall_time, sampler.peak)
+
+
+# --- ASYNC (async_bots.py) ---
+
+async def _run_async(n):
+    import async_bots
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app, state, handlers = await async_bots.build("agent")
+    handle = handlers["message"]
+    logger = logging.getLogger("benchmark.async")
+
+    # The handler only queues work on state.scheduler; time each request to
+    # the end of its pipeline run, as for the sync bot.
+    latencies = []
+    submit = state.scheduler.submit
+
+    def timed_submit(channel, fn, *args, **kwargs):
+        async def timed_pipeline(*pipeline_args, **pipeline_kwargs):
+            try:
+                await fn(*pipeline_args, **pipeline_kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+        return submit(channel, timed_pipeline, *args, **kwargs)
+
+    state.scheduler.submit = timed_submit
+
+    async def one(i):
+        body = event_body(i, state.bot_id)
+        channel = body["event"]["channel"]
+
+        async def say(text=None, thread_ts=None, **kwargs):
+            return await app.client.chat_postMessage(channel=channel, text=text, thread_ts=thread_ts)
+
+        await handle(body, say, logger)
+
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        await state.scheduler.close()   # Waits for every queued pipeline
+        wall_time = time.perf_counter() - start
+    await async_bots.loki.close()
+    return summarize("async", latencies, wall_time, sampler.peak)
+
+
+def run_async(n):
+    return asyncio.run(_run_async(n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds per mocked completion")
+    parser.add_argument("--mode", choices=("sync", "async", "both"), default="both")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    _, url = serve_in_subprocess(llm_latency=args.llm_latency)
+    os.environ.update(service_environ(url))
+    # Measure the runtime, not the caches or the router corpus
+    os.environ.update(LLM_CACHE_ENABLED="0", SIMILARITY_CACHE_ENABLED="0", ROUTER_LOG_PATH="")
+    os.environ.setdefault("SCHEDULER_MAX_PENDING", str(args.requests))
+
+    results = []
+    if args.mode in ("sync", "both"):
+        results.append(run_sync(args.requests))
+    if args.mode in ("async", "both"):
+        results.append(run_async(args.requests))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<6} {'reqs':>5} {'wall s':>8} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'threads':>8}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['requests']:>5} {r['wall_time_s']:>8} {r['throughput_rps']:>8} "
+              f"{r['p50_s']:>7} {r['p95_s']:>7} {r['peak_threads']:>8}")
+
+
+if __name__ == "__main__":
+    main()
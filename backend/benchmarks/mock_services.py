@@ -0,0 +1,283 @@
+"""
+Local stand-ins for the external services the bots talk to: OpenAI chat
+completions (plain and SSE streaming), the Slack Web API (including file
+uploads), Loki push, the n8n webhook and ElevenLabs TTS. Latencies are
+configurable, with optional jitter (uniform, lognormal or exponential), so
+benchmarks can model real-world waits without a network or API keys.
+
+    services = MockServices(llm_latency=1.0).start()
+    os.environ.update(services.environ())   # before importing the bots
+"""
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def service_environ(url):
+    """Environment variables that point every client at the mock server at `url`."""
+    return {
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{url}/v1",
+        "SLACK_BOT_TOKEN": "xoxb-benchmark",
+        "SLACK_API_URL": f"{url}/api/",
+        "GRAFANA_URL": f"{url}/loki/api/v1/push",
+        "GRAFANA_USER_ID": "benchmark",
+        "GRAFANA_API_TOKEN": "benchmark",
+        "N8N_WEBHOOK_URL": f"{url}/webhook/generate-post",
+        "ELEVENLABS_API_KEY": "benchmark",
+        "ELEVENLABS_BASE_URL": url,
+    }
+
+
+JITTER_DISTRIBUTIONS = ("none", "uniform", "lognormal", "exponential")
+
+
+class MockServices:
+    def __init__(self, llm_latency=1.0, stream_chunks=40, slack_latency=0.02, tts_latency=0.3,
+                 tts_latency_per_char=0.005, tts_failure_rate=0.0, webhook_latency=0.05, loki_latency=0.01,
+                 router_decision="TECH", jitter="none", jitter_scale=0.2, llm_first_token=None, seed=None):
+        self.llm_latency = llm_latency
+        self.stream_chunks = stream_chunks
+        # Share of llm_latency spent before the first streamed token (None = spread evenly)
+        self.llm_first_token = llm_first_token
+        self.slack_latency = slack_latency
+        self.tts_latency = tts_latency
+        self.tts_latency_per_char = tts_latency_per_char
+        self.tts_failure_rate = tts_failure_rate
+        self.webhook_latency = webhook_latency
+        self.loki_latency = loki_latency
+        self.router_decision = router_decision
+        if jitter not in JITTER_DISTRIBUTIONS:
+            raise ValueError(f"jitter must be one of {JITTER_DISTRIBUTIONS}")
+        self.jitter = jitter
+        self.jitter_scale = jitter_scale
+        self._random = random.Random(seed)
+
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+    def start(self):
+        services = self
+
+        class Handler(_Handler):
+            mock = services
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def environ(self):
+        return service_environ(self.url)
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def delay(self, seconds):
+        """`seconds` with jitter applied: uniform ±scale, lognormal (sigma=scale, same median) or exponential tail."""
+        if seconds <= 0 or self.jitter == "none":
+            return max(seconds, 0)
+        with self._lock:
+            if self.jitter == "uniform":
+                return seconds * self._random.uniform(1 - self.jitter_scale, 1 + self.jitter_scale)
+            if self.jitter == "lognormal":
+                return seconds * self._random.lognormvariate(0, self.jitter_scale)
+            return seconds * (1 - self.jitter_scale) + self._random.expovariate(1 / (seconds * self.jitter_scale))
+
+    def wait(self, seconds):
+        time.sleep(self.delay(seconds))
+
+    # --- CANNED RESPONSES ---
+
+    def completion_text(self, request):
+        system_prompt = request["messages"][0]["content"]
+        if request.get("response_format"):
+            if "Orchestrator" in system_prompt:
+                return json.dumps({"decision": self.router_decision, "reasoning": "mock router"})
+            latest = request["messages"][-1]["content"].rpartition("LATEST USER MESSAGE:")[2]
+            if "recap" in latest.lower():
+                summary = "The team agreed on the launch plan and owners for the open items. " * 4
+                return json.dumps({"trigger_audio": True, "reply_text": "Recording your recap!",
+                                   "summary_text": summary.strip()})
+            return json.dumps({"trigger_audio": False, "reply_text": "Sure!", "summary_text": ""})
+        return " ".join(f"token{i}" for i in range(self.stream_chunks))
+
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames of ~26 ms
+_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+_ID3_HEADER = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+
+
+def mock_mp3(chars):
+    """A structurally valid MP3 roughly as long as `chars` characters of speech (~15 chars/s)."""
+    return _ID3_HEADER + _MP3_FRAME * max(1, int(chars * 2.6))
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-stream (e.g. at benchmark shutdown) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0]
+
+        if path.endswith("/chat/completions"):
+            return self._openai(json.loads(raw))
+        if path.startswith("/api/"):
+            return self._slack(path[len("/api/"):], raw)
+        if path.startswith("/loki/"):
+            self.mock.count("loki")
+            self.mock.wait(self.mock.loki_latency)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path.startswith("/webhook/"):
+            self.mock.count("n8n")
+            self.mock.wait(self.mock.webhook_latency)
+            return self._send({"ok": True})
+        if path.startswith("/v1/text-to-speech/"):
+            return self._tts(json.loads(raw))
+        if path.startswith("/upload/"):
+            self.mock.count("slack.upload")
+            self.mock.wait(self.mock.slack_latency)
+            return self._send(b"OK", content_type="text/plain")
+        self._send({"error": "not found"}, status=404)
+
+    def _openai(self, request):
+        self.mock.count("openai")
+        words = self.mock.completion_text(request).split(" ")
+        latency = self.mock.delay(self.mock.llm_latency)
+        if not request.get("stream"):
+            time.sleep(latency)
+            text = " ".join(words)
+            return self._send({
+                "id": "mock", "object": "chat.completion", "created": 0, "model": request["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        first_token = self.mock.llm_first_token
+        for i, word in enumerate(words):
+            if first_token is None:
+                time.sleep(latency / len(words))
+            elif i == 0:
+                time.sleep(latency * first_token)
+            else:
+                time.sleep(latency * (1 - first_token) / max(len(words) - 1, 1))
+            delta = {"content": word if i == len(words) - 1 else word + " "}
+            event = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self._chunk(b"data: " + json.dumps(event).encode() + b"\n\n")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                     "choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": len(words),
+                                              "total_tokens": 100 + len(words)}}
+            self._chunk(b"data: " + json.dumps(event).encode() + b"\n\n")
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _tts(self, request):
+        self.mock.count("elevenlabs")
+        text = request.get("text", "")
+        self.mock.wait(self.mock.tts_latency + self.mock.tts_latency_per_char * len(text))
+        if random.random() < self.mock.tts_failure_rate:
+            self.mock.count("elevenlabs.failed")
+            return self._send({"detail": "mock failure"}, status=500)
+        return self._send(mock_mp3(len(text)), content_type="audio/mpeg")
+
+    def _slack(self, method, raw):
+        self.mock.count(f"slack.{method}")
+        self.mock.wait(self.mock.slack_latency)
+        if method == "auth.test":
+            return self._send({"ok": True, "user_id": "UBOT", "bot_id": "BBOT", "team_id": "T1"})
+        if method == "conversations.history":
+            messages = [{"ts": f"{1700000000 + i}.000100", "user": "U1", "text": f"message {i}"} for i in range(15, 0, -1)]
+            return self._send({"ok": True, "messages": messages, "has_more": False})
+        if method in ("chat.postMessage", "chat.update"):
+            if "json" in self.headers.get("Content-Type", ""):
+                args = json.loads(raw or b"{}")
+            else:
+                args = dict(urllib.parse.parse_qsl(raw.decode("utf-8", errors="ignore")))
+            return self._send({"ok": True, "channel": args.get("channel"), "ts": f"{time.time():.6f}"})
+        if method == "files.getUploadURLExternal":
+            file_id = f"F{time.time_ns()}"
+            return self._send({"ok": True, "upload_url": f"{self.mock.url}/upload/{file_id}", "file_id": file_id})
+        if method == "files.completeUploadExternal":
+            return self._send({"ok": True, "files": [{"id": "F1", "title": "Audio Recap"}]})
+        if method == "files.info":
+            return self._send({"ok": True, "file": {"id": "F1", "title": "Audio Recap"}})
+        return self._send({"ok": True})
+
+
+def serve_in_subprocess(**options):
+    """
+    Runs MockServices in a child process so its server threads do not show up
+    in the benchmarked process. Returns (process, url).
+    """
+    import multiprocessing
+
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(ready, options), daemon=True)
+    process.start()
+    return process, ready.get(timeout=10)
+
+
+def _serve(ready, options):
+    services = MockServices(**options).start()
+    ready.put(services.url)
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the mock OpenAI / Slack / Loki / n8n / ElevenLabs APIs.")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--jitter", choices=JITTER_DISTRIBUTIONS, default="none")
+    parser.add_argument("--jitter-scale", type=float, default=0.2)
+    args = parser.parse_args()
+    services = MockServices(llm_latency=args.llm_latency, jitter=args.jitter, jitter_scale=args.jitter_scale).start()
+    for name, value in services.environ().items():
+        print(f"export {name}={value}")
+    threading.Event().wait()
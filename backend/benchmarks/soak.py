@@ -0,0 +1,555 @@
+"""
+Traffic replay and soak harness for the Slack bots. Envelopes recorded with
+EVENT_TRACE_PATH (see event_trace.py), or synthesized here, are fed into the
+real Bolt app through a local stand-in for the socket-mode client (a pool of
+`--concurrency` delivery threads calling app.dispatch, like
+SocketModeClient), against the mock services.
+
+    python benchmarks/soak.py synth --bot mp3 --events 2000 --rate 5 -o mp3_trace.jsonl
+    python benchmarks/soak.py replay mp3_trace.jsonl --bot mp3 --speed 10 -o replay.json
+    python benchmarks/soak.py ramp mp3_trace.jsonl --bot mp3 --slo 5 -o ramp.json
+
+replay reports latency percentiles plus RSS, threads and open sockets over
+time (and the RSS slope, to spot leaks); ramp raises the event rate step by
+step until the latency SLO breaks, and reports the sustainable events/sec.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.concurrency_ceiling import percentile  # noqa: E402
+from benchmarks.mock_services import JITTER_DISTRIBUTIONS, serve_in_subprocess, service_environ  # noqa: E402
+from benchmarks.suite import git_commit, load_script, rss_bytes  # noqa: E402
+from event_trace import load_trace, trace_record, use_listener_executor  # noqa: E402
+
+SOCKET_MODE_CONCURRENCY = 10   # slack_sdk SocketModeClient default
+BOLT_LISTENER_THREADS = 5      # slack_bolt App default
+
+CHATTER = [
+    "deploy is green", "lgtm, merging", "who owns the billing ticket?", "lunch at 1?",
+    "the migration finished in 40 minutes", "can someone review #482", "thanks!", "pushed a fix",
+]
+QUESTIONS = [
+    "How do I fix this python api bug in the database code?",
+    "What does a kubernetes database migration cost in budget and revenue terms?",
+    "Should we move the queue to kafka?",
+]
+
+
+# --- BOTS ---
+
+class Bot:
+    """A bot entry point: its module, Bolt app and which events it consumes."""
+
+    def __init__(self, name):
+        self.name = name
+        # The bot builds its App on import with event_trace.listener_executor()
+        self.executor = KeyedExecutor()
+        use_listener_executor(self.executor)
+        if name == "agent":
+            import agent as module
+        elif name == "mp3":
+            module = load_script("mp3_support", "mp3-support.py")
+        else:
+            import slack_orchestrator as module
+        self.module = module
+        self.app = module.app
+        self.bot_id = self.app.client.bot_user_id()
+        if hasattr(module, "BOT_ID"):
+            module.BOT_ID = self.bot_id
+        self.scheduler = getattr(module, "scheduler", None)
+
+    def extra_stats(self):
+        stats = {}
+        if self.scheduler is not None:
+            stats["queue_depth"] = self.scheduler.stats()["queue_depth"]
+        for attr in ("conversations", "history", "summaries"):
+            store = getattr(self.module, attr, None)
+            if store is not None and hasattr(store, "stats"):
+                stats[attr] = store.stats()
+        return stats
+
+
+def synthesize_trace(bot, events, rate, channels, seed):
+    """Envelopes shaped like Slack's, mixing chatter with the requests `bot` acts on."""
+    rng = random.Random(seed)
+    bot_id = "UBOTTRACE"
+    now = time.time()
+    lines = []
+    for i in range(events):
+        t = now + i / rate + rng.uniform(0, 0.5 / rate)
+        channel = f"C{rng.randrange(channels):04d}"
+        user = f"U{rng.randrange(500):04d}"
+        ts = f"{int(t)}.{i % 1000000:06d}"
+        roll = rng.random()
+        event_types = ["message"]
+        if bot == "agent":
+            if roll < 0.05:
+                text = f"<@{bot_id}> summarize the discussion"
+            elif roll < 0.15:
+                text = f"<@{bot_id}> {rng.choice(QUESTIONS)}"
+            else:
+                text = rng.choice(CHATTER)
+        elif bot == "mp3":
+            if roll < 0.03:
+                text = "can you recap this thread as audio?"
+            elif roll < 0.05:
+                text = f"<@{bot_id}> recap please"
+                event_types.append("app_mention")   # Slack sends both for a mention
+            else:
+                text = rng.choice(CHATTER)
+        else:
+            text = f"<@{bot_id}> {rng.choice(QUESTIONS)}"
+            event_types = ["app_mention"]
+        for event_type in event_types:
+            body = {
+                "type": "event_callback", "team_id": "T1", "api_app_id": "A1",
+                "event_id": f"Ev{i:08d}{event_type[0]}", "event_time": int(t),
+                "event": {"type": event_type, "user": user, "channel": channel, "text": text, "ts": ts},
+            }
+            lines.append(trace_record(body, bot_id, timestamp=t))
+    return lines
+
+
+# --- TRACKING ---
+
+class Tracker:
+    """Per-event arrival and completion times, carried across Bolt's and the scheduler's threads."""
+
+    def __init__(self):
+        self.starts = {}
+        self.ends = {}
+        self.work = set()       # Events that did real work (a scheduler job, or an inline listener)
+        self.jobs = set()
+        self.shed = 0
+        self.unhandled = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def key(self):
+        return getattr(self._local, "key", None)
+
+    @key.setter
+    def key(self, value):
+        self._local.key = value
+
+    def start(self, key):
+        with self._lock:
+            self.starts[key] = time.perf_counter()
+
+    def done(self, key, work=False):
+        with self._lock:
+            if key in self.starts and key not in self.ends:
+                self.ends[key] = time.perf_counter()
+                if work:
+                    self.work.add(key)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self.starts) - len(self.ends)
+
+    def latencies(self, keys=None, work=True):
+        """Latencies of finished events: work events (work=True), the others (False) or all (None)."""
+        with self._lock:
+            chosen = list(self.ends) if keys is None else [k for k in keys if k in self.ends]
+            return [self.ends[k] - self.starts[k] for k in chosen if work is None or (k in self.work) == work]
+
+
+class KeyedExecutor(ThreadPoolExecutor):
+    """Bolt's listener pool, carrying the event key from the dispatching thread to the listener."""
+
+    def __init__(self, max_workers=BOLT_LISTENER_THREADS):
+        super().__init__(max_workers=max_workers, thread_name_prefix="bolt-listener")
+        self.tracker = None
+        self.inline = True      # No scheduler: the listener itself is the work
+
+    def submit(self, fn, *args, **kwargs):
+        tracker = self.tracker
+        if tracker is None:
+            return super().submit(fn, *args, **kwargs)
+        key, inline = tracker.key, self.inline
+
+        def run(*a, **kw):
+            tracker.key = key
+            try:
+                return fn(*a, **kw)
+            finally:
+                if key not in tracker.jobs:
+                    tracker.done(key, work=inline)
+
+        return super().submit(run, *args, **kwargs)
+
+
+def instrument(bot, tracker):
+    """Propagates the event key through Bolt's listener executor and the bot's ChannelScheduler."""
+    bot.executor.tracker = tracker
+    bot.executor.inline = bot.scheduler is None
+
+    if bot.scheduler is not None:
+        scheduler = bot.scheduler
+        scheduler_submit = scheduler.submit
+
+        def keyed_scheduler_submit(channel, fn, *args, **kwargs):
+            key = tracker.key
+            tracker.jobs.add(key)
+
+            def run(*a, **kw):
+                tracker.key = key
+                try:
+                    return fn(*a, **kw)
+                finally:
+                    tracker.done(key, work=True)
+
+            accepted = scheduler_submit(channel, run, *args, **kwargs)
+            if not accepted:
+                tracker.shed += 1
+                tracker.done(key)
+            return accepted
+
+        scheduler.submit = keyed_scheduler_submit
+
+
+class SocketModeStandIn:
+    """Delivers envelopes to app.dispatch from a fixed pool, like SocketModeClient's message workers."""
+
+    def __init__(self, bot, tracker, concurrency=SOCKET_MODE_CONCURRENCY):
+        from slack_bolt.request import BoltRequest
+
+        self._request = BoltRequest
+        self.bot = bot
+        self.tracker = tracker
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="socket-mode")
+
+    def deliver(self, key, body):
+        self.tracker.start(key)
+        self.pool.submit(self._dispatch, key, body)
+
+    def _dispatch(self, key, body):
+        self.tracker.key = key
+        try:
+            response = self.bot.app.dispatch(self._request(body=body, mode="socket_mode"))
+            if response.status != 200:
+                self.tracker.unhandled += 1
+                self.tracker.done(key)
+        except Exception as e:
+            logging.error(f"Dispatch failed: {e}")
+            self.tracker.done(key)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def prepare(body, recorded_bot_id, bot_id, seq):
+    """Copy of a recorded envelope addressed to this bot, with a unique ts / event_id."""
+    body = copy.deepcopy(body)
+    event = body.setdefault("event", {})
+    if recorded_bot_id and recorded_bot_id != bot_id and event.get("text"):
+        event["text"] = event["text"].replace(f"<@{recorded_bot_id}>", f"<@{bot_id}>")
+    seconds = int(time.time())
+    event["ts"] = f"{seconds}.{seq % 1000000:06d}"
+    body["event_id"] = f"Ev{seq:010d}"
+    return body
+
+
+# --- PROCESS RESOURCES ---
+
+def open_sockets():
+    """Open socket descriptors of this process (Linux), or None."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            count += os.readlink(f"/proc/self/fd/{fd}").startswith("socket:")
+        except OSError:
+            pass
+    return count
+
+
+class ResourceSampler:
+    """Samples RSS, threads, sockets, in-flight events and bot stats every `interval` seconds."""
+
+    def __init__(self, bot, tracker, interval=1.0):
+        self.bot = bot
+        self.tracker = tracker
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def sample(self):
+        self.samples.append({
+            "t": round(time.perf_counter() - self._start, 2),
+            "rss_mb": round(rss_bytes() / 2 ** 20, 2),
+            "threads": threading.active_count(),
+            "sockets": open_sockets(),
+            "in_flight": self.tracker.in_flight(),
+            "completed": len(self.tracker.ends),
+            **self.bot.extra_stats(),
+        })
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def rss_slope_mb_per_hour(self):
+        """Least-squares RSS slope over the second half of the run (after warm-up growth)."""
+        points = [(s["t"], s["rss_mb"]) for s in self.samples[len(self.samples) // 2:]]
+        if len(points) < 2:
+            return 0.0
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_r = sum(r for _, r in points) / len(points)
+        var = sum((t - mean_t) ** 2 for t, _ in points)
+        if not var:
+            return 0.0
+        return round(sum((t - mean_t) * (r - mean_r) for t, r in points) / var * 3600, 2)
+
+
+def latency_summary(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+# --- MODES ---
+
+def replay(bot, trace, speed, concurrency, interval, drain):
+    tracker = Tracker()
+    instrument(bot, tracker)
+    stand_in = SocketModeStandIn(bot, tracker, concurrency)
+
+    with ResourceSampler(bot, tracker, interval) as sampler:
+        start = time.perf_counter()
+        for seq, (offset, recorded_bot_id, body) in enumerate(trace):
+            delay = start + offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            stand_in.deliver(seq, prepare(body, recorded_bot_id, bot.bot_id, seq))
+        sent_time = time.perf_counter() - start
+        deadline = time.perf_counter() + drain
+        while tracker.in_flight() and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        stand_in.close()
+        wall_time = time.perf_counter() - start
+
+    samples = sampler.samples
+    return {
+        "mode": "replay",
+        "bot": bot.name,
+        "speed": speed,
+        "events": len(trace),
+        "completed": len(tracker.ends),
+        "work_events": len(tracker.work),
+        "shed": tracker.shed,
+        "unhandled": tracker.unhandled,
+        "offered_rate_eps": round(len(trace) / sent_time, 2) if sent_time else None,
+        "achieved_rate_eps": round(len(tracker.ends) / wall_time, 2),
+        "latency_s": latency_summary(tracker.latencies()),
+        "ack_only_latency_s": latency_summary(tracker.latencies(work=False)),
+        "rss_mb": {"start": samples[0]["rss_mb"], "end": samples[-1]["rss_mb"],
+                   "max": max(s["rss_mb"] for s in samples)},
+        "rss_slope_mb_per_hour": sampler.rss_slope_mb_per_hour(),
+        "threads_max": max(s["threads"] for s in samples),
+        "sockets_max": max((s["sockets"] or 0) for s in samples),
+        "samples": samples,
+    }
+
+
+def ramp(bot, trace, start_rate, factor, max_rate, step_seconds, slo, slo_percentile, concurrency, interval,
+         drain=120):
+    """Raises the offered rate by `factor` per step until the SLO breaks; returns the sustainable rate."""
+    tracker = Tracker()
+    instrument(bot, tracker)
+    stand_in = SocketModeStandIn(bot, tracker, concurrency)
+    steps = []
+    sustainable = 0.0
+    seq = 0
+    rate = start_rate
+
+    with ResourceSampler(bot, tracker, interval) as sampler:
+        while rate <= max_rate:
+            keys = []
+            step_start = time.perf_counter()
+            count = max(int(rate * step_seconds), 1)
+            for n in range(count):
+                delay = step_start + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                _, recorded_bot_id, body = trace[seq % len(trace)]
+                stand_in.deliver(seq, prepare(body, recorded_bot_id, bot.bot_id, seq))
+                keys.append(seq)
+                seq += 1
+            # Allow the SLO for stragglers; anything still running then counts as a breach
+            deadline = time.perf_counter() + slo
+            while any(k not in tracker.ends for k in keys) and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            finished = sum(1 for k in keys if k in tracker.ends)
+            latencies = tracker.latencies(keys)
+            observed = percentile(latencies, slo_percentile) if latencies else 0.0
+            ok = finished == len(keys) and observed <= slo and tracker.shed == 0
+            steps.append({
+                "rate_eps": round(rate, 2),
+                "events": len(keys),
+                "finished": finished,
+                f"p{slo_percentile}_s": round(observed, 4),
+                "shed_total": tracker.shed,
+                "rss_mb": sampler.samples[-1]["rss_mb"] if sampler.samples else None,
+                "threads": threading.active_count(),
+                "ok": ok,
+            })
+            print(f"... {rate:.1f} ev/s: p{slo_percentile} {observed:.3f}s, "
+                  f"{finished}/{len(keys)} finished, {'ok' if ok else 'SLO broken'}", file=sys.stderr)
+            if not ok:
+                break
+            sustainable = rate
+            rate *= factor
+        stand_in.close()
+        # Let the backlog of the broken step finish before the interpreter exits
+        deadline = time.perf_counter() + drain
+        while tracker.in_flight() and time.perf_counter() < deadline:
+            time.sleep(0.1)
+
+    return {
+        "mode": "ramp",
+        "bot": bot.name,
+        "slo_s": slo,
+        "slo_percentile": slo_percentile,
+        "sustainable_eps": round(sustainable, 2),
+        "steps": steps,
+        "threads_max": max(s["threads"] for s in sampler.samples),
+        "sockets_max": max((s["sockets"] or 0) for s in sampler.samples),
+        "samples": sampler.samples,
+    }
+
+
+# --- CLI ---
+
+def start_mocks(args):
+    _, url = serve_in_subprocess(
+        llm_latency=args.llm_latency, slack_latency=args.slack_latency, tts_latency=args.tts_latency,
+        jitter=args.jitter, jitter_scale=args.jitter_scale, seed=args.seed,
+    )
+    os.environ.update(service_environ(url))
+    os.environ.update(LLM_CACHE_ENABLED="0", SIMILARITY_CACHE_ENABLED="0", TTS_CACHE_ENABLED="0",
+                      ROUTER_LOG_PATH="", RECAP_LOG_PATH="", EVENT_TRACE_PATH="",
+                      OUTBOX_PATH=":memory:")
+    logging.basicConfig(level=logging.WARNING)
+
+
+def print_report(report):
+    if report["mode"] == "replay":
+        lat = report["latency_s"]
+        print(f"{report['bot']} replay x{report['speed']}: {report['completed']}/{report['events']} events, "
+              f"offered {report['offered_rate_eps']} ev/s, achieved {report['achieved_rate_eps']} ev/s, "
+              f"shed {report['shed']}")
+        print(f"  work latency p50 {lat['p50']}s  p95 {lat['p95']}s  p99 {lat['p99']}s  max {lat['max']}s")
+        print(f"  rss {report['rss_mb']['start']} -> {report['rss_mb']['end']} MB "
+              f"(slope {report['rss_slope_mb_per_hour']} MB/h), threads max {report['threads_max']}, "
+              f"sockets max {report['sockets_max']}")
+    else:
+        print(f"{report['bot']}: sustainable {report['sustainable_eps']} events/sec per process "
+              f"(p{report['slo_percentile']} <= {report['slo_s']}s, no shedding)")
+        key = f"p{report['slo_percentile']}_s"
+        for step in report["steps"]:
+            print(f"  {step['rate_eps']:>8} ev/s  p{report['slo_percentile']} "
+                  f"{step[key]:>7}s  {step['finished']}/{step['events']}  "
+                  f"threads {step['threads']}  {'ok' if step['ok'] else 'BROKEN'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    synth = sub.add_parser("synth", help="Write a synthetic JSONL trace for a bot")
+    synth.add_argument("--bot", choices=("agent", "mp3", "orchestrator"), required=True)
+    synth.add_argument("--events", type=int, default=1000)
+    synth.add_argument("--rate", type=float, default=2.0, help="Events per second at 1x")
+    synth.add_argument("--channels", type=int, default=50)
+    synth.add_argument("--seed", type=int, default=7)
+    synth.add_argument("-o", "--output", required=True)
+
+    for name in ("replay", "ramp"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("trace")
+        cmd.add_argument("--bot", choices=("agent", "mp3", "orchestrator"), required=True)
+        cmd.add_argument("--concurrency", type=int, default=SOCKET_MODE_CONCURRENCY)
+        cmd.add_argument("--interval", type=float, default=1.0, help="Resource sampling interval (s)")
+        cmd.add_argument("--llm-latency", type=float, default=1.0)
+        cmd.add_argument("--slack-latency", type=float, default=0.05)
+        cmd.add_argument("--tts-latency", type=float, default=0.3)
+        cmd.add_argument("--jitter", choices=JITTER_DISTRIBUTIONS, default="lognormal")
+        cmd.add_argument("--jitter-scale", type=float, default=0.3)
+        cmd.add_argument("--seed", type=int, default=7)
+        cmd.add_argument("-o", "--output", help="Write the JSON report here")
+        cmd.add_argument("--drain", type=float, default=120, help="Seconds to wait for in-flight events at the end")
+        if name == "replay":
+            cmd.add_argument("--speed", type=float, default=1.0, help="1, 10, 100, ...")
+        else:
+            cmd.add_argument("--slo", type=float, default=5.0, help="Latency SLO in seconds")
+            cmd.add_argument("--slo-percentile", type=int, default=95)
+            cmd.add_argument("--start-rate", type=float, default=1.0)
+            cmd.add_argument("--factor", type=float, default=1.5)
+            cmd.add_argument("--max-rate", type=float, default=500.0)
+            cmd.add_argument("--step-seconds", type=float, default=15.0)
+
+    args = parser.parse_args()
+    if args.command == "synth":
+        lines = synthesize_trace(args.bot, args.events, args.rate, args.channels, args.seed)
+        with open(args.output, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"{len(lines)} envelopes -> {args.output}")
+        return
+
+    trace = load_trace(args.trace)
+    if not trace:
+        print("Empty trace.")
+        return
+    start_mocks(args)
+    os.environ.setdefault("SCHEDULER_MAX_PENDING", "1000")
+    bot = Bot(args.bot)
+    logging.getLogger().setLevel(logging.WARNING)  # The bots configure INFO on import
+
+    if args.command == "replay":
+        report = replay(bot, trace, args.speed, args.concurrency, args.interval, args.drain)
+    else:
+        report = ramp(bot, trace, args.start_rate, args.factor, args.max_rate, args.step_seconds,
+                      args.slo, args.slo_percentile, args.concurrency, args.interval, args.drain)
+    report["commit"] = git_commit()
+    report["trace"] = args.trace
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
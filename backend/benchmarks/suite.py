@@ -0,0 +1,468 @@
+"""
+End-to-end benchmark suite: drives the real bot handlers against the local
+mock services and reports p50/p95/p99 latency, a per-stage breakdown and
+CPU time / memory per request, as JSON that can be diffed between commits.
+
+Scenarios:
+    agent_orchestrate    agent.py handle_message_events, "@bot <question>"
+    agent_summarize      agent.py handle_message_events, "@bot summarize"
+    slack_orchestrator   slack_orchestrator.py handle_mentions
+    mp3_message          mp3-support.py handle_message_events, recap request -> TTS -> upload
+    mp3_mention          mp3-support.py handle_app_mention_events
+    orchestrator_tech    orchestrator.py pipeline, single agent
+    orchestrator_both    orchestrator.py pipeline, Tech + Business + Synthesizer
+
+    python benchmarks/suite.py --requests 50 --jitter lognormal -o results.json
+    python benchmarks/suite.py --compare baseline.json -o results.json
+"""
+import argparse
+import functools
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_services import JITTER_DISTRIBUTIONS, serve_in_subprocess, service_environ  # noqa: E402
+from benchmarks.concurrency_ceiling import percentile  # noqa: E402
+
+TECH_QUERY = "How do I fix this python api bug in the database code?"
+BOTH_QUERY = "What does a kubernetes database migration cost in budget and revenue terms?"
+RECAP_QUERY = "can you recap this thread as audio?"
+
+
+# --- MEASUREMENT ---
+
+class StageTimer:
+    """Wraps functions so every call's duration is recorded under a stage name (generators: until exhausted)."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._patched = []
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+        timer = self
+
+        if inspect.isgeneratorfunction(original):
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from original(*args, **kwargs)
+                finally:
+                    timer.record(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    timer.record(stage, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def restore(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched.clear()
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def summary(self, requests):
+        with self._lock:
+            samples = dict(self.samples)
+        return {
+            stage: {
+                "calls": len(values),
+                "calls_per_request": round(len(values) / max(requests, 1), 2),
+                "p50_s": round(percentile(values, 50), 4),
+                "p95_s": round(percentile(values, 95), 4),
+                "total_s": round(sum(values), 3),
+            }
+            for stage, values in sorted(samples.items())
+        }
+
+
+def rss_bytes():
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def load_script(name, filename):
+    """Imports a backend script whose file name is not a valid module name (mp3-support.py)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BACKEND_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# --- SCENARIOS ---
+# Each returns (send(i, channel), queued, stages(timer)). send() returns when the handler does;
+# for queued scenarios the request ends when its pipeline signals `completion` on the worker.
+
+class Completion:
+    """Per-request end times for handlers that hand their work to a scheduler."""
+
+    def __init__(self):
+        self.ends = {}
+        self._cond = threading.Condition()
+
+    def done(self, key):
+        with self._cond:
+            self.ends[key] = time.perf_counter()
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self.ends.clear()
+
+    def wait(self, count, timeout=600):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.ends) >= count, timeout)
+
+
+completion = Completion()
+
+
+def _say_for(client, channel):
+    def say(text=None, thread_ts=None, **kwargs):
+        return client.chat_postMessage(channel=channel, text=text, thread_ts=thread_ts)
+    return say
+
+
+def _signal_after(module, name):
+    """Wraps module.name (a queued pipeline) so the request is marked complete when it returns; once per process."""
+    pipeline = getattr(module, name)
+    if getattr(pipeline, "benchmark_signalled", False):
+        return
+
+    def signalled(*args, **kwargs):
+        try:
+            return pipeline(*args, **kwargs)
+        finally:
+            completion.done(threading.current_thread().benchmark_key)
+
+    signalled.benchmark_signalled = True
+    setattr(module, name, signalled)
+
+
+def _agent_scenario(text):
+    import agent
+
+    agent.BOT_ID = agent.app.client.bot_user_id()
+    logger = logging.getLogger("benchmark.agent")
+    _signal_after(agent, "summarize_conversation")
+    _signal_after(agent, "orchestrate_request")
+
+    def send(i, channel):
+        body = {"event": {"type": "message", "user": f"U{i:05d}", "channel": channel,
+                          "text": f"<@{agent.BOT_ID}> {text}", "ts": f"{1700000100 + i}.000100"}}
+        agent.handle_message_events(body, _say_for(agent.app.client, channel), logger)
+
+    def stages(timer):
+        timer.wrap(agent, "get_chat_messages", "history")
+        timer.wrap(agent, "fold_channel_summary", "summary_fold")
+        timer.wrap(agent, "query_llm_agent", "llm_summary")
+        timer.wrap(agent, "llm_route", "llm_router")
+        timer.wrap(agent, "stream_llm_response", "agent_stream")
+        timer.wrap(agent.get_outbox(), "enqueue", "n8n_enqueue")
+
+    return send, True, stages
+
+
+def _slack_orchestrator_scenario():
+    import slack_orchestrator as bot
+
+    logger = logging.getLogger("benchmark.slack_orchestrator")
+    bot_id = bot.app.client.bot_user_id()
+
+    def send(i, channel):
+        body = {"event": {"type": "app_mention", "user": f"U{i:05d}", "channel": channel,
+                          "text": f"<@{bot_id}> {TECH_QUERY}", "ts": f"{1700000100 + i}.000100"}}
+        bot.handle_mentions(body, _say_for(bot.app.client, channel), logger)
+
+    def stages(timer):
+        timer.wrap(bot, "route_request", "router")
+        timer.wrap(bot, "stream_agent_response", "agent_stream")
+        timer.wrap(bot, "run_collaboration", "collaboration")
+
+    return send, False, stages
+
+
+def _mp3_scenario(mention):
+    mp3 = load_script("mp3_support", "mp3-support.py")
+    logger = logging.getLogger("benchmark.mp3")
+    bot_id = mp3.app.client.bot_user_id()
+    _signal_after(mp3, "run_then_fold")
+
+    def send(i, channel):
+        text = f"<@{bot_id}> {RECAP_QUERY}" if mention else RECAP_QUERY
+        event = {"type": "app_mention" if mention else "message", "user": f"U{i:05d}", "channel": channel,
+                 "text": text, "ts": f"{1700000100 + i}.000100"}
+        if mention:
+            mp3.handle_app_mention_events({"event": event}, _say_for(mp3.app.client, channel), logger)
+        else:
+            mp3.handle_message_events({"event": event}, logger)
+
+    def stages(timer):
+        timer.wrap(mp3, "analyze_and_generate_json", "analyzer")
+        timer.wrap(mp3, "text_to_speech", "tts")
+        timer.wrap(mp3, "_upload_mp3_to_slack", "upload")
+        timer.wrap(mp3, "fold_channel_summary", "summary_fold")
+
+    return send, True, stages
+
+
+def _orchestrator_scenario(query):
+    import orchestrator
+
+    def send(i, channel):
+        decision, _ = orchestrator.route_request(query)
+        if decision == "BOTH":
+            orchestrator.run_collaboration(query).result("synthesizer")
+        else:
+            prompt = orchestrator.TECH_SYSTEM_PROMPT if decision == "TECH" else orchestrator.BUSINESS_SYSTEM_PROMPT
+            orchestrator.get_agent_response(prompt, query)
+
+    def stages(timer):
+        timer.wrap(orchestrator, "route_request", "router")
+        timer.wrap(orchestrator, "get_agent_response", "agent")
+        timer.wrap(orchestrator, "stream_agent_response", "agent_stream")
+        timer.wrap(orchestrator, "run_collaboration", "collaboration")
+
+    return send, False, stages
+
+
+SCENARIOS = {
+    "agent_orchestrate": lambda: _agent_scenario(TECH_QUERY),
+    "agent_summarize": lambda: _agent_scenario("summarize the discussion"),
+    "slack_orchestrator": _slack_orchestrator_scenario,
+    "mp3_message": lambda: _mp3_scenario(mention=False),
+    "mp3_mention": lambda: _mp3_scenario(mention=True),
+    "orchestrator_tech": lambda: _orchestrator_scenario(TECH_QUERY),
+    "orchestrator_both": lambda: _orchestrator_scenario(BOTH_QUERY),
+}
+
+
+def _patch_schedulers():
+    """Carries the request key from the submitting thread onto the scheduler worker that runs it."""
+    from scheduler import ChannelScheduler
+
+    submit = ChannelScheduler.submit
+    if getattr(submit, "benchmark_patched", False):
+        return
+
+    def keyed_submit(self, channel, fn, *args, **kwargs):
+        key = getattr(threading.current_thread(), "benchmark_key", None)
+
+        def run(*a, **kw):
+            threading.current_thread().benchmark_key = key
+            return fn(*a, **kw)
+
+        return submit(self, channel, run, *args, **kwargs)
+
+    keyed_submit.benchmark_patched = True
+    ChannelScheduler.submit = keyed_submit
+
+
+def run_scenario(name, requests, concurrency, channels):
+    from slack_api import SlackClient
+
+    send, queued, stages = SCENARIOS[name]()
+    timer = StageTimer()
+    stages(timer)
+    timer.wrap(SlackClient, "api_call", "slack_api")
+
+    starts = {}
+
+    def one(i):
+        key = (name, i)
+        threading.current_thread().benchmark_key = key
+        channel = f"C{name[:3].upper()}{i % channels:04d}"
+        starts[key] = time.perf_counter()
+        send(i, channel)
+        return None if queued else time.perf_counter() - starts[key]
+
+    # Warm-up: imports, connection pools, bot identity
+    completion.clear()
+    one(-1)
+    if queued:
+        completion.wait(1)
+    completion.clear()
+    timer.reset()
+
+    cpu_start = time.process_time()
+    rss_start = rss_bytes()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        results = list(pool.map(one, range(requests)))
+    if queued:
+        completion.wait(requests)
+        results = [completion.ends[key] - starts[key] for key in sorted(completion.ends)]
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    rss_end = rss_bytes()
+    timer.restore()
+
+    latencies = [r for r in results if r is not None]
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4),
+        },
+        "cpu_ms_per_request": round(cpu_time * 1000 / max(len(latencies), 1), 2),
+        "rss_mb": round(rss_end / 2 ** 20, 1),
+        "rss_growth_kb_per_request": round((rss_end - rss_start) / 1024 / max(len(latencies), 1), 2),
+        "stages": timer.summary(len(latencies)),
+    }
+
+
+# --- REPORTING ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report):
+    print(f"commit {report['commit']} | {report['options']}")
+    print(f"{'scenario':<20} {'reqs':>5} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'cpu ms':>7} {'rss MB':>7}")
+    for r in report["scenarios"]:
+        lat = r["latency_s"]
+        print(f"{r['scenario']:<20} {r['requests']:>5} {r['throughput_rps']:>7} {lat['p50']:>7} {lat['p95']:>7} "
+              f"{lat['p99']:>7} {r['cpu_ms_per_request']:>7} {r['rss_mb']:>7}")
+        for stage, s in r["stages"].items():
+            print(f"    {stage:<16} {s['calls_per_request']:>5}/req  p50 {s['p50_s']:.4f}s  p95 {s['p95_s']:.4f}s")
+
+
+def compare(report, baseline, tolerance):
+    """Prints p50/p95/CPU changes vs a previous report; returns the regressions beyond `tolerance`."""
+    previous = {r["scenario"]: r for r in baseline.get("scenarios", [])}
+    regressions = []
+    print(f"\nvs {baseline.get('commit')} (regression = more than {tolerance:.0%} slower)")
+    for r in report["scenarios"]:
+        old = previous.get(r["scenario"])
+        if old is None:
+            continue
+        for label, new_value, old_value in (
+            ("p50", r["latency_s"]["p50"], old["latency_s"]["p50"]),
+            ("p95", r["latency_s"]["p95"], old["latency_s"]["p95"]),
+            ("cpu_ms", r["cpu_ms_per_request"], old["cpu_ms_per_request"]),
+        ):
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            flag = "  REGRESSION" if change > tolerance else ""
+            if flag:
+                regressions.append((r["scenario"], label, change))
+            print(f"{r['scenario']:<20} {label:<7} {old_value:>9} -> {new_value:<9} {change:+.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--requests", type=int, default=30, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Simultaneous requests")
+    parser.add_argument("--channels", type=int, default=1000, help="Distinct channels the requests are spread over")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--slack-latency", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", choices=JITTER_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--jitter-scale", type=float, default=0.3)
+    parser.add_argument("--first-token", type=float, default=None,
+                        help="Share of the LLM latency spent before the first streamed token")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Previous JSON report to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative slowdown counted as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the table")
+    args = parser.parse_args()
+
+    options = {
+        "requests": args.requests, "concurrency": args.concurrency, "llm_latency": args.llm_latency,
+        "slack_latency": args.slack_latency, "tts_latency": args.tts_latency, "jitter": args.jitter,
+        "jitter_scale": args.jitter_scale, "first_token": args.first_token, "seed": args.seed,
+    }
+    _, url = serve_in_subprocess(
+        llm_latency=args.llm_latency, slack_latency=args.slack_latency, tts_latency=args.tts_latency,
+        jitter=args.jitter, jitter_scale=args.jitter_scale, llm_first_token=args.first_token, seed=args.seed,
+    )
+    os.environ.update(service_environ(url))
+    # Measure the pipelines, not the caches or the training corpora
+    os.environ.update(LLM_CACHE_ENABLED="0", SIMILARITY_CACHE_ENABLED="0", TTS_CACHE_ENABLED="0",
+                      ROUTER_LOG_PATH="", RECAP_LOG_PATH="", OUTBOX_PATH=":memory:")
+    os.environ.setdefault("SCHEDULER_MAX_PENDING", str(max(args.requests * 2, 100)))
+    logging.basicConfig(level=logging.WARNING)
+    _patch_schedulers()
+
+    scenarios = []
+    for name in args.scenario or list(SCENARIOS):
+        logging.getLogger().setLevel(logging.WARNING)  # The bots configure INFO on import
+        scenarios.append(run_scenario(name, args.requests, args.concurrency, args.channels))
+        logging.getLogger().setLevel(logging.WARNING)
+        print(f"... {name} done", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Time-to-audio for a ~2 minute recap: one ElevenLabs request for the whole
+summary (the old mp3-support.py behaviour) vs tts.synthesize_speech
+(sentence chunks rendered in parallel and stitched), against the mock TTS
+server.
+
+    python benchmarks/tts_pipeline.py --chars 1800 --failure-rate 0.1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_services import MockServices, service_environ  # noqa: E402
+
+SENTENCES = [
+    "The team shipped the new onboarding flow on Tuesday.",
+    "Activation is up eight percent, mostly from mobile sign-ups.",
+    "Support flagged two billing edge cases; both have owners and fixes are in review.",
+    "Next sprint focuses on search relevance, the export API and the pricing page test.",
+    "Risks: the data migration is behind schedule, and we still need legal sign-off on the new terms.",
+]
+
+
+def recap(chars):
+    text = []
+    while sum(len(s) + 1 for s in text) < chars:
+        text.append(SENTENCES[len(text) % len(SENTENCES)])
+    return " ".join(text)
+
+
+def count_frames(data):
+    from tts import _frame_length, strip_mp3_metadata
+
+    data = strip_mp3_metadata(data)
+    pos = frames = 0
+    while True:
+        length = _frame_length(data, pos)
+        if not length:
+            return frames, pos == len(data)
+        pos += length
+        frames += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, default=1800, help="Summary length (~15 chars per spoken second)")
+    parser.add_argument("--latency-per-char", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mock TTS calls that fail")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    services = MockServices(tts_latency_per_char=args.latency_per_char, tts_failure_rate=args.failure_rate).start()
+    os.environ.update(service_environ(services.url))
+    os.environ["TTS_CACHE_ENABLED"] = "0"  # Measure synthesis, not the audio cache
+    import tts
+
+    text = recap(args.chars)
+    results = []
+
+    start = time.perf_counter()
+    audio = tts.synthesize_chunk(text, retries=0, timeout=tts.TTS_TIMEOUT)
+    results.append({"mode": "single", "seconds": round(time.perf_counter() - start, 3),
+                    "ok": audio is not None, "requests": 1})
+
+    before = dict(services.calls)
+    start = time.perf_counter()
+    audio = tts.synthesize_speech(text)
+    elapsed = time.perf_counter() - start
+    frames, clean = count_frames(audio) if audio else (0, False)
+    results.append({
+        "mode": "pipelined",
+        "seconds": round(elapsed, 3),
+        "ok": audio is not None,
+        "requests": services.calls.get("elevenlabs", 0) - before.get("elevenlabs", 0),
+        "chunks": len(tts.split_for_tts(text)),
+        "frames": frames,
+        "frames_contiguous": clean,
+    })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"summary: {len(text)} chars, ~{len(text) / 15:.0f}s of speech")
+    for r in results:
+        extra = f", {r['chunks']} chunks, {r['frames']} frames" if "chunks" in r else ""
+        print(f"{r['mode']:<10} {r['seconds']:>7}s  ok={r['ok']}  requests={r['requests']}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ import sys
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from chat_session import ChatSession, turn_summarizer
+from llm_usage import create_completion, get_ledger, usage_scope
+
 
 load_dotenv()
 
@@ -37,11 +40,12 @@ IMPORTANT CONTENT MODERATION & SAFETY RULES:
 - Advise users not to share sensitive PII (Personally Identifiable Information) like full bank account numbers or SSNs.
 """
 
-def run_business_agent():
+def run_business_agent(session_path=None):
     print("--- Financial Planning & Business Agent (Type 'quit' to exit) ---")
     
     
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    # Recent turns verbatim + a summary of older ones; resumed from session_path if given
+    session = ChatSession(SYSTEM_PROMPT, turn_summarizer(client), path=session_path)
 
     while True:
         try:
@@ -57,14 +61,16 @@ def run_business_agent():
                 continue
 
 
-            messages.append({"role": "user", "content": user_input})
+            session.add("user", user_input)
 
             print("Agent: ", end="", flush=True)
 
 
-            stream = client.chat.completions.create(
+            stream = create_completion(
+                client,
+                persona="business",
                 model="gpt-4o",  
-                messages=messages,
+                messages=session.messages(),  # Bounded by CHAT_TOKEN_BUDGET
                 stream=True,
                 temperature=0.5,
             )
@@ -72,7 +78,8 @@ def run_business_agent():
             full_response = ""
 
             for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
+                # The last chunk carries only the token usage (no choices)
+                if chunk.choices and chunk.choices[0].delta.content is not None:
                     text_chunk = chunk.choices[0].delta.content
                     
                     print(text_chunk, end="", flush=True)
@@ -81,10 +88,16 @@ def run_business_agent():
                     full_response += text_chunk
             
             print() 
-            messages.append({"role": "assistant", "content": full_response})
+            session.add("assistant", full_response)
+            session.end_turn()
 
         except Exception as e:
             print(f"\n[Error]: {e}")
 
+    session.close()
+
 if __name__ == "__main__":
-    run_business_agent()
\ No newline at end of file
+    # Optional: python business_agent.py --session my_session.json (resumes if the file exists)
+    with usage_scope(pipeline="cli_business"):
+        run_business_agent(sys.argv[sys.argv.index("--session") + 1] if "--session" in sys.argv[:-1] else None)
+    print(f"[Estimated OpenAI cost this session: ${get_ledger().estimated_cost():.4f}]")
\ No newline at end of file
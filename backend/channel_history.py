@@ -0,0 +1,203 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from rolling_summary import ts_key
+
+load_dotenv()
+
+# --- CONFIG ---
+HISTORY_MAX_MESSAGES = int(os.environ.get("HISTORY_MAX_MESSAGES", "5000"))   # Cached per channel
+HISTORY_MAX_CHANNELS = int(os.environ.get("HISTORY_MAX_CHANNELS", "500"))
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "200"))           # Slack recommends <= 200
+HISTORY_RESYNC_SECONDS = float(os.environ.get("HISTORY_RESYNC_SECONDS", "300"))
+
+# Edits / deletions are applied; other subtypes (joins, topic changes, ...) are not conversation
+_CHANGE_SUBTYPES = ("message_changed", "message_deleted")
+
+
+def is_thread_reply(msg):
+    """conversations.history only returns thread parents, so replies stay out of the cache too."""
+    thread_ts = msg.get("thread_ts")
+    return thread_ts is not None and thread_ts != msg.get("ts")
+
+
+def format_message(msg):
+    return f"User {msg.get('user', 'Unknown')}: {msg.get('text', '')}"
+
+
+class _ChannelHistory:
+    __slots__ = ("keys", "messages", "cursor", "synced_at", "complete", "lock")
+
+    def __init__(self):
+        self.keys = []            # ts_key of every cached message, ascending
+        self.messages = {}        # ts_key -> (ts, line)
+        self.cursor = None        # ts of the newest message seen (the `oldest` for the next delta fetch)
+        self.synced_at = None     # monotonic time of the last fetch that reached `cursor`
+        self.complete = False     # The cache reaches back to the start of the channel
+        self.lock = threading.Lock()
+
+
+class ChannelHistory:
+    """
+    Local cache of channel messages, filled from conversations.history and
+    kept current by the message events the bot already receives.
+
+    messages() only asks Slack for what it does not have: messages newer than
+    the channel's cursor (at most every HISTORY_RESYNC_SECONDS, to close gaps
+    left by missed events) and, for windows larger than the cache, older
+    pages behind the oldest cached message. Both directions paginate, so a
+    window of thousands of messages is a handful of calls the first time and
+    none afterwards.
+    """
+
+    def __init__(self, client, max_messages=HISTORY_MAX_MESSAGES, max_channels=HISTORY_MAX_CHANNELS,
+                 page_size=HISTORY_PAGE_SIZE, resync_seconds=HISTORY_RESYNC_SECONDS):
+        self.client = client
+        self.max_messages = max_messages
+        self.max_channels = max_channels
+        self.page_size = page_size
+        self.resync_seconds = resync_seconds
+
+        self._channels = OrderedDict()   # channel id -> _ChannelHistory, least recently used first
+        self._lock = threading.Lock()
+
+        self.api_calls = 0
+        self.cache_hits = 0              # messages() calls answered without Slack
+        self.ingested = 0
+
+    def _channel(self, channel_id):
+        with self._lock:
+            state = self._channels.get(channel_id)
+            if state is None:
+                state = self._channels[channel_id] = _ChannelHistory()
+                while len(self._channels) > self.max_channels:
+                    self._channels.popitem(last=False)
+            else:
+                self._channels.move_to_end(channel_id)
+            return state
+
+    # --- CACHE ---
+
+    def _store(self, state, msg):
+        ts = msg.get("ts")
+        if not ts or "subtype" in msg:
+            return
+        key = ts_key(ts)
+        if key not in state.messages:
+            bisect.insort(state.keys, key)
+        state.messages[key] = (ts, format_message(msg))
+        if state.cursor is None or key > ts_key(state.cursor):
+            state.cursor = ts
+
+    def _remove(self, state, ts):
+        key = ts_key(ts)
+        if state.messages.pop(key, None) is not None:
+            del state.keys[bisect.bisect_left(state.keys, key)]
+
+    def _trim(self, state):
+        excess = len(state.keys) - self.max_messages
+        if excess > 0:
+            for key in state.keys[:excess]:
+                del state.messages[key]
+            del state.keys[:excess]
+            state.complete = False
+
+    def ingest(self, event):
+        """Applies a `message` event (new message, edit or deletion) to the cache."""
+        channel_id = event.get("channel")
+        if not channel_id:
+            return
+        with self._lock:
+            state = self._channels.get(channel_id)
+        if state is None:
+            return  # Never fetched; the first messages() call loads it from Slack
+
+        subtype = event.get("subtype")
+        with state.lock:
+            if subtype == "message_changed":
+                edited = event.get("message", {})
+                if ts_key(edited.get("ts")) in state.messages:
+                    self._store(state, edited)
+            elif subtype == "message_deleted":
+                self._remove(state, event.get("deleted_ts"))
+            elif subtype is None:
+                if is_thread_reply(event):
+                    return
+                self._store(state, event)
+                self._trim(state)
+            else:
+                return
+            self.ingested += 1
+
+    # --- SLACK ---
+
+    def _fetch(self, channel_id, limit=None, **params):
+        """Pages through conversations.history (newest first) until `limit` messages or the end."""
+        messages = []
+        cursor = None
+        while True:
+            page_size = self.page_size if limit is None else min(self.page_size, limit - len(messages))
+            result = self.client.conversations_history(
+                channel=channel_id, limit=page_size, cursor=cursor, **params
+            )
+            self.api_calls += 1
+            messages.extend(result.get("messages", []))
+            cursor = (result.get("response_metadata") or {}).get("next_cursor")
+            if not result.get("has_more") or not cursor:
+                return messages, True
+            if limit is not None and len(messages) >= limit:
+                return messages, False
+
+    def _sync_newer(self, channel_id, state):
+        if state.cursor is None:
+            messages, complete = self._fetch(channel_id, limit=self.page_size)
+            state.complete = complete
+        else:
+            messages, _ = self._fetch(channel_id, oldest=state.cursor)
+        for msg in messages:
+            self._store(state, msg)
+        state.synced_at = time.monotonic()
+
+    def _backfill(self, channel_id, state, wanted):
+        latest = state.messages[state.keys[0]][0] if state.keys else None
+        messages, complete = self._fetch(channel_id, limit=wanted, latest=latest)
+        for msg in messages:
+            self._store(state, msg)
+        state.complete = complete
+
+    def messages(self, channel_id, limit):
+        """The newest `limit` messages as (ts, "User X: text") pairs, oldest first."""
+        state = self._channel(channel_id)
+        limit = min(limit, self.max_messages)
+        with state.lock:
+            fetched = False
+            try:
+                if state.synced_at is None or time.monotonic() - state.synced_at > self.resync_seconds:
+                    self._sync_newer(channel_id, state)
+                    fetched = True
+                if len(state.keys) < limit and not state.complete:
+                    self._backfill(channel_id, state, limit - len(state.keys))
+                    fetched = True
+            except Exception as e:
+                logging.error(f"History Fetch Error: {e}")
+            self._trim(state)
+            if not fetched:
+                self.cache_hits += 1
+            return [state.messages[key] for key in state.keys[-limit:]]
+
+    def stats(self):
+        with self._lock:
+            channels = list(self._channels.values())
+        return {
+            "channels": len(channels),
+            "messages": sum(len(state.keys) for state in channels),
+            "api_calls": self.api_calls,
+            "cache_hits": self.cache_hits,
+            "ingested": self.ingested,
+        }
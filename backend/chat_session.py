@@ -0,0 +1,166 @@
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from dotenv import load_dotenv
+
+from context_packer import CHAT_TOKEN_BUDGET, pack_chat
+from llm_usage import create_completion
+
+load_dotenv()
+
+# --- CONFIG ---
+SESSION_KEEP_TURNS = int(os.environ.get("SESSION_KEEP_TURNS", "6"))     # User+assistant exchanges kept verbatim
+SESSION_FOLD_TURNS = int(os.environ.get("SESSION_FOLD_TURNS", "4"))     # Fold once this many more have piled up
+
+SESSION_SUMMARY_SYSTEM_PROMPT = """
+You maintain the running summary of a conversation between a user and an AI advisor.
+
+INPUT DATA:
+1. CURRENT SUMMARY of the conversation so far (may be empty).
+2. NEW TURNS that happened after that summary was written.
+
+YOUR TASK:
+- Return the updated summary that covers both.
+- Keep the user's goals, constraints, numbers, decisions and the advice already given; drop pleasantries.
+- Stay compact: at most 300 words, plain text, no preamble.
+"""
+
+
+def session_summary_messages(previous_summary, turns):
+    """Chat messages for folding `turns` (role/content dicts) into the running summary."""
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in turns)
+    return [
+        {"role": "system", "content": SESSION_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": (
+            f"CURRENT SUMMARY:\n{previous_summary or '(none yet)'}\n\n"
+            f"NEW TURNS:\n{transcript}"
+        )}
+    ]
+
+
+def turn_summarizer(client, model="gpt-4o"):
+    """A ChatSession summarize_fn that folds older turns into the session summary with `client`."""
+    def summarize_turns(previous_summary, turns):
+        try:
+            response = create_completion(
+                client,
+                persona="session_summary",
+                model=model,
+                messages=session_summary_messages(previous_summary, turns),
+                temperature=0.2,
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"\n[Session summary error]: {e}")
+            return None
+    return summarize_turns
+
+
+class ChatSession:
+    """
+    Bounded chat history for the CLI agents. The last `keep_turns` exchanges
+    stay verbatim; older ones are folded into a running summary on a
+    background thread between turns, so a prompt is always the system
+    prompt + summary + recent turns, capped at `token_ceiling`. With a
+    `path`, the session is saved after every turn and resumed on start.
+
+    summarize_fn(previous_summary, turns) returns the new summary or None
+    (the turns are then kept and retried at the next fold).
+    """
+
+    def __init__(self, system_prompt, summarize_fn, path=None, keep_turns=SESSION_KEEP_TURNS,
+                 fold_turns=SESSION_FOLD_TURNS, token_ceiling=CHAT_TOKEN_BUDGET):
+        self.system_prompt = system_prompt
+        self.summarize_fn = summarize_fn
+        self.path = path
+        self.keep_turns = keep_turns
+        self.fold_turns = fold_turns
+        self.token_ceiling = token_ceiling
+
+        self.summary = ""
+        self.turns = []               # role/content dicts after the summary, oldest first
+        self._lock = threading.Lock()
+        self._folding = None          # Background fold thread, if one is running
+
+        self.folds = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    # --- PERSISTENCE ---
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self.summary = state.get("summary", "")
+            self.turns = state.get("turns", [])
+            logging.info(f"Resumed session from {self.path} ({len(self.turns)} recent messages)")
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Could not resume session ({e}); starting fresh.")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            state = {"summary": self.summary, "turns": list(self.turns)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"⚠️ Could not save session: {e}")
+
+    # --- TURNS ---
+
+    def add(self, role, content):
+        with self._lock:
+            self.turns.append({"role": role, "content": content})
+
+    def messages(self):
+        """The prompt for the next call: system prompt, summary, recent turns; within token_ceiling."""
+        with self._lock:
+            messages = [{"role": "system", "content": self.system_prompt}]
+            if self.summary:
+                messages.append({"role": "system", "content": f"CONVERSATION SO FAR (summary):\n{self.summary}"})
+            messages.extend(self.turns)
+        return pack_chat(messages, self.token_ceiling)
+
+    def end_turn(self):
+        """Call after the assistant's reply: saves and, if enough has piled up, folds in the background."""
+        self.save()
+        with self._lock:
+            due = len(self.turns) >= 2 * (self.keep_turns + self.fold_turns)
+            if not due or (self._folding is not None and self._folding.is_alive()):
+                return
+            # Run in a copy of the caller's context so the fold's LLM usage keeps its attribution
+            self._folding = threading.Thread(
+                target=contextvars.copy_context().run, args=(self._fold,), name="session-fold", daemon=True
+            )
+            self._folding.start()
+
+    def _fold(self):
+        with self._lock:
+            count = len(self.turns) - 2 * self.keep_turns
+            old, summary = self.turns[:count], self.summary
+        summary = self.summarize_fn(summary, old)
+        if not summary:
+            logging.warning("Session fold returned nothing; keeping the turns verbatim")
+            return
+        with self._lock:
+            # Turns added meanwhile sit after `old`, so dropping the first `count` is safe
+            self.summary = summary.strip()
+            del self.turns[:count]
+            self.folds += 1
+        self.save()
+
+    def close(self, timeout=30):
+        """Waits for a running fold so its result is saved."""
+        folding = self._folding
+        if folding is not None:
+            folding.join(timeout)
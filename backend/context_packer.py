@@ -0,0 +1,110 @@
+import os
+import re
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+try:
+    import tiktoken  # Optional: exact counts for OpenAI models
+except ImportError:
+    tiktoken = None
+
+load_dotenv()
+
+# --- CONFIG ---
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))          # Conversation context per prompt
+CHAT_TOKEN_BUDGET = int(os.environ.get("CHAT_TOKEN_BUDGET", "8000"))                  # Whole CLI chat history, system prompt included
+CONTEXT_MAX_MESSAGE_TOKENS = int(os.environ.get("CONTEXT_MAX_MESSAGE_TOKENS", "400"))  # Longer messages are elided
+COMPLETION_TOKEN_RESERVE = int(os.environ.get("COMPLETION_TOKEN_RESERVE", "1024"))
+MODEL_CONTEXT_WINDOW = int(os.environ.get("MODEL_CONTEXT_WINDOW", "128000"))          # gpt-4o
+MESSAGE_OVERHEAD_TOKENS = 4   # Role / separators per chat message
+
+# Without tiktoken: words count ~1 token per 4 characters, every symbol or
+# CJK character counts as one, which tracks o200k_base closely on chat text
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_À-ɏ]+|[^\sA-Za-z0-9_À-ɏ]")
+_WORD_RE = re.compile(r"\w+")
+
+_encoding = tiktoken.get_encoding("o200k_base") if tiktoken is not None else None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    """Local, offline token count (exact with tiktoken installed, a close estimate otherwise)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum((len(t) + 3) // 4 if t[0].isalnum() or t[0] == "_" else 1 for t in _TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keeps the head and tail of an overlong text and elides the middle."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(int(len(text) * max_tokens / tokens) - 40, 0)
+    head, tail = text[:keep * 2 // 3], text[len(text) - keep // 3:] if keep // 3 else ""
+    return f"{head} … [{tokens - max_tokens} tokens elided] … {tail}".strip()
+
+
+def context_budget(system_prompt="", reserve=COMPLETION_TOKEN_RESERVE, budget=CONTEXT_TOKEN_BUDGET,
+                   window=MODEL_CONTEXT_WINDOW):
+    """Tokens left for context after the system prompt and the completion reserve."""
+    return max(min(budget, window - count_tokens(system_prompt) - reserve), 0)
+
+
+def _relevance(line, query_words):
+    return len(query_words.intersection(w.lower() for w in _WORD_RE.findall(line)))
+
+
+def pack_lines(items, budget=CONTEXT_TOKEN_BUDGET, max_message_tokens=CONTEXT_MAX_MESSAGE_TOKENS, query=None):
+    """
+    Fills `budget` tokens from (key, line) items (oldest first) and returns the
+    chosen items in their original order, each line elided to about
+    `max_message_tokens`. Newest messages win by default; with `query`, lines
+    sharing the most words with it go first (newer first among equals).
+    """
+    order = range(len(items) - 1, -1, -1)
+    if query:
+        query_words = {w.lower() for w in _WORD_RE.findall(query)}
+        scores = [_relevance(line, query_words) for _, line in items]
+        order = sorted(order, key=lambda i: (-scores[i], -i))
+
+    chosen = {}
+    used = 0
+    for i in order:
+        key, line = items[i]
+        line = truncate_to_tokens(line, max_message_tokens)
+        cost = count_tokens(line) + 1   # + newline
+        if used + cost > budget:
+            if query:
+                continue    # A shorter, less relevant line may still fit
+            break
+        chosen[i] = (key, line)
+        used += cost
+    return [chosen[i] for i in sorted(chosen)]
+
+
+def pack_chat(messages, budget=CHAT_TOKEN_BUDGET, max_message_tokens=CONTEXT_MAX_MESSAGE_TOKENS):
+    """
+    Trims a chat history to `budget` tokens: leading system messages are
+    always kept, then as many of the newest turns as fit (the latest turn is
+    elided rather than dropped). Returns a new list; `messages` is untouched.
+    """
+    head = 0
+    while head < len(messages) and messages[head]["role"] == "system":
+        head += 1
+    used = sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages[:head])
+
+    kept = []
+    for message in reversed(messages[head:]):
+        content = message["content"]
+        cost = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > budget:
+            if kept:
+                break
+            content = truncate_to_tokens(content, max(budget - used - MESSAGE_OVERHEAD_TOKENS, max_message_tokens))
+            cost = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        kept.append({**message, "content": content})
+        used += cost
+    return messages[:head] + kept[::-1]
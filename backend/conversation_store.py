@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+MAX_MESSAGES = int(os.environ.get("CONVERSATION_MAX_MESSAGES", "20"))            # Per channel
+MAX_CHANNEL_CHARS = int(os.environ.get("CONVERSATION_MAX_CHANNEL_CHARS", "20000"))
+MAX_TOTAL_CHARS = int(os.environ.get("CONVERSATION_MAX_TOTAL_CHARS", str(20 * 1024 * 1024)))
+MAX_CHANNELS = int(os.environ.get("CONVERSATION_MAX_CHANNELS", "10000"))
+
+
+class _Channel:
+    __slots__ = ("lines", "transcript", "chars", "seq")
+
+    def __init__(self, max_messages):
+        self.lines = deque(maxlen=max_messages)
+        self.transcript = ""   # "\n".join(lines), kept up to date on every append
+        self.chars = 0
+        self.seq = 0           # messages ever appended; the newest line has this sequence number
+
+
+class ConversationStore:
+    """
+    Recent messages per channel / DM, so conversations never leak into each
+    other. Each channel is a fixed-size ring buffer (deque with maxlen) with
+    its transcript pre-joined and updated incrementally, capped by message
+    count and characters. A global character / channel cap evicts the
+    channels that have been idle longest. All methods are thread-safe.
+    """
+
+    def __init__(self, max_messages=MAX_MESSAGES, max_channel_chars=MAX_CHANNEL_CHARS,
+                 max_total_chars=MAX_TOTAL_CHARS, max_channels=MAX_CHANNELS):
+        self.max_messages = max_messages
+        self.max_channel_chars = max_channel_chars
+        self.max_total_chars = max_total_chars
+        self.max_channels = max_channels
+
+        self._channels = OrderedDict()   # channel id -> _Channel, least recently active first
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.evicted_channels = 0
+
+    def append(self, channel_id, line):
+        """Adds a message line to the channel and returns its sequence number."""
+        line = line[:self.max_channel_chars]
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                channel = self._channels[channel_id] = _Channel(self.max_messages)
+            else:
+                self._channels.move_to_end(channel_id)
+
+            if len(channel.lines) == channel.lines.maxlen:
+                self._drop_oldest(channel)
+            channel.lines.append(line)
+            channel.seq += 1
+            channel.transcript = f"{channel.transcript}\n{line}" if len(channel.lines) > 1 else line
+            channel.chars += len(line)
+            self._chars += len(line)
+
+            while channel.chars > self.max_channel_chars and len(channel.lines) > 1:
+                self._drop_oldest(channel)
+            self._evict_idle(channel_id)
+            return channel.seq
+
+    def _drop_oldest(self, channel):
+        oldest = channel.lines.popleft()
+        channel.transcript = channel.transcript[len(oldest) + 1:]
+        channel.chars -= len(oldest)
+        self._chars -= len(oldest)
+
+    def _evict_idle(self, keep):
+        while (self._chars > self.max_total_chars or len(self._channels) > self.max_channels) and len(self._channels) > 1:
+            channel_id, channel = next(iter(self._channels.items()))
+            if channel_id == keep:
+                break
+            del self._channels[channel_id]
+            self._chars -= channel.chars
+            self.evicted_channels += 1
+
+    def transcript(self, channel_id, after=None):
+        """The pre-joined transcript; with `after`, only the lines whose sequence number is above it."""
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                return ""
+            newer = len(channel.lines) if after is None else min(max(channel.seq - after, 0), len(channel.lines))
+            if newer == len(channel.lines):
+                return channel.transcript
+            if newer == 0:
+                return ""
+            # The newest `newer` lines are a suffix of the transcript: no join needed
+            chars = sum(len(line) for line in islice(reversed(channel.lines), newer)) + newer - 1
+            return channel.transcript[len(channel.transcript) - chars:]
+
+    def messages(self, channel_id):
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            return list(channel.lines) if channel is not None else []
+
+    def recent(self, channel_id):
+        """[(sequence number, line)] oldest first; numbers keep increasing across evictions from the ring."""
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                return []
+            first = channel.seq - len(channel.lines) + 1
+            return list(enumerate(channel.lines, first))
+
+    def clear(self, channel_id=None):
+        with self._lock:
+            if channel_id is None:
+                self._channels.clear()
+                self._chars = 0
+                return
+            channel = self._channels.pop(channel_id, None)
+            if channel is not None:
+                self._chars -= channel.chars
+
+    def stats(self):
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "chars": self._chars,
+                "evicted_channels": self.evicted_channels,
+            }
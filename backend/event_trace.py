@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+EVENT_TRACE_PATH = os.environ.get("EVENT_TRACE_PATH")   # Unset = recording off
+TRACE_EVENT_TYPES = ("message", "app_mention")
+
+
+def trace_record(body, bot_user_id=None, timestamp=None):
+    """One JSONL trace line: arrival time, the bot's user id (to rewrite mentions on replay) and the envelope."""
+    return json.dumps({
+        "t": time.time() if timestamp is None else timestamp,
+        "bot_user_id": bot_user_id,
+        "body": body,
+    })
+
+
+def load_trace(path):
+    """[(offset seconds from the first event, bot_user_id, body)] from a JSONL trace, in arrival order."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                records.append((record.get("t", 0.0), record.get("bot_user_id"), record["body"]))
+    records.sort(key=lambda r: r[0])
+    first = records[0][0] if records else 0.0
+    return [(t - first, bot_user_id, body) for t, bot_user_id, body in records]
+
+
+_listener_executor = None   # None = Bolt's default listener pool
+
+
+def use_listener_executor(executor):
+    """Makes bots imported after this call run their listeners on `executor` (see benchmarks/soak.py)."""
+    global _listener_executor
+    _listener_executor = executor
+
+
+def listener_executor():
+    """The executor the bots pass to App(listener_executor=...); None keeps Bolt's default."""
+    return _listener_executor
+
+def record_events(app, path=EVENT_TRACE_PATH):
+    """
+    Bolt middleware that appends every message / app_mention envelope the
+    app receives to a JSONL trace, for replay by benchmarks/soak.py. A no-op
+    unless EVENT_TRACE_PATH (or `path`) is set.
+    """
+    if not path:
+        return app
+    lock = threading.Lock()
+    logging.info(f"Recording Slack events to {path}")
+
+    @app.middleware
+    def record_event(body, context, next):
+        if (body.get("event") or {}).get("type") in TRACE_EVENT_TYPES:
+            line = trace_record(body, context.bot_user_id)
+            try:
+                with lock, open(path, "a") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logging.warning(f"⚠️ Could not record event: {e}")
+        next()
+
+    return app
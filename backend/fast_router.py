@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from tracing import span
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.environ.get("FAST_ROUTER_MODEL", os.path.join(BASE_DIR, "router_model.json"))
+ROUTER_LOG_PATH = os.environ.get("ROUTER_LOG_PATH", os.path.join(BASE_DIR, "router_decisions.jsonl"))
+# Minimum confidence for a local decision. Higher = more accurate, fewer LLM calls saved.
+THRESHOLD = float(os.environ.get("FAST_ROUTER_THRESHOLD", "0.9"))
+# Keyword-rule scores are not calibrated, so without a trained model they stay below THRESHOLD
+# (every query goes to the LLM router) unless this is set, e.g. after `evaluate` on a keyword-only run
+KEYWORD_CONFIDENCE_CAP = os.environ.get("FAST_ROUTER_KEYWORD_CAP")
+# Fraction of local decisions that are also sent to the LLM router in the background and logged,
+# so the training corpus (and `evaluate`) covers the queries the fast path answers too
+AUDIT_RATE = float(os.environ.get("FAST_ROUTER_AUDIT_RATE", "0.05"))
+
+DECISIONS = ("TECH", "BUSINESS", "BOTH")
+
+# Used when no trained model is available (and as extra features when one is)
+TECH_KEYWORDS = {
+    "api", "apis", "architecture", "backend", "cache", "caching", "code", "database", "db", "deploy",
+    "deployment", "design", "docker", "frontend", "infrastructure", "kafka", "kubernetes", "latency",
+    "microservice", "microservices", "monolith", "nosql", "performance", "postgres", "queue",
+    "redis", "scalability", "scale", "schema", "server", "serverless", "sql", "system", "throughput",
+}
+BUSINESS_KEYWORDS = {
+    "budget", "budgeting", "business", "cash", "cashflow", "cost", "costs", "expense", "expenses",
+    "finance", "financial", "forecast", "headcount", "investment", "licensing", "margin", "money",
+    "price", "pricing", "profit", "revenue", "roi", "saving", "savings", "spend", "strategy", "tco",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    words = _TOKEN_RE.findall(text.lower())
+    features = list(words)
+    features.extend(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    features.extend("kw:tech" for w in words if w in TECH_KEYWORDS)
+    features.extend("kw:biz" for w in words if w in BUSINESS_KEYWORDS)
+    return features
+
+
+# --- MODEL ---
+
+class FastRouter:
+    """
+    In-process TECH/BUSINESS/BOTH classifier. Uses a multinomial Naive Bayes
+    model trained from logged router decisions, or keyword rules when no model
+    has been trained yet. Only decides locally when confident; otherwise the
+    caller's LLM router is asked. Keyword rules are uncalibrated and capped
+    below the threshold unless FAST_ROUTER_KEYWORD_CAP says otherwise.
+    """
+
+    def __init__(self, model=None, threshold=THRESHOLD, keyword_cap=KEYWORD_CONFIDENCE_CAP, audit_rate=AUDIT_RATE):
+        self.model = model
+        self.threshold = threshold
+        # Largest confidence the keyword rules may report; just under the threshold by default
+        self.keyword_cap = float(keyword_cap) if keyword_cap is not None else math.nextafter(threshold, 0.0)
+        self.audit_rate = audit_rate
+        self.local_hits = 0
+        self.llm_fallbacks = 0
+        self.audits = 0
+        self._audit_tasks = set()
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, threshold=THRESHOLD):
+        model = None
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    model = json.load(f)
+                logging.info(f"Fast router model loaded from {path}")
+            except (OSError, ValueError) as e:
+                logging.warning(f"⚠️ Could not load fast router model ({e}); using keyword rules.")
+        return cls(model, threshold)
+
+    def predict(self, text):
+        """Returns (decision, confidence) without any network call."""
+        if self.model:
+            return self._predict_model(text)
+        decision, confidence = self._predict_keywords(text)
+        return decision, min(confidence, self.keyword_cap)
+
+    def _predict_model(self, text):
+        scores = {}
+        for label in self.model["classes"]:
+            log_probs = self.model["feature_log_prob"][label]
+            unknown = self.model["unknown_log_prob"][label]
+            score = self.model["class_log_prior"][label]
+            for feature in tokenize(text):
+                score += log_probs.get(feature, unknown)
+            scores[label] = score
+        # Softmax over log scores -> posterior
+        top = max(scores.values())
+        total = sum(math.exp(s - top) for s in scores.values())
+        best = max(scores, key=scores.get)
+        return best, 1.0 / total
+
+    def _predict_keywords(self, text):
+        words = _TOKEN_RE.findall(text.lower())
+        tech = sum(1 for w in words if w in TECH_KEYWORDS)
+        biz = sum(1 for w in words if w in BUSINESS_KEYWORDS)
+        if tech and biz:
+            return "BOTH", 0.9 if min(tech, biz) >= 2 else 0.75
+        if tech:
+            return "TECH", 0.95 if tech >= 2 else 0.8
+        if biz:
+            return "BUSINESS", 0.95 if biz >= 2 else 0.8
+        return "TECH", 0.0
+
+    def route(self, text, llm_route):
+        """
+        Returns (decision, reasoning, source). llm_route(text) -> (decision, reasoning)
+        is only called when the local prediction is below the threshold.
+        """
+        with span("router") as s:
+            guess, confidence = self.predict(text)
+            s.set(local_guess=guess, confidence=round(confidence, 4))
+            if confidence >= self.threshold:
+                self.local_hits += 1
+                s.set(decision=guess, source="local")
+                if self._should_audit():
+                    threading.Thread(target=contextvars.copy_context().run,
+                                     args=(self._audit, text, guess, confidence, llm_route),
+                                     name="router-audit", daemon=True).start()
+                return guess, f"Fast-path router ({confidence:.0%} confident)", "local"
+
+            self.llm_fallbacks += 1
+            decision, reasoning = llm_route(text)
+            log_decision(text, decision, reasoning, local_guess=guess, confidence=round(confidence, 4))
+            s.set(decision=decision, source="llm")
+            return decision, reasoning, "llm"
+
+    async def route_async(self, text, llm_route):
+        """route() for asyncio callers; llm_route must be a coroutine function."""
+        with span("router") as s:
+            guess, confidence = self.predict(text)
+            s.set(local_guess=guess, confidence=round(confidence, 4))
+            if confidence >= self.threshold:
+                self.local_hits += 1
+                s.set(decision=guess, source="local")
+                if self._should_audit():
+                    task = asyncio.create_task(self._audit_async(text, guess, confidence, llm_route))
+                    self._audit_tasks.add(task)
+                    task.add_done_callback(self._audit_tasks.discard)
+                return guess, f"Fast-path router ({confidence:.0%} confident)", "local"
+
+            self.llm_fallbacks += 1
+            decision, reasoning = await llm_route(text)
+            log_decision(text, decision, reasoning, local_guess=guess, confidence=round(confidence, 4))
+            s.set(decision=decision, source="llm")
+            return decision, reasoning, "llm"
+
+    # --- AUDIT SAMPLE ---
+    # A local decision is never checked by the LLM, so without a sample of them the
+    # logged corpus would only hold the queries the fast path was unsure about.
+
+    def _should_audit(self):
+        return bool(ROUTER_LOG_PATH) and random.random() < self.audit_rate
+
+    def _audit(self, text, guess, confidence, llm_route):
+        try:
+            decision, reasoning = llm_route(text)
+        except Exception as e:
+            logging.warning(f"Router audit failed: {e}")
+            return
+        self._log_audit(text, guess, confidence, decision, reasoning)
+
+    async def _audit_async(self, text, guess, confidence, llm_route):
+        try:
+            decision, reasoning = await llm_route(text)
+        except Exception as e:
+            logging.warning(f"Router audit failed: {e}")
+            return
+        self._log_audit(text, guess, confidence, decision, reasoning)
+
+    def _log_audit(self, text, guess, confidence, decision, reasoning):
+        self.audits += 1
+        if decision != guess:
+            logging.info(f"Router audit: local {guess} ({confidence:.0%}) vs LLM {decision}")
+        log_decision(text, decision, reasoning, local_guess=guess, confidence=round(confidence, 4),
+                     source="local_audit")
+
+
+def train(examples, alpha=0.5):
+    """examples: iterable of (query, decision). Returns a JSON-serialisable model."""
+    class_counts = Counter()
+    feature_counts = defaultdict(Counter)
+    vocabulary = set()
+    for query, decision in examples:
+        class_counts[decision] += 1
+        features = tokenize(query)
+        feature_counts[decision].update(features)
+        vocabulary.update(features)
+
+    total = sum(class_counts.values())
+    vocab_size = len(vocabulary) + 1
+    model = {"classes": sorted(class_counts), "class_log_prior": {}, "feature_log_prob": {}, "unknown_log_prob": {}}
+    for label in model["classes"]:
+        counts = feature_counts[label]
+        denominator = sum(counts.values()) + alpha * vocab_size
+        model["class_log_prior"][label] = math.log(class_counts[label] / total)
+        model["feature_log_prob"][label] = {f: math.log((c + alpha) / denominator) for f, c in counts.items()}
+        model["unknown_log_prob"][label] = math.log(alpha / denominator)
+    return model
+
+
+# --- DECISION LOG (training corpus) ---
+_log_lock = threading.Lock()
+
+
+def log_decision(query, decision, reasoning, **extra):
+    """
+    Appends an LLM router decision to the JSONL corpus used for training: every
+    LLM fallback, plus the audited sample of local decisions (source="local_audit").
+    """
+    if not ROUTER_LOG_PATH or decision not in DECISIONS:
+        return
+    record = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "query": query,
+        "decision": decision,
+        "reasoning": reasoning,
+    }
+    record.update(extra)
+    try:
+        with _log_lock, open(ROUTER_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logging.warning(f"⚠️ Could not log router decision: {e}")
+
+
+# --- SHARED INSTANCE ---
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = FastRouter.load()
+    return _router
+
+
+# --- TRAINING / EVALUATION CLI ---
+
+def load_corpus(path):
+    examples = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("decision") in DECISIONS and record.get("query"):
+                examples.append((record["query"], record["decision"]))
+    return examples
+
+
+def evaluate(router, examples, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)):
+    """
+    Agreement with the LLM router labels, per confidence threshold. Keyword
+    rules are scored uncapped, so `-m ""` shows where FAST_ROUTER_KEYWORD_CAP
+    could safely sit.
+    """
+    predict = router._predict_model if router.model else router._predict_keywords
+    predictions = []
+    start = time.perf_counter()
+    for query, label in examples:
+        decision, confidence = predict(query)
+        predictions.append((decision, confidence, label))
+    per_query_us = (time.perf_counter() - start) / max(len(examples), 1) * 1e6
+
+    overall = sum(1 for d, _, label in predictions if d == label) / max(len(predictions), 1)
+    print(f"Examples: {len(predictions)} | overall agreement: {overall:.1%} | {per_query_us:.1f} µs/query")
+    print(f"{'threshold':>9} | {'calls saved':>11} | {'local agreement':>15} | {'end-to-end agreement':>20}")
+    for threshold in thresholds:
+        local = [(d, label) for d, c, label in predictions if c >= threshold]
+        saved = len(local) / max(len(predictions), 1)
+        local_agreement = sum(1 for d, label in local if d == label) / len(local) if local else float("nan")
+        # LLM fallbacks agree with themselves by definition
+        end_to_end = (sum(1 for d, label in local if d == label) + len(predictions) - len(local)) / max(len(predictions), 1)
+        print(f"{threshold:>9.2f} | {saved:>11.1%} | {local_agreement:>15.1%} | {end_to_end:>20.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / evaluate the local fast-path router.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_cmd = sub.add_parser("train", help="Train a model from a JSONL corpus of {query, decision}")
+    train_cmd.add_argument("corpus")
+    train_cmd.add_argument("-o", "--output", default=MODEL_PATH)
+    train_cmd.add_argument("--holdout", type=float, default=0.2, help="Fraction kept aside for evaluation")
+    train_cmd.add_argument("--seed", type=int, default=13)
+
+    eval_cmd = sub.add_parser("evaluate", help="Measure agreement with the LLM router on a JSONL corpus")
+    eval_cmd.add_argument("corpus")
+    eval_cmd.add_argument("-m", "--model", default=MODEL_PATH)
+
+    args = parser.parse_args()
+    examples = load_corpus(args.corpus)
+    if not examples:
+        print("No usable examples found (need 'query' and 'decision' fields).")
+        return
+
+    if args.command == "train":
+        random.Random(args.seed).shuffle(examples)
+        split = int(len(examples) * (1 - args.holdout)) if args.holdout else len(examples)
+        model = train(examples[:split])
+        with open(args.output, "w") as f:
+            json.dump(model, f)
+        print(f"Model trained on {split} examples -> {args.output}")
+        if split < len(examples):
+            print("\n--- Holdout evaluation ---")
+            evaluate(FastRouter(model), examples[split:])
+    else:
+        evaluate(FastRouter.load(args.model), examples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Production server for server.py:
+#     gunicorn -c gunicorn.conf.py server:app
+#
+# Threaded workers: every open SSE stream holds one thread while its pipeline
+# waits on OpenAI, so threads (not processes) carry the concurrency.
+# The connection limits are `threads` (requests served at once, per worker) and
+# api_stream.StreamSlots (API_MAX_STREAMS open streams, per worker); gthread
+# ignores gunicorn's `worker_connections`, so it is not set here.
+# API_MAX_STREAMS should stay below `threads`, so /metrics and new requests are
+# still answered (with a 503) when every stream slot is taken.
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+bind = os.environ.get("SERVER_BIND", "127.0.0.1:5000")   # Put a proxy in front rather than exposing this
+worker_class = "gthread"
+workers = int(os.environ.get("SERVER_WORKERS", str(min(multiprocessing.cpu_count(), 4))))
+threads = int(os.environ.get("SERVER_THREADS", "32"))                       # Requests served at once, per worker
+backlog = int(os.environ.get("SERVER_BACKLOG", "512"))                      # Connections waiting to be accepted
+
+# gthread workers heartbeat from their main thread, so `timeout` only kills hung
+# workers; long streams are cut off by API_REQUEST_TIMEOUT (api_stream.py)
+timeout = int(os.environ.get("SERVER_WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", "30"))     # Open streams get this long on restart
+keepalive = int(os.environ.get("SERVER_KEEPALIVE", "5"))
+
+# Request size limits (bodies are capped by API_MAX_BODY_BYTES in server.py)
+limit_request_line = 8190
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# Recycle workers now and then so a slow leak cannot grow forever
+max_requests = int(os.environ.get("SERVER_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", "500"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("SERVER_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # Each worker writes its own metrics snapshot; /metrics merges them (see metrics.py)
+    from metrics import start_metrics
+    start_metrics("server")
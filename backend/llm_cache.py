@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from llm_usage import create_completion, record_cache_hit, usage_attributes
+from metrics import cache_family, register_collector
+from similarity_cache import get_similarity_cache, similarity_target
+from tracing import span
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(BASE_DIR, "llm_cache.sqlite3"))
+CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(24 * 3600)))           # seconds
+MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "1000"))
+DISK_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "50000"))
+EVICT_EVERY = 100  # Check the on-disk size every N writes
+
+
+def make_key(model, messages, temperature=None, response_format=None):
+    """Stable hash of everything that influences the completion."""
+    material = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "response_format": response_format},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier LRU cache for completions: an in-memory OrderedDict in front of
+    an on-disk SQLite table. Entries expire after `ttl` seconds and each tier
+    is bounded by entry count (least recently used goes first).
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        register_collector(self.collect_metrics)
+
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ LLM cache disk tier disabled ({e}); using memory only.")
+                self._db = None
+
+    # --- LOOKUP ---
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, expires_at = row
+                        if expires_at > now:
+                            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                            self._remember(key, value, expires_at)
+                            self.disk_hits += 1
+                            return value
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                except sqlite3.Error as e:
+                    logging.warning(f"⚠️ LLM cache read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now),
+                )
+                self._writes += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict_disk(now)
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ LLM cache write failed: {e}")
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    # --- STATS ---
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def collect_metrics(self):
+        return [cache_family("llm", self.memory_hits + self.disk_hits, self.misses)]
+
+
+# --- SHARED INSTANCE ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+# --- COMPLETION WRAPPERS ---
+
+def _key_for(kwargs):
+    return make_key(kwargs.get("model"), kwargs.get("messages"), kwargs.get("temperature"), kwargs.get("response_format"))
+
+
+def lookup_cached(kwargs, similar=False):
+    """
+    Exact cache first, then (only if `similar`) the near-duplicate cache.
+    Returns (key, target, content); target is None unless near matching applies.
+    """
+    key = _key_for(kwargs)
+    content = get_cache().get(key)
+    target = similarity_target(kwargs) if similar else None
+    if content is None and target is not None:
+        content, similarity = get_similarity_cache().lookup(*target)
+        if content is not None:
+            logging.info(f"LLM near-duplicate cache hit (similarity {similarity:.2f})")
+    return key, target, content
+
+
+def store_cached(key, target, content):
+    get_cache().set(key, content)
+    if target is not None:
+        get_similarity_cache().add(*target, content)
+
+
+def cached_chat_completion(client, bypass_cache=False, persona=None, similar=False, **kwargs):
+    """
+    Calls client.chat.completions.create(**kwargs) unless an identical (or,
+    with similar=True, a near-identical short query) request is cached.
+    Returns (content, usage); usage is None when served from cache. Calls and
+    hits are accounted to `persona` (see llm_usage).
+    """
+    with span("llm", model=kwargs.get("model"), stream=False) as s:
+        if not CACHE_ENABLED or bypass_cache:
+            response = create_completion(client, persona, **kwargs)
+            s.set(cache_hit=False, **usage_attributes(response.usage))
+            return response.choices[0].message.content, response.usage
+
+        key, target, content = lookup_cached(kwargs, similar)
+        if content is not None:
+            s.set(cache_hit=True)
+            record_cache_hit(kwargs.get("model"), persona)
+            return content, None
+
+        response = create_completion(client, persona, **kwargs)
+        content = response.choices[0].message.content
+        if content:
+            store_cached(key, target, content)
+        s.set(cache_hit=False, **usage_attributes(response.usage))
+        return content, response.usage
+
+
+def cached_chat_stream(client, bypass_cache=False, usage_callback=None, persona=None, similar=False, **kwargs):
+    """
+    Streaming variant: yields text chunks. A cache hit is yielded as a single
+    chunk; a miss is streamed from the API and cached once complete.
+    usage_callback(usage) is called with the token usage of a streamed miss.
+    """
+    # Not activated: the caller does its own work (Slack updates, ...) between chunks
+    with span("llm", activate=False, model=kwargs.get("model"), stream=True) as s:
+        use_cache = CACHE_ENABLED and not bypass_cache
+        if use_cache:
+            key, target, content = lookup_cached(kwargs, similar)
+            if content is not None:
+                s.set(cache_hit=True)
+                record_cache_hit(kwargs.get("model"), persona)
+                yield content
+                return
+
+        parts = []
+        start = time.perf_counter()
+        # create_completion requests usage on streams and records it
+        for chunk in create_completion(client, persona, stream=True, **kwargs):
+            if getattr(chunk, "usage", None):
+                s.set(**usage_attributes(chunk.usage))
+                if usage_callback is not None:
+                    usage_callback(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                if not parts:
+                    s.set(first_token_s=round(time.perf_counter() - start, 4))
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        s.set(cache_hit=False)
+
+        if use_cache and parts:
+            store_cached(key, target, "".join(parts))
@@ -0,0 +1,351 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from loki_exporter import get_exporter
+from metrics import EXTERNAL_ERRORS, LLM_COST, LLM_TOKENS
+
+load_dotenv()
+
+# --- CONFIG ---
+USAGE_FLUSH_INTERVAL = float(os.environ.get("LLM_USAGE_FLUSH_SECONDS", "60"))   # Rollups are sent this often
+USAGE_LOG_PATH = os.environ.get("LLM_USAGE_LOG_PATH")                           # Optional JSONL copy of the rollups
+USAGE_LOKI_LABELS = {"app": "slack-bot-usage"}
+# USD per 1M tokens; LLM_PRICES overrides entries with a JSON object or the path of a JSON file
+DEFAULT_PRICES = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-3.5-turbo": {"input": 0.50, "cached_input": 0.50, "output": 1.50},
+}
+
+_scope = contextvars.ContextVar("usage_scope", default={})
+
+
+# --- ATTRIBUTION ---
+
+@contextlib.contextmanager
+def usage_scope(**labels):
+    """LLM calls made inside are attributed to `labels` (pipeline, channel, user, persona); inner scopes override."""
+    token = _scope.set({**_scope.get(), **{k: v for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def scoped(fn, **labels):
+    """fn wrapped to run inside usage_scope(**labels), e.g. for scheduler.submit()."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with usage_scope(**labels):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _event_labels(pipeline, signature, args, kwargs):
+    body = signature.bind_partial(*args, **kwargs).arguments.get("body")
+    event = (body or {}).get("event") or {}
+    return {"pipeline": pipeline, "channel": event.get("channel"), "user": event.get("user")}
+
+
+def event_scope(pipeline):
+    """
+    Decorator for Bolt listeners (sync or async): the listener's LLM calls
+    are attributed to the event's channel and user.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with usage_scope(**_event_labels(pipeline, signature, args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with usage_scope(**_event_labels(pipeline, signature, args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- PRICES ---
+
+def load_prices(value=None):
+    prices = {model: dict(entry) for model, entry in DEFAULT_PRICES.items()}
+    value = value if value is not None else os.environ.get("LLM_PRICES")
+    if value:
+        try:
+            if not value.lstrip().startswith("{"):
+                with open(value) as f:
+                    value = f.read()
+            for model, entry in json.loads(value).items():
+                prices[model] = {**prices.get(model, {}), **entry}
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Could not load LLM_PRICES ({e}); using the default price table.")
+    return prices
+
+
+class PriceTable:
+    """Per-model USD prices (per 1M tokens). Dated model names use their base entry (longest prefix)."""
+
+    def __init__(self, prices=None):
+        self.prices = prices if prices is not None else load_prices()
+        self._resolved = {}
+        self._warned = set()
+
+    def _entry(self, model):
+        if model not in self._resolved:
+            if model in self.prices:
+                self._resolved[model] = self.prices[model]
+            else:
+                matches = [name for name in self.prices if model and model.startswith(name)]
+                self._resolved[model] = self.prices[max(matches, key=len)] if matches else None
+        entry = self._resolved[model]
+        if entry is None and model not in self._warned:
+            self._warned.add(model)
+            logging.warning(f"No price for model '{model}'; its cost is reported as 0.")
+        return entry
+
+    def cost(self, model, prompt_tokens, completion_tokens, cached_tokens=0):
+        entry = self._entry(model)
+        if entry is None:
+            return 0.0
+        uncached = prompt_tokens - cached_tokens
+        return (
+            uncached * entry.get("input", 0.0)
+            + cached_tokens * entry.get("cached_input", entry.get("input", 0.0))
+            + completion_tokens * entry.get("output", 0.0)
+        ) / 1_000_000
+
+
+# --- LEDGER ---
+
+_FIELDS = ("calls", "cache_hits", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_s", "cost_usd")
+
+
+class UsageLedger:
+    """
+    Central accounting for chat completions. Every call (and every response
+    cache hit) is added to an in-memory rollup keyed by pipeline, channel,
+    user, persona and model; a background thread flushes the rollups every
+    `flush_interval` seconds as one compact record each (Loki and/or JSONL),
+    instead of one push per call. Lifetime totals stay available through
+    totals() for cost estimates.
+    """
+
+    def __init__(self, prices=None, flush_interval=USAGE_FLUSH_INTERVAL, log_path=USAGE_LOG_PATH,
+                 loki_url=None, user_id=None, api_token=None):
+        self.prices = prices or PriceTable()
+        self.flush_interval = flush_interval
+        self.log_path = log_path
+        self._loki = get_exporter(loki_url, user_id, api_token) if loki_url else None
+
+        self._rollups = {}    # (pipeline, channel, user, persona, model) -> [calls, cache_hits, ...]
+        self._totals = {}     # model -> same fields, never reset
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+
+    # --- RECORDING ---
+
+    def _key(self, model, persona):
+        scope = _scope.get()
+        return (
+            scope.get("pipeline", "other"),
+            scope.get("channel", ""),
+            scope.get("user", ""),
+            persona or scope.get("persona", "other"),
+            model or "unknown",
+        )
+
+    def _add(self, key, values):
+        self._ensure_worker()
+        with self._lock:
+            for table, table_key in ((self._rollups, key), (self._totals, key[-1])):
+                row = table.get(table_key)
+                if row is None:
+                    row = table[table_key] = [0] * len(_FIELDS)
+                for i, value in enumerate(values):
+                    row[i] += value
+
+    def record(self, model, usage, latency, persona=None):
+        """One completed API call; `usage` is the response's usage object (None if the API omitted it)."""
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        cost = self.prices.cost(model, prompt, completion, cached)
+        self._add(self._key(model, persona), (1, 0, prompt, completion, cached, latency, cost))
+
+        LLM_TOKENS.inc(prompt, model=model, type="prompt")
+        LLM_TOKENS.inc(completion, model=model, type="completion")
+        if cached:
+            LLM_TOKENS.inc(cached, model=model, type="cached")
+        LLM_COST.inc(cost, model=model)
+        return cost
+
+    def record_cache_hit(self, model, persona=None):
+        """A call answered by the response cache: no tokens billed."""
+        self._add(self._key(model, persona), (0, 1, 0, 0, 0, 0.0, 0.0))
+
+    # --- READING ---
+
+    def totals(self):
+        """Lifetime totals per model, plus "all"."""
+        with self._lock:
+            rows = {model: list(row) for model, row in self._totals.items()}
+        result = {model: dict(zip(_FIELDS, row)) for model, row in rows.items()}
+        result["all"] = {field: sum(row[i] for row in rows.values()) for i, field in enumerate(_FIELDS)}
+        return result
+
+    def estimated_cost(self):
+        return self.totals()["all"]["cost_usd"]
+
+    # --- FLUSHING ---
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="llm-usage", daemon=True)
+                    self._worker.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Sends (and resets) the rollups collected since the previous flush. Returns how many were sent."""
+        with self._lock:
+            rollups, self._rollups = self._rollups, {}
+        if not rollups:
+            return 0
+        now = time.time()
+        lines = []
+        for (pipeline, channel, user, persona, model), row in rollups.items():
+            record = {"pipeline": pipeline, "channel": channel, "user": user, "persona": persona, "model": model,
+                      "window_s": self.flush_interval, "timestamp": now}
+            record.update(zip(_FIELDS, row))
+            record["latency_s"] = round(record["latency_s"], 4)
+            record["cost_usd"] = round(record["cost_usd"], 6)
+            lines.append(json.dumps(record))
+
+        if self._loki is not None:
+            timestamp_ns = time.time_ns()
+            for i, line in enumerate(lines):
+                self._loki.enqueue(USAGE_LOKI_LABELS, timestamp_ns + i, line)
+        if self.log_path:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError as e:
+                logging.warning(f"⚠️ Could not write LLM usage log: {e}")
+        return len(lines)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+# --- SHARED INSTANCE ---
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger(
+                    loki_url=os.environ.get("GRAFANA_URL"),
+                    user_id=os.environ.get("GRAFANA_USER_ID"),
+                    api_token=os.environ.get("GRAFANA_API_TOKEN"),
+                )
+    return _ledger
+
+
+# --- THE HOOK ---
+# Every chat completion in the bots and CLIs goes through one of these two.
+
+def create_completion(client, persona=None, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) with accounting: failures are
+    counted, and usage, latency and cost are recorded under the current
+    usage_scope(). Streams always request usage and are recorded when the
+    final (usage-only, choice-less) chunk arrives.
+    """
+    model = kwargs.get("model")
+    if kwargs.get("stream"):
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    scope = _scope.get()
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception:
+        EXTERNAL_ERRORS.inc(service="openai")
+        raise
+    if kwargs.get("stream"):
+        return _metered_stream(response, model, persona, scope, start)
+    get_ledger().record(model, response.usage, time.perf_counter() - start, persona)
+    return response
+
+
+def _metered_stream(stream, model, persona, scope, start):
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            # Recorded under the scope of the call, wherever the stream is consumed
+            token = _scope.set(scope)
+            try:
+                get_ledger().record(model, chunk.usage, time.perf_counter() - start, persona)
+            finally:
+                _scope.reset(token)
+        yield chunk
+
+
+async def acreate_completion(client, persona=None, **kwargs):
+    """create_completion() for AsyncOpenAI clients."""
+    model = kwargs.get("model")
+    if kwargs.get("stream"):
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    start = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(**kwargs)
+    except Exception:
+        EXTERNAL_ERRORS.inc(service="openai")
+        raise
+    if kwargs.get("stream"):
+        return _ametered_stream(response, model, persona, start)
+    get_ledger().record(model, response.usage, time.perf_counter() - start, persona)
+    return response
+
+
+async def _ametered_stream(stream, model, persona, start):
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            get_ledger().record(model, chunk.usage, time.perf_counter() - start, persona)
+        yield chunk
+
+
+def record_cache_hit(model, persona=None):
+    get_ledger().record_cache_hit(model, persona)
+
+
+def usage_attributes(usage):
+    """Token counts of an OpenAI usage object, as span attributes."""
+    if usage is None:
+        return {}
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
@@ -0,0 +1,110 @@
+import gzip
+import json
+
+try:
+    import snappy  # Optional: only needed for the protobuf push format
+except ImportError:
+    snappy = None
+
+# Loki push formats
+FORMAT_JSON = "json"
+FORMAT_PROTOBUF = "protobuf"
+
+
+# --- GROUPING ---
+
+def label_key(labels):
+    """Hashable, order-independent key for a label dict."""
+    return tuple(sorted(labels.items()))
+
+
+def group_by_labels(batch):
+    """
+    Turns [(labels, timestamp_ns, line), ...] into {label_key: [(timestamp_ns, line), ...]}
+    so every label set becomes a single stream.
+    """
+    groups = {}
+    for labels, timestamp_ns, line in batch:
+        key = label_key(labels)
+        entries = groups.get(key)
+        if entries is None:
+            entries = groups[key] = []
+        entries.append((timestamp_ns, line))
+    for entries in groups.values():
+        entries.sort(key=lambda entry: entry[0])
+    return groups
+
+
+# --- JSON (gzip) ---
+
+def encode_json(batch):
+    streams = [
+        {"stream": dict(key), "values": [[str(ts), line] for ts, line in entries]}
+        for key, entries in group_by_labels(batch).items()
+    ]
+    body = json.dumps({"streams": streams}, separators=(",", ":")).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    return gzip.compress(body, compresslevel=5), headers
+
+
+# --- PROTOBUF (snappy) ---
+# Hand-rolled encoder for logproto.PushRequest so we don't need generated stubs:
+#   PushRequest   { repeated StreamAdapter streams = 1; }
+#   StreamAdapter { string labels = 1; repeated EntryAdapter entries = 2; }
+#   EntryAdapter  { google.protobuf.Timestamp timestamp = 1; string line = 2; }
+#   Timestamp     { int64 seconds = 1; int32 nanos = 2; }
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number, payload):
+    # Wire type 2 (length-delimited)
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _timestamp(timestamp_ns):
+    seconds, nanos = divmod(timestamp_ns, 1_000_000_000)
+    out = b""
+    if seconds:
+        out += b"\x08" + _varint(seconds)
+    if nanos:
+        out += b"\x10" + _varint(nanos)
+    return out
+
+
+def _format_labels(key):
+    pairs = ", ".join(f'{name}="{_escape_label(value)}"' for name, value in key)
+    return "{" + pairs + "}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def encode_protobuf(batch):
+    streams = []
+    for key, entries in group_by_labels(batch).items():
+        body = [_field(1, _format_labels(key).encode("utf-8"))]
+        for ts, line in entries:
+            entry = _field(1, _timestamp(ts)) + _field(2, line.encode("utf-8"))
+            body.append(_field(2, entry))
+        streams.append(_field(1, b"".join(body)))
+    headers = {"Content-Type": "application/x-protobuf"}
+    return snappy.compress(b"".join(streams)), headers
+
+
+def protobuf_available():
+    return snappy is not None
+
+
+def encode(batch, push_format=FORMAT_JSON):
+    """Returns (body, headers) ready to POST to /loki/api/v1/push."""
+    if push_format == FORMAT_PROTOBUF:
+        return encode_protobuf(batch)
+    return encode_json(batch)
@@ -0,0 +1,173 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from loki_encoding import FORMAT_JSON, FORMAT_PROTOBUF, encode, protobuf_available
+
+load_dotenv()
+
+# --- CONFIG ---
+MAX_QUEUE_SIZE = 10000    # Records held in memory before we start dropping
+BATCH_SIZE = 500          # Flush as soon as this many records are waiting...
+FLUSH_INTERVAL = 2.0      # ...or after this many seconds, whichever comes first
+REQUEST_TIMEOUT = 5.0     # Seconds before a single push to Loki is abandoned
+PUSH_FORMAT = os.environ.get("LOKI_PUSH_FORMAT", FORMAT_JSON)  # "json" or "protobuf"
+
+_STOP = object()
+
+
+class LokiExporter:
+    """
+    Non-blocking exporter for Loki. Records are put on a bounded in-process
+    queue and a background worker pushes them in label-grouped batches
+    (gzipped JSON, or snappy protobuf) over a pooled session. When the queue
+    is full new records are dropped instead of blocking the caller.
+    """
+
+    def __init__(self, loki_url, user_id, api_token, max_queue_size=MAX_QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, timeout=REQUEST_TIMEOUT,
+                 push_format=PUSH_FORMAT):
+        self.loki_url = loki_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.push_format = push_format
+        if push_format == FORMAT_PROTOBUF and not protobuf_available():
+            logging.warning("⚠️ python-snappy not installed; falling back to JSON Loki push format.")
+            self.push_format = FORMAT_JSON
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._session = requests.Session()
+        self._session.auth = (user_id, api_token)
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self._lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+
+        # Counters (read them for debugging / health checks)
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+    # --- PRODUCER SIDE ---
+
+    def enqueue(self, labels, timestamp_ns, line):
+        """Queue one log line. Never blocks; returns False if the record was dropped."""
+        if self._closed:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((labels, timestamp_ns, line))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def close(self, timeout=REQUEST_TIMEOUT):
+        """Flush whatever is queued and stop the worker."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        if worker is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logging.warning("⚠️ Loki exporter queue still full on shutdown; some records may be lost.")
+        worker.join(timeout)
+        self._session.close()
+
+    # --- WORKER SIDE ---
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None and not self._closed:
+                self._worker = threading.Thread(target=self._run, name="loki-exporter", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            wait = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                entry = self._queue.get(timeout=wait)
+            except queue.Empty:
+                entry = None
+
+            if entry is _STOP:
+                self._drain_into(batch)
+                if batch:
+                    self._send(batch)
+                return
+
+            if entry is not None:
+                batch.append(entry)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._send(batch)
+                batch = []
+
+    def _drain_into(self, batch):
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP:
+                batch.append(entry)
+
+    def _send(self, batch):
+        body, headers = encode(batch, self.push_format)
+        try:
+            response = self._session.post(self.loki_url, data=body, headers=headers, timeout=self.timeout)
+            if response.status_code == 204:
+                self.sent += len(batch)
+                logging.info(f"✅ Pushed {len(batch)} records to Grafana.")
+            else:
+                self.failed += len(batch)
+                logging.error(f"❌ Grafana Error {response.status_code}: {response.text}")
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"❌ Grafana Connection Error: {e}")
+
+
+# --- SHARED INSTANCES ---
+# One exporter per (url, user) so every bot in the process shares a connection pool.
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def get_exporter(loki_url, user_id, api_token):
+    key = (loki_url, user_id)
+    exporter = _exporters.get(key)
+    if exporter is None:
+        with _exporters_lock:
+            exporter = _exporters.get(key)
+            if exporter is None:
+                exporter = LokiExporter(loki_url, user_id, api_token)
+                _exporters[key] = exporter
+    return exporter
+
+
+@atexit.register
+def shutdown_exporters():
+    for exporter in list(_exporters.values()):
+        exporter.close()
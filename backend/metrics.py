@@ -0,0 +1,374 @@
+import atexit
+import bisect
+import inspect
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+from dotenv import load_dotenv
+
+from tracing import add_span_listener
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, "metrics"))          # Per-process snapshots
+METRICS_SNAPSHOT_SECONDS = float(os.environ.get("METRICS_SNAPSHOT_SECONDS", "5"))
+METRICS_STALE_SECONDS = float(os.environ.get("METRICS_STALE_SECONDS", "120"))           # Dead process: ignore its file
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+
+
+def _key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}    # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = COUNTER
+
+    def inc(self, amount=1, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = GAUGE
+
+    def set(self, value, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = HISTOGRAM
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            entry["counts"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            return [
+                (dict(zip(self.labelnames, key)), {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]})
+                for key, v in self._values.items()
+            ]
+
+
+class Registry:
+    """
+    In-process metrics. Updates take one uncontended per-metric lock and do no
+    I/O. Collectors are called only when a snapshot is taken and turn
+    existing stats() counters (caches, schedulers, Slack client) into
+    samples, so those cost nothing on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collect):
+        """
+        collect() returns [(name, kind, help, [(labels dict, value), ...])].
+        Bound methods are held weakly, so a collected object drops out on its own.
+        """
+        ref = weakref.WeakMethod(collect) if inspect.ismethod(collect) else (lambda: collect)
+        with self._lock:
+            self._collectors.append(ref)
+
+    def snapshot(self, process):
+        """JSON-serializable families, every sample labelled with `process`."""
+        families = {}
+
+        def add(name, kind, help_text, samples, buckets=None):
+            family = families.setdefault(name, {"kind": kind, "help": help_text, "samples": []})
+            if buckets is not None:
+                family["buckets"] = list(buckets)
+            family["samples"].extend([dict(labels, process=process), value] for labels, value in samples)
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            add(metric.name, metric.kind, metric.help, metric.samples(), getattr(metric, "buckets", None))
+
+        for ref in collectors:
+            collect = ref()
+            if collect is None:
+                continue
+            try:
+                for name, kind, help_text, samples in collect():
+                    add(name, kind, help_text, samples)
+            except Exception as e:
+                logging.warning(f"⚠️ Metrics collector failed: {e}")
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None]
+        return families
+
+
+registry = Registry()
+
+# --- SHARED METRICS ---
+REQUEST_SECONDS = registry.histogram(
+    "slackbot_request_seconds", "End-to-end latency of one pipeline run.", ("pipeline",))
+STAGE_SECONDS = registry.histogram(
+    "slackbot_stage_seconds", "Latency of one pipeline stage or agent (a tracing span).", ("pipeline", "stage"))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "slackbot_requests_in_flight", "Pipeline runs in progress.", ("pipeline",))
+LLM_TOKENS = registry.counter(
+    "slackbot_llm_tokens_total", "OpenAI tokens, by model and type (prompt/completion/cached).", ("model", "type"))
+LLM_COST = registry.counter(
+    "slackbot_llm_cost_usd_total", "Estimated OpenAI spend from the LLM_PRICES table.", ("model",))
+EXTERNAL_ERRORS = registry.counter(
+    "slackbot_external_errors_total", "Failed calls to an external service.", ("service",))
+EXTERNAL_RETRIES = registry.counter(
+    "slackbot_external_retries_total", "Retried calls to an external service.", ("service",))
+
+
+def cache_family(cache, hits, misses):
+    """Collector family for a cache's hit / miss counters."""
+    return ("slackbot_cache_lookups_total", COUNTER, "Cache lookups by result.",
+            [({"cache": cache, "result": "hit"}, hits), ({"cache": cache, "result": "miss"}, misses)])
+
+
+def _observe_span(span, started):
+    pipeline = span.trace.name
+    if span.parent_id is not None:
+        if not started:
+            STAGE_SECONDS.observe(span.duration, pipeline=pipeline, stage=span.name)
+    elif started:
+        REQUESTS_IN_FLIGHT.inc(pipeline=pipeline)
+    else:
+        REQUESTS_IN_FLIGHT.dec(pipeline=pipeline)
+        REQUEST_SECONDS.observe(span.duration, pipeline=pipeline)
+
+
+# --- CROSS-PROCESS SNAPSHOTS ---
+# Every bot is its own process, so each one writes its registry to
+# METRICS_DIR every few seconds and server.py merges the files on scrape.
+
+def _snapshot_path(process, directory=METRICS_DIR):
+    return os.path.join(directory, f"{process}-{os.getpid()}.json")
+
+
+def write_snapshot(process, directory=METRICS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    data = {"process": process, "written_at": time.time(), "families": registry.snapshot(process)}
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, _snapshot_path(process, directory))
+
+
+class _SnapshotWriter:
+    def __init__(self, process, interval, directory):
+        self.process = process
+        self.interval = interval
+        self.directory = directory
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            write_snapshot(self.process, self.directory)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not write metrics snapshot: {e}")
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._write()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def default_process_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+
+def start_metrics(process=None, interval=METRICS_SNAPSHOT_SECONDS, directory=METRICS_DIR):
+    """
+    Turns on stage timing (through tracing spans) and periodic snapshots for
+    this process. Call once from a bot's entry point; returns the process name.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            add_span_listener(_observe_span)
+            _writer = _SnapshotWriter(process or default_process_name(), interval, directory)
+    return _writer.process
+
+
+def load_snapshots(directory=METRICS_DIR, stale=METRICS_STALE_SECONDS, exclude=None):
+    """Families of every live process's snapshot in `directory`."""
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    now = time.time()
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if not filename.endswith(".json") or path == exclude:
+            continue
+        try:
+            if now - os.path.getmtime(path) > stale:
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f)["families"])
+        except (OSError, ValueError, KeyError):
+            continue  # Mid-replace or removed; the next scrape picks it up
+    return snapshots
+
+
+def merge(snapshots):
+    """Sums samples with identical name + labels (e.g. several workers of one process)."""
+    merged = {}
+    for families in snapshots:
+        for name, family in families.items():
+            target = merged.setdefault(name, {"kind": family["kind"], "help": family["help"], "samples": {}})
+            if "buckets" in family:
+                target["buckets"] = family["buckets"]
+            for labels, value in family["samples"]:
+                key = tuple(sorted(labels.items()))
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif isinstance(value, dict):
+                    target["samples"][key] = {
+                        "counts": [a + b for a, b in zip(current["counts"], value["counts"])],
+                        "sum": current["sum"] + value["sum"],
+                        "count": current["count"] + value["count"],
+                    }
+                else:
+                    target["samples"][key] = current + value
+    _add_hit_ratios(merged)
+    return merged
+
+
+def _add_hit_ratios(merged):
+    lookups = merged.get("slackbot_cache_lookups_total")
+    if lookups is None:
+        return
+    totals = {}
+    for key, value in lookups["samples"].items():
+        labels = dict(key)
+        group = tuple(sorted((k, v) for k, v in labels.items() if k != "result"))
+        hits, total = totals.get(group, (0, 0))
+        totals[group] = (hits + (value if labels.get("result") == "hit" else 0), total + value)
+    merged["slackbot_cache_hit_ratio"] = {
+        "kind": GAUGE,
+        "help": "Cache hits / lookups since the process started.",
+        "samples": {group: hits / total for group, (hits, total) in totals.items() if total},
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(merged):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name in sorted(merged):
+        family = merged[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        for key, value in sorted(family["samples"].items()):
+            if family["kind"] != HISTOGRAM:
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(family["buckets"]) + [float("inf")], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(key + (('le', _number(float(bound))),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def scrape(process=None, directory=METRICS_DIR):
+    """/metrics body: every live bot's snapshot plus this process's registry, taken now."""
+    process = process or default_process_name()
+    own = _snapshot_path(process, directory)
+    return render(merge(load_snapshots(directory, exclude=own) + [registry.snapshot(process)]))
+
+
+def register_collector(collect):
+    registry.register_collector(collect)
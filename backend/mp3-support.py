@@ -1,101 +1,138 @@
 import os
 import json
 import logging
-import requests
 import io
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from bot_prompts import RECAP_ANALYZER_SYSTEM_PROMPT
+from tts import synthesize_speech
+from scheduler import ChannelScheduler, BUSY_MESSAGE
+from conversation_store import ConversationStore
+from rolling_summary import RollingSummaries, estimate_tokens, summary_update_messages
+from context_packer import CONTEXT_MAX_MESSAGE_TOKENS, context_budget, pack_lines, truncate_to_tokens
+from recap_filter import get_recap_filter, log_decision
+from slack_api import SlackClient, share_client
+from event_trace import listener_executor, record_events
+from llm_usage import create_completion, scoped, usage_attributes
+from metrics import start_metrics
+from tracing import span, traced
+
 # --- SETUP ---
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 # Keys
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
-ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
-ELEVENLABS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM" # Example Voice ID
-
-# Global Memory (Stores the last 20 messages)
-conversation_history = []
+# SlackClient caches bot/channel metadata, retries 429s and coalesces chat_update bursts
+# EVENT_TRACE_PATH=events.jsonl records incoming events for replay (benchmarks/soak.py)
+app = record_events(share_client(App(
+    client=SlackClient(token=os.environ.get("SLACK_BOT_TOKEN")),
+    listener_executor=listener_executor(),
+)))
+
+# Per-channel memory (last CONTEXT_LIMIT messages of each channel / DM)
 CONTEXT_LIMIT = 20
+conversations = ConversationStore(max_messages=CONTEXT_LIMIT)
+
+# Older messages are folded into a rolling per-channel summary, so the
+# analyzer sees the summary plus at most FOLD_AT recent lines
+summaries = RollingSummaries()
+FOLD_AT = 15      # Fold once this many messages are outside the summary (must stay below CONTEXT_LIMIT)
+KEEP_RECENT = 5   # ...keeping the newest ones verbatim
+
+# Token budget for the analyzer's context (the system prompt and the JSON reply are reserved)
+CONTEXT_TOKENS = context_budget(RECAP_ANALYZER_SYSTEM_PROMPT)
 
 # Add a global BOT_ID to ignore self-mentions
 BOT_ID = None
 
+# Bounded worker pool between the listeners and the OpenAI / ElevenLabs pipeline
+scheduler = ChannelScheduler(name="mp3-scheduler")
+
 # --- HELPER: ELEVENLABS ---
 def text_to_speech(text_content):
     """
     Accepts text, sends to ElevenLabs, returns audio binary (MP3) or None.
+    Long texts are split at sentence boundaries and the chunks are rendered
+    in parallel, then stitched (see tts.synthesize_speech).
     """
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
-    headers = {
-        "xi-api-key": ELEVENLABS_API_KEY,
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "text": text_content,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5}
-    }
+    return synthesize_speech(text_content)
+
+# --- CONTEXT: RECENT MESSAGES + ROLLING SUMMARY ---
+def remember_message(channel_id, line):
+    """
+    Stores the message and returns the analyzer context for this channel: the
+    store's pre-joined transcript of the lines newer than the rolling summary,
+    packed line by line only when it overflows CONTEXT_TOKENS.
+    """
+    conversations.append(channel_id, truncate_to_tokens(line, CONTEXT_MAX_MESSAGE_TOKENS))
+    summary, watermark = summaries.get(channel_id)
+    budget = max(CONTEXT_TOKENS - estimate_tokens(summary), 0)
+    recent = conversations.transcript(channel_id, after=watermark)
+    if estimate_tokens(recent) > budget:
+        unfolded = [(seq, text) for seq, text in conversations.recent(channel_id)
+                    if watermark is None or seq > watermark]
+        recent = "\n".join(text for _, text in pack_lines(unfolded, budget))
+    if watermark is None:
+        return recent
+    return f"EARLIER SUMMARY:\n{summary}\n\nRECENT MESSAGES:\n{recent}"
+
+
+def fold_channel_summary(previous_summary, new_lines):
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        if response.status_code == 200:
-            return response.content
-        else:
-            logging.error(f"ElevenLabs Error [{response.status_code}]: {response.text}")
-            return None
+        response = create_completion(
+            client,
+            persona="rolling_summary",
+            model="gpt-4o",
+            messages=summary_update_messages(previous_summary, new_lines)
+        )
+        return response.choices[0].message.content
     except Exception as e:
-        logging.error(f"ElevenLabs connection failed: {e}")
+        logging.error(f"Rolling summary error: {e}")
         return None
 
+
+def fold_old_messages(channel_id):
+    """Once FOLD_AT messages sit outside the summary, folds all but the newest KEEP_RECENT into it."""
+    _, watermark = summaries.get(channel_id)
+    unfolded = [(seq, text) for seq, text in conversations.recent(channel_id) if watermark is None or seq > watermark]
+    if len(unfolded) >= FOLD_AT:
+        summaries.update(channel_id, unfolded[:-KEEP_RECENT], fold_channel_summary)
+
+
+def run_then_fold(pipeline, event, *args):
+    # Folding runs after the reply, so it never delays it
+    try:
+        pipeline(event, *args)
+    finally:
+        fold_old_messages(event.get("channel"))
+
 # --- THE BRAIN (OpenAI JSON Generator) ---
-def analyze_and_generate_json(history, user_input):
+def analyze_and_generate_json(transcript, user_input):
     """
-    1. Reads history.
+    1. Reads the channel context (recent messages, plus the rolling summary of older ones).
     2. Determines if user_input is a request for a summary.
     3. Returns JSON.
     """
-    
-    # Slice the last N messages
-    context_slice = history[-CONTEXT_LIMIT:]
-    transcript = "\n".join(context_slice)
-
-    system_prompt = """
-    You are a background conversation processor.
-    
-    INPUT DATA:
-    1. A transcript of a chat conversation.
-    2. The latest message from a user.
-    
-    YOUR TASK:
-    Analyze the LATEST message. 
-    - Does it look like a request for a summary, catch-up, recap, or "what happened"?
-    - Or is it just normal conversation?
-    
-    OUTPUT FORMAT (JSON ONLY):
-    You must output a valid JSON object with the following structure:
-    {
-      "trigger_audio": boolean,      // true if user wants a summary, false otherwise
-      "summary_text": string | null, // The summary text to be spoken (if trigger is true)
-      "reply_text": string           // A text reply to the user (e.g. "Sure, generating audio...")
-    }
-    
-    If "trigger_audio" is true, write a concise, professional summary in "summary_text".
-    If "trigger_audio" is false, "summary_text" should be null, and "reply_text" should be a normal conversational response.
-    """
+
+    system_prompt = RECAP_ANALYZER_SYSTEM_PROMPT
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o", # or gpt-3.5-turbo-0125
-            response_format={"type": "json_object"}, # <--- ENFORCES JSON
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"TRANSCRIPT:\n{transcript}\n\nLATEST USER MESSAGE:\n{user_input}"}
-            ]
-        )
+        with span("llm", model="gpt-4o", stream=False) as s:
+            response = create_completion(
+                client,
+                persona="recap_analyzer",
+                model="gpt-4o", # or gpt-3.5-turbo-0125
+                response_format={"type": "json_object"}, # <--- ENFORCES JSON
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"TRANSCRIPT:\n{transcript}\n\nLATEST USER MESSAGE:\n{user_input}"}
+                ]
+            )
+            s.set(**usage_attributes(response.usage))
         
         # Parse the string response into a Python Dictionary
         json_content = json.loads(response.choices[0].message.content)
@@ -111,6 +148,13 @@ def _upload_mp3_to_slack(channel_id, audio_bytes, filename="summary.mp3", title=
     Upload MP3 audio bytes to Slack using files_upload_v2 if available,
     otherwise fall back to files_upload. Returns True on success.
     """
+    with span("upload", bytes=len(audio_bytes)) as s:
+        ok = _upload_mp3(channel_id, audio_bytes, filename, title)
+        s.set(ok=ok)
+        return ok
+
+
+def _upload_mp3(channel_id, audio_bytes, filename, title):
     file_obj = io.BytesIO(audio_bytes)
     file_obj.seek(0)
 
@@ -149,35 +193,41 @@ def _upload_mp3_to_slack(channel_id, audio_bytes, filename="summary.mp3", title=
         logging.error(f"Slack upload exception: {e}")
         return False
 
-# --- EVENT LISTENER ---
-@app.event("message")
-def handle_message_events(body, logger):
-    event = body.get("event", {})
+# --- PIPELINES (run on the scheduler's workers, one at a time per channel) ---
+# Each run is one trace (TRACE_EXPORTER): filter, analyzer, TTS and upload stages become spans
+@traced("recap_message")
+def process_message_event(event, logger):
     channel_id = event.get("channel")
     user_id = event.get("user")
     text = event.get("text", "")
 
-    # Ignore self
-    auth_test = app.client.auth_test()
-    if user_id == auth_test["user_id"]:
+    # Ignore self (bot identity is cached by SlackClient)
+    if user_id == app.client.bot_user_id():
+        return
+
+    # 1. Update Context (bounded ring buffer + rolling summary for this channel)
+    transcript = remember_message(channel_id, f"User {user_id}: {text}")
+
+    # 2. Local pre-filter: only likely recap requests reach OpenAI
+    # (mentions are answered by the app_mention handler)
+    if f"<@{app.client.bot_user_id()}>" in text:
+        return
+    with span("recap_filter") as s:
+        call_llm, reason = get_recap_filter().check(channel_id, text)
+        s.set(call_llm=call_llm, reason=reason)
+    if not call_llm:
         return
 
-    # 1. Update Context
-    conversation_history.append(f"User {user_id}: {text}")
-    # Keep history bounded
-    if len(conversation_history) > 200:
-        # trim older entries
-        del conversation_history[0: len(conversation_history) - 200]
-    
-    # 2. Send to OpenAI for JSON Decision
-    logger.info(f"Analyzing message: {text}")
-    decision_json = analyze_and_generate_json(conversation_history, text)
+    # 3. Send to OpenAI for JSON Decision
+    logger.info(f"Analyzing message ({reason}): {text}")
+    decision_json = analyze_and_generate_json(transcript, text)
 
     if not decision_json:
         logger.error("Decision JSON is empty; aborting.")
         return
+    log_decision(text, decision_json.get("trigger_audio", False), gate=reason)
 
-    # 3. Act on the JSON
+    # 4. Act on the JSON
     trigger_audio = decision_json.get("trigger_audio", False)
     reply_text = decision_json.get("reply_text", "")
     summary_text = decision_json.get("summary_text", "")
@@ -217,21 +267,19 @@ def handle_message_events(body, logger):
             except Exception:
                 pass
 
-@app.event("app_mention")
-def handle_app_mention_events(body, say, logger):
+@traced("recap_mention")
+def process_app_mention(event, say, logger):
     """
     Handle explicit @mentions. Reuses the same decision -> summary -> mp3 flow
     as the message handler but only triggers when the bot is mentioned.
     """
-    event = body.get("event", {}) or {}
     text = event.get("text", "") or ""
     user_id = event.get("user")
     channel_id = event.get("channel")
 
     # Safe guard: ensure we don't respond to ourselves
     try:
-        auth = app.client.auth_test()
-        bot_user = BOT_ID or auth.get("user_id")
+        bot_user = BOT_ID or app.client.bot_user_id()
     except Exception as e:
         logger.warning(f"auth_test failed: {e}")
         bot_user = BOT_ID
@@ -240,12 +288,11 @@ def handle_app_mention_events(body, say, logger):
         return
 
     # Update context
-    conversation_history.append(f"User {user_id}: {text}")
-    if len(conversation_history) > 200:
-        del conversation_history[0: len(conversation_history) - 200]
+    transcript = remember_message(channel_id, f"User {user_id}: {text}")
+    get_recap_filter().check(channel_id, text, mentioned=True)
 
     logger.info(f"Analyzing mention from {user_id}: {text}")
-    decision_json = analyze_and_generate_json(conversation_history, text)
+    decision_json = analyze_and_generate_json(transcript, text)
     if not decision_json:
         logger.error("Decision JSON empty for app_mention")
         try:
@@ -293,16 +340,33 @@ def handle_app_mention_events(body, say, logger):
             except Exception:
                 pass
 
+# --- EVENT LISTENERS ---
+# Bolt's thread only queues the work; replies in a channel stay in arrival order
+@app.event("message")
+def handle_message_events(body, logger):
+    event = body.get("event", {})
+    job = scoped(run_then_fold, pipeline="recap_message", channel=event.get("channel"), user=event.get("user"))
+    if not scheduler.submit(event.get("channel"), job, process_message_event, event, logger):
+        # Plain channel chatter is dropped quietly; only mentions get a "busy" reply
+        logger.warning("Scheduler full; skipped message event.")
+
+@app.event("app_mention")
+def handle_app_mention_events(body, say, logger):
+    event = body.get("event", {}) or {}
+    job = scoped(run_then_fold, pipeline="recap_mention", channel=event.get("channel"), user=event.get("user"))
+    if not scheduler.submit(event.get("channel"), job, process_app_mention, event, say, logger):
+        say(BUSY_MESSAGE)
+
 # --- STARTUP ---
 if __name__ == "__main__":
     # determine BOT_ID on startup (same approach as agent.py)
     try:
-        auth_test = app.client.auth_test()
-        BOT_ID = auth_test.get("user_id")
+        BOT_ID = app.client.bot_user_id()
         logging.info(f"Bot started! I am {BOT_ID}")
     except Exception as e:
         logging.warning(f"Could not determine BOT_ID on startup: {e}")
         BOT_ID = None
 
+    start_metrics("mp3-support")   # Scraped through server.py's /metrics
     handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
     handler.start()
\ No newline at end of file
@@ -4,6 +4,11 @@ import sys
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from agent_dag import build_collaboration_plan
+from fast_router import get_router
+from llm_cache import cached_chat_completion, cached_chat_stream
+from llm_usage import get_ledger, usage_scope
+
 # --- IMPORT EXISTING AGENT CONFIGS ---
 # We import the system prompts to reuse the "personas" defined in your other files
 try:
@@ -51,19 +56,78 @@ Structure the response clearly:
 
 # --- HELPER FUNCTIONS ---
 
-def get_agent_response(system_prompt, user_input, context_messages=None):
-    """Generic function to call an agent with a specific persona."""
+def _agent_messages(system_prompt, user_input, context_messages=None):
     messages = [{"role": "system", "content": system_prompt}]
     if context_messages:
         messages.extend(context_messages)
     messages.append({"role": "user", "content": user_input})
-
-    response = client.chat.completions.create(
+    return messages
+
+def get_agent_response(system_prompt, user_input, context_messages=None, bypass_cache=False, persona=None,
+                       similar=False):
+    """
+    Generic function to call an agent with a specific persona.
+    similar=True (raw user queries only) also accepts a near-duplicate cached answer.
+    """
+    content, _ = cached_chat_completion(
+        client,
+        bypass_cache=bypass_cache,
+        persona=persona,
+        similar=similar,
+        model="gpt-4o",
+        messages=_agent_messages(system_prompt, user_input, context_messages),
+        temperature=0.5
+    )
+    return content
+
+def stream_agent_response(system_prompt, user_input, context_messages=None, bypass_cache=False, persona=None,
+                          similar=False):
+    """Same as get_agent_response, but yields the reply in chunks as it is generated."""
+    yield from cached_chat_stream(
+        client,
+        bypass_cache=bypass_cache,
+        persona=persona,
+        similar=similar,
         model="gpt-4o",
-        messages=messages,
+        messages=_agent_messages(system_prompt, user_input, context_messages),
         temperature=0.5
     )
-    return response.choices[0].message.content
+
+def llm_route(user_input):
+    """Asks the LLM router. Returns (decision, reasoning)."""
+    router_json, _ = cached_chat_completion(
+        client,
+        persona="router",
+        similar=True,
+        model="gpt-4o",
+        response_format={"type": "json_object"},
+        messages=[
+            {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+            {"role": "user", "content": user_input}
+        ]
+    )
+    routing = json.loads(router_json)
+    return routing.get("decision"), routing.get("reasoning")
+
+def route_request(user_input):
+    """Decides locally when confident; only falls back to the LLM router when unsure."""
+    decision, reasoning, _ = get_router().route(user_input, llm_route)
+    return decision, reasoning
+
+def run_collaboration(user_input, deliver=None):
+    """
+    Runs the BOTH path as a concurrent agent plan. Returns the DAGRun.
+    deliver(chunk), if given, receives the final answer as it streams.
+    """
+    plan = build_collaboration_plan(
+        user_input,
+        TECH_SYSTEM_PROMPT,
+        BUSINESS_SYSTEM_PROMPT,
+        SYNTHESIZER_SYSTEM_PROMPT,
+        stream_agent_response,
+        deliver=deliver
+    )
+    return plan.run()
 
 def run_orchestrator():
     print("--- Multi-Agent Orchestrator (Type 'quit' to exit) ---")
@@ -81,69 +145,29 @@ def run_orchestrator():
 
             # 1. ROUTING STEP
             print("...Thinking (Routing)...", end="\r")
-            router_response = client.chat.completions.create(
-                model="gpt-4o",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_input}
-                ]
-            )
-            routing = json.loads(router_response.choices[0].message.content)
-            decision = routing.get("decision")
-            reasoning = routing.get("reasoning")
+            decision, reasoning = route_request(user_input)
             
             print(f"\n[Orchestrator]: Routing to -> {decision}")
             print(f"[Reasoning]: {reasoning}")
 
             # 2. EXECUTION STEP
             if decision == "TECH":
-                response = get_agent_response(TECH_SYSTEM_PROMPT, user_input)
+                response = get_agent_response(TECH_SYSTEM_PROMPT, user_input, persona="tech", similar=True)
                 print(f"\n[Tech Agent]:\n{response}")
 
             elif decision == "BUSINESS":
-                response = get_agent_response(BUSINESS_SYSTEM_PROMPT, user_input)
+                response = get_agent_response(BUSINESS_SYSTEM_PROMPT, user_input, persona="business", similar=True)
                 print(f"\n[Business Agent]:\n{response}")
 
             elif decision == "BOTH":
                 print("\n[Orchestrator]: Initiating collaboration protocol...")
                 
-                # Step A: Tech Agent goes first to define the solution
-                print("   -> Asking Tech Agent for architecture...")
-                tech_response = get_agent_response(TECH_SYSTEM_PROMPT, user_input)
-                
-                # Step B: Business Agent critiques the Tech solution
-                print("   -> Asking Business Agent to evaluate costs/ROI...")
-                business_context = f"""
-                CONTEXT: The user asked: "{user_input}"
-                
-                INPUT FROM TECH AGENT:
-                "{tech_response}"
-                
-                TASK: Evaluate this technical approach from a financial/business perspective. 
-                Identify costs, risks, and ROI. Do not redesign the tech, just analyze its business impact.
-                """
-                business_response = get_agent_response(BUSINESS_SYSTEM_PROMPT, business_context)
-
-                # Step C: Synthesis
-                print("   -> Synthesizing final response...")
-                synthesis_context = f"""
-                User Query: {user_input}
-                
-                Tech Agent Response:
-                {tech_response}
-                
-                Business Agent Response:
-                {business_response}
-                """
-                
-                final_response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": SYNTHESIZER_SYSTEM_PROMPT},
-                        {"role": "user", "content": synthesis_context}
-                    ]
-                ).choices[0].message.content
+                # Tech and an independent Business analysis run concurrently,
+                # then the Synthesizer reconciles them.
+                print("   -> Asking Tech Agent (architecture) and Business Agent (costs/ROI) in parallel...")
+                dag_run = run_collaboration(user_input)
+                final_response = dag_run.result("synthesizer")
+                print(f"   -> Timings: {dag_run.timing_summary()}")
                 
                 print(f"\n[Collaborative Response]:\n{final_response}")
 
@@ -151,4 +175,6 @@ def run_orchestrator():
             print(f"\n[Error]: {e}")
 
 if __name__ == "__main__":
-    run_orchestrator()
\ No newline at end of file
+    with usage_scope(pipeline="cli_orchestrator"):
+        run_orchestrator()
+    print(f"[Estimated OpenAI cost this session: ${get_ledger().estimated_cost():.4f}]")
\ No newline at end of file
@@ -0,0 +1,237 @@
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from fast_router import tokenize, train
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.environ.get("RECAP_FILTER_MODEL", os.path.join(BASE_DIR, "recap_model.json"))
+RECAP_LOG_PATH = os.environ.get("RECAP_LOG_PATH", os.path.join(BASE_DIR, "recap_decisions.jsonl"))
+# P(recap) from the local model above which a message still goes to the LLM. Lower = higher recall.
+THRESHOLD = float(os.environ.get("RECAP_FILTER_THRESHOLD", "0.3"))
+# Seconds after a model-gated LLM call during which the same channel's model passes are not analyzed again
+COOLDOWN = float(os.environ.get("RECAP_FILTER_COOLDOWN", "20"))
+
+# Phrasings of "summarize this for me (as audio)"; any match goes to the LLM
+RECAP_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"\brecap",
+    r"\bsumm(ary|aries|arize|arise|arizing|ed up)\b|\bsum (it|this|that|things) up\b",
+    r"\btl;?dr\b|\bgist\b|\bboil (it|this|that) down\b",
+    r"\bcatch (me|us) up\b|\bcaught up\b|\bwhat did (i|we) miss\b|\bwhat('?s| is| has) been (discussed|happening|going on)\b",
+    r"\b(audio|mp3|podcast|voice (note|memo|message)|read (it|this) (out|aloud)|listen to)\b",
+    r"\b(highlights|key points|rundown|digest|overview|brief(ing)? me)\b",
+)]
+
+
+def rule_match(text):
+    return any(pattern.search(text) for pattern in RECAP_PATTERNS)
+
+
+class RecapFilter:
+    """
+    Cheap in-process gate in front of the recap analyzer LLM call. A message
+    goes to the LLM when it mentions the bot, matches one of the recap
+    phrasings, or the local Naive Bayes model (trained on logged LLM
+    decisions) gives it at least `threshold` probability of being a recap
+    request. Only model passes (the low-confidence path) are rate limited per
+    channel by `cooldown`: mentions and explicit recap phrasings always reach
+    the LLM, so an unrelated rule match cannot swallow a real request.
+    """
+
+    def __init__(self, model=None, threshold=THRESHOLD, cooldown=COOLDOWN):
+        self.model = model
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._last_call = {}          # channel id -> monotonic time of the last gated LLM call
+        self._lock = threading.Lock()
+
+        self.passed = {"mention": 0, "rule": 0, "model": 0}
+        self.skipped = {"filtered": 0, "cooldown": 0}
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, threshold=THRESHOLD, cooldown=COOLDOWN):
+        model = None
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    model = json.load(f)
+                logging.info(f"Recap filter model loaded from {path}")
+            except (OSError, ValueError) as e:
+                logging.warning(f"⚠️ Could not load recap filter model ({e}); using rules only.")
+        return cls(model, threshold, cooldown)
+
+    def probability(self, text):
+        """P(RECAP) from the local model; 0.0 without one."""
+        if not self.model or "RECAP" not in self.model["classes"]:
+            return 0.0
+        scores = {}
+        for label in self.model["classes"]:
+            log_probs = self.model["feature_log_prob"][label]
+            unknown = self.model["unknown_log_prob"][label]
+            score = self.model["class_log_prior"][label]
+            for feature in tokenize(text):
+                score += log_probs.get(feature, unknown)
+            scores[label] = score
+        top = max(scores.values())
+        return math.exp(scores["RECAP"] - top) / sum(math.exp(s - top) for s in scores.values())
+
+    def classify(self, text, mentioned=False):
+        """Returns the reason the message should reach the LLM ("mention", "rule", "model") or None."""
+        if mentioned:
+            return "mention"
+        if rule_match(text):
+            return "rule"
+        if self.probability(text) >= self.threshold:
+            return "model"
+        return None
+
+    def check(self, channel_id, text, mentioned=False):
+        """(call_llm, reason); counts the outcome and applies the per-channel cooldown."""
+        reason = self.classify(text, mentioned)
+        with self._lock:
+            if reason is None:
+                self.skipped["filtered"] += 1
+                return False, "filtered"
+            if reason == "model":
+                now = time.monotonic()
+                last = self._last_call.get(channel_id)
+                if last is not None and now - last < self.cooldown:
+                    self.skipped["cooldown"] += 1
+                    return False, "cooldown"
+                self._last_call[channel_id] = now
+            self.passed[reason] += 1
+            return True, reason
+
+    def stats(self):
+        with self._lock:
+            passed = sum(self.passed.values())
+            skipped = sum(self.skipped.values())
+            return {
+                "passed": dict(self.passed),
+                "skipped": dict(self.skipped),
+                "calls_avoided": skipped / (passed + skipped) if passed + skipped else 0.0,
+            }
+
+
+# --- DECISION LOG (training corpus) ---
+_log_lock = threading.Lock()
+
+
+def log_decision(text, trigger_audio, **extra):
+    """Appends the LLM's verdict on a message that passed the gate to the JSONL training corpus."""
+    if not RECAP_LOG_PATH:
+        return
+    record = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "text": text,
+        "recap": bool(trigger_audio),
+    }
+    record.update(extra)
+    try:
+        with _log_lock, open(RECAP_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logging.warning(f"⚠️ Could not log recap decision: {e}")
+
+
+# --- SHARED INSTANCE ---
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_recap_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                _filter = RecapFilter.load()
+    return _filter
+
+
+# --- TRAINING / EVALUATION CLI ---
+
+def load_corpus(path):
+    """[(text, is_recap, mentioned)] from JSONL records with "text" and "recap" (and optionally "mention")."""
+    examples = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("text") and "recap" in record:
+                examples.append((record["text"], bool(record["recap"]), bool(record.get("mention"))))
+    return examples
+
+
+def evaluate(recap_filter, examples, thresholds=(0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)):
+    """Recall on labelled recap requests and fraction of LLM calls avoided (cooldown not applied)."""
+    start = time.perf_counter()
+    predictions = [
+        (recap_filter.classify(text, mentioned), recap_filter.probability(text), is_recap)
+        for text, is_recap, mentioned in examples
+    ]
+    per_message_us = (time.perf_counter() - start) / max(len(examples), 1) * 1e6
+    positives = sum(1 for *_, is_recap in predictions if is_recap)
+    print(f"Examples: {len(predictions)} ({positives} recap requests) | {per_message_us:.1f} µs/message")
+
+    print(f"{'threshold':>9} | {'recall':>7} | {'precision':>9} | {'calls avoided':>13}")
+    for threshold in sorted(set(thresholds) | {recap_filter.threshold}):
+        passed = [
+            is_recap for reason, probability, is_recap in predictions
+            if reason in ("mention", "rule") or probability >= threshold
+        ]
+        hits = sum(passed)
+        recall = hits / positives if positives else float("nan")
+        precision = hits / len(passed) if passed else float("nan")
+        avoided = 1 - len(passed) / max(len(predictions), 1)
+        marker = " *" if threshold == recap_filter.threshold else ""
+        print(f"{threshold:>9.2f} | {recall:>7.1%} | {precision:>9.1%} | {avoided:>13.1%}{marker}")
+
+    missed = [text for (reason, probability, is_recap), (text, *_) in zip(predictions, examples)
+              if is_recap and reason is None]
+    for text in missed[:10]:
+        print(f"  missed: {text[:80]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / evaluate the mp3 bot's local recap pre-filter.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_cmd = sub.add_parser("train", help="Train a model from a JSONL corpus of {text, recap}")
+    train_cmd.add_argument("corpus")
+    train_cmd.add_argument("-o", "--output", default=MODEL_PATH)
+
+    eval_cmd = sub.add_parser("evaluate", help="Recall and calls avoided on a labelled JSONL set")
+    eval_cmd.add_argument("corpus")
+    eval_cmd.add_argument("-m", "--model", default=MODEL_PATH)
+    eval_cmd.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    args = parser.parse_args()
+    examples = load_corpus(args.corpus)
+    if not examples:
+        print("No usable examples found (need 'text' and 'recap' fields).")
+        return
+
+    if args.command == "train":
+        model = train((text, "RECAP" if is_recap else "OTHER") for text, is_recap, _ in examples)
+        with open(args.output, "w") as f:
+            json.dump(model, f)
+        print(f"Model trained on {len(examples)} examples -> {args.output}")
+    else:
+        evaluate(RecapFilter.load(args.model, threshold=args.threshold), examples)
+
+
+if __name__ == "__main__":
+    main()
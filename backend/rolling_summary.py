@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from bot_prompts import ROLLING_SUMMARY_SYSTEM_PROMPT
+from context_packer import count_tokens
+
+load_dotenv()
+
+# --- CONFIG ---
+MAX_CHANNELS = int(os.environ.get("ROLLING_SUMMARY_MAX_CHANNELS", "5000"))
+
+
+def estimate_tokens(text):
+    """Token count for savings reporting (see context_packer.count_tokens)."""
+    return count_tokens(text)
+
+
+def ts_key(ts):
+    """Sort key for Slack message timestamps ("1700000000.000100") without float rounding."""
+    seconds, _, micros = (ts or "0").partition(".")
+    return int(seconds), int(micros or 0)
+
+
+def summary_update_messages(previous_summary, new_lines):
+    """Chat messages for one incremental fold: the running summary plus only the delta."""
+    return [
+        {"role": "system", "content": ROLLING_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": (
+            f"CURRENT SUMMARY:\n{previous_summary or '(none yet)'}\n\n"
+            f"NEW MESSAGES:\n" + "\n".join(new_lines)
+        )}
+    ]
+
+
+class _ChannelSummary:
+    __slots__ = ("summary", "watermark", "lock")
+
+    def __init__(self):
+        self.summary = ""
+        self.watermark = None     # key of the last message folded into the summary
+        self.lock = threading.Lock()
+
+
+class RollingSummaries:
+    """
+    A compact running summary per channel plus a watermark of the last
+    message folded into it. update() only sends the messages newer than the
+    watermark (and the current summary) to the model, and makes no call at
+    all when nothing new arrived.
+    """
+
+    def __init__(self, max_channels=MAX_CHANNELS):
+        self.max_channels = max_channels
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.folds = 0
+        self.skipped = 0            # update() calls with no new messages
+
+    def _channel(self, channel_id):
+        with self._lock:
+            state = self._channels.get(channel_id)
+            if state is None:
+                state = self._channels[channel_id] = _ChannelSummary()
+                while len(self._channels) > self.max_channels:
+                    self._channels.popitem(last=False)
+            else:
+                self._channels.move_to_end(channel_id)
+            return state
+
+    def get(self, channel_id):
+        """(summary, watermark) for the channel; ("", None) if nothing was folded yet."""
+        with self._lock:
+            state = self._channels.get(channel_id)
+            return (state.summary, state.watermark) if state is not None else ("", None)
+
+    def update(self, channel_id, items, summarize_fn):
+        """
+        Folds the (key, line) items newer than the watermark into the summary.
+        items are oldest first; keys must be comparable (Slack ts_key, sequence
+        numbers, ...). summarize_fn(previous_summary, new_lines) returns the new
+        summary. Returns (summary, number of messages folded).
+        """
+        state = self._channel(channel_id)
+        with state.lock:
+            delta = [(key, line) for key, line in items if state.watermark is None or key > state.watermark]
+            if not delta:
+                self.skipped += 1
+                return state.summary, 0
+
+            new_lines = [line for _, line in delta]
+            summary = summarize_fn(state.summary, new_lines)
+            if not summary:
+                # Keep the old state; the same delta is retried next time
+                logging.warning(f"Rolling summary update for {channel_id} returned nothing")
+                return state.summary, 0
+            self.folds += 1
+
+            state.summary = summary.strip()
+            state.watermark = delta[-1][0]
+            return state.summary, len(delta)
+
+    def stats(self):
+        with self._lock:
+            channels = len(self._channels)
+        return {
+            "channels": channels,
+            "folds": self.folds,
+            "skipped": self.skipped,
+        }
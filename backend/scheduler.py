@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from metrics import COUNTER, GAUGE, register_collector
+
+load_dotenv()
+
+# --- CONFIG ---
+WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "8"))            # Pipelines running at once
+MAX_PENDING = int(os.environ.get("SCHEDULER_MAX_PENDING", "100"))  # Queued (not yet running) jobs, all channels
+ASYNC_WORKERS = int(os.environ.get("ASYNC_SCHEDULER_WORKERS", "200"))  # Coroutines are cheap; see async_bots.py
+BUSY_MESSAGE = "⏳ I'm handling a lot of requests right now. Please try again in a minute."
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "enqueued_at", "context")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.context = None
+
+
+class ChannelScheduler:
+    """
+    Runs event-handler work on a fixed pool of worker threads.
+
+    Jobs are queued per channel and a channel has at most one job running, so
+    replies inside a channel never reorder. Channels with pending work take
+    turns round-robin, so one busy channel cannot starve the others. Once
+    `max_pending` jobs are waiting, submit() refuses new work so the caller
+    can answer "busy" right away instead of letting the request time out.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, name="scheduler"):
+        self.max_pending = max_pending
+        self.name = name
+
+        self._queues = {}        # channel -> deque of _Job
+        self._ready = deque()    # channels with queued jobs and nothing running, in turn order
+        self._running = set()    # channels with a job in progress
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        register_collector(self.collect_metrics)
+
+    def submit(self, channel, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) behind earlier work for `channel`. Returns False if shed."""
+        with self._cond:
+            if self._closed or self._pending >= self.max_pending:
+                self.shed += 1
+                logging.warning(f"{self.name}: shedding request for {channel} ({self._pending} pending)")
+                return False
+            queue = self._queues.get(channel)
+            if queue is None:
+                queue = self._queues[channel] = deque()
+            queue.append(_Job(fn, args, kwargs))
+            self._pending += 1
+            self.submitted += 1
+            if len(queue) == 1 and channel not in self._running:
+                self._ready.append(channel)
+                self._cond.notify()
+            return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._closed:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                channel = self._ready.popleft()
+                job = self._queues[channel].popleft()
+                self._pending -= 1
+                self._running.add(channel)
+                wait = time.monotonic() - job.enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            ok = True
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                ok = False
+                logging.error(f"{self.name}: job for {channel} failed: {e}")
+
+            with self._cond:
+                self._running.discard(channel)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if self._queues[channel]:
+                    # Back of the line, behind every other waiting channel
+                    self._ready.append(channel)
+                    self._cond.notify()
+                else:
+                    del self._queues[channel]
+
+    def close(self, wait=True):
+        """Stops accepting work; queued jobs still run. Joins the workers if `wait`."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self):
+        with self._cond:
+            started = self.completed + self.failed + len(self._running)
+            return {
+                "queue_depth": self._pending,
+                "running": len(self._running),
+                "channels_waiting": sum(1 for queue in self._queues.values() if queue),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "shed": self.shed,
+                "avg_wait": self.total_wait / started if started else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+    def collect_metrics(self):
+        stats = self.stats()
+        labels = {"scheduler": self.name}
+        return [
+            ("slackbot_scheduler_running", GAUGE, "Jobs running on the scheduler's workers.",
+             [(labels, stats["running"])]),
+            ("slackbot_scheduler_queued", GAUGE, "Jobs waiting for a worker.",
+             [(labels, stats["queue_depth"])]),
+            ("slackbot_scheduler_jobs_total", COUNTER, "Scheduler jobs by outcome.",
+             [(dict(labels, outcome=outcome), stats[outcome]) for outcome in ("completed", "failed", "shed")]),
+        ]
+
+
+class AsyncChannelScheduler:
+    """
+    asyncio counterpart of ChannelScheduler for async_bots.py: jobs are
+    coroutine functions run by `workers` tasks on the event loop, with the
+    same per-channel ordering, round-robin turns between channels, shedding
+    and metrics. submit() is a plain call, so handlers never wait on it.
+
+    A job runs in a copy of the submitter's context, so usage_scope() labels
+    and the current trace carry over as they do for the threaded scheduler.
+    """
+
+    def __init__(self, workers=ASYNC_WORKERS, max_pending=MAX_PENDING, name="scheduler"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.name = name
+
+        self._queues = {}        # channel -> deque of _Job
+        self._ready = None       # asyncio.Queue of channels whose turn it is (created on the running loop)
+        self._running = set()
+        self._pending = 0
+        self._closed = False
+        self._tasks = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        register_collector(self.collect_metrics)
+
+    def _start(self):
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, channel, fn, *args, **kwargs):
+        """Queues `await fn(*args, **kwargs)` behind earlier work for `channel`. Returns False if shed."""
+        if self._closed or self._pending >= self.max_pending:
+            self.shed += 1
+            logging.warning(f"{self.name}: shedding request for {channel} ({self._pending} pending)")
+            return False
+        self._start()
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = deque()
+        job = _Job(fn, args, kwargs)
+        job.context = contextvars.copy_context()
+        queue.append(job)
+        self._pending += 1
+        self.submitted += 1
+        if len(queue) == 1 and channel not in self._running:
+            self._ready.put_nowait(channel)
+        return True
+
+    async def _worker(self):
+        while True:
+            channel = await self._ready.get()
+            job = self._queues[channel].popleft()
+            self._pending -= 1
+            self._running.add(channel)
+            wait = time.monotonic() - job.enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+            ok = True
+            try:
+                # The task is created inside the job's context, so it runs in a copy of it
+                await job.context.run(asyncio.ensure_future, job.fn(*job.args, **job.kwargs))
+            except Exception as e:
+                ok = False
+                logging.error(f"{self.name}: job for {channel} failed: {e}")
+
+            self._running.discard(channel)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if self._queues[channel]:
+                # Back of the line, behind every other waiting channel
+                self._ready.put_nowait(channel)
+            else:
+                del self._queues[channel]
+            self._ready.task_done()
+
+    async def close(self):
+        """Stops accepting work, waits for the queued jobs to finish and stops the workers."""
+        self._closed = True
+        if self._ready is None:
+            return
+        await self._ready.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        started = self.completed + self.failed + len(self._running)
+        return {
+            "queue_depth": self._pending,
+            "running": len(self._running),
+            "channels_waiting": sum(1 for queue in self._queues.values() if queue),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "avg_wait": self.total_wait / started if started else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    collect_metrics = ChannelScheduler.collect_metrics
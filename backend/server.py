@@ -1,11 +1,114 @@
-from flask import Flask
+import hmac
+import os
+
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 
+from api_stream import API_MAX_INPUT_CHARS, EventStream, StreamSlots, get_history, orchestrate_work, summarize_work
+from metrics import scrape, start_metrics
+
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("API_MAX_BODY_BYTES", str(1024 * 1024)))
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
 
+# Caps the open streams of this process (each holds a server thread while its pipeline runs)
+slots = StreamSlots()
+
+# /api/* requires "Authorization: Bearer $API_TOKEN"; without API_TOKEN the API is disabled
+API_TOKEN = os.environ.get("API_TOKEN")
+# Channels /api/summarize may read (comma-separated ids); empty means no channel summaries
+API_CHANNELS = {c.strip() for c in os.environ.get("API_SUMMARIZE_CHANNELS", "").split(",") if c.strip()}
 
 
 @app.route('/')
 def home():
     return "Hello, World!"
+
+
+@app.route('/metrics')
+def metrics():
+    # Merges the snapshots every running bot writes to METRICS_DIR (see metrics.py)
+    return Response(scrape("server"), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- STREAMING API ---
+
+@app.before_request
+def require_api_token():
+    if not request.path.startswith("/api/") or request.method == "OPTIONS":
+        return None
+    if not API_TOKEN:
+        return jsonify({"error": "The API is disabled (API_TOKEN is not set)."}), 503
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), API_TOKEN.encode()):
+        response = jsonify({"error": "Missing or invalid bearer token."})
+        response.status_code = 401
+        response.headers["WWW-Authenticate"] = "Bearer"
+        return response
+    return None
+
+
+# Both endpoints answer with Server-Sent Events: start, status / route / agent
+# progress, token (the answer as it is generated), then done or error.
+# GET (query string) and POST (JSON body) are equivalent; both need the bearer token.
+
+def _params():
+    if request.method == "POST":
+        return request.get_json(silent=True) or {}
+    return request.args
+
+
+def _bad_request(message):
+    return jsonify({"error": message}), 400
+
+
+def _event_stream(pipeline, work, **attributes):
+    if not slots.acquire():
+        response = jsonify({"error": "Too many open streams; try again shortly."})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    stream = EventStream(pipeline, work, on_close=slots.release, **attributes)
+    return Response(
+        iter(stream),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-Id": stream.request_id},
+    )
+
+
+@app.route('/api/orchestrate', methods=['GET', 'POST'])
+def api_orchestrate():
+    query = str(_params().get("query") or "").strip()
+    if not query:
+        return _bad_request("'query' is required")
+    if len(query) > API_MAX_INPUT_CHARS:
+        return _bad_request(f"'query' is longer than {API_MAX_INPUT_CHARS} characters")
+    return _event_stream("orchestrate", orchestrate_work(query))
+
+
+@app.route('/api/summarize', methods=['GET', 'POST'])
+def api_summarize():
+    params = _params()
+    channel = str(params.get("channel") or "")
+    if channel:
+        if channel not in API_CHANNELS:
+            return jsonify({"error": f"Channel {channel} is not in API_SUMMARIZE_CHANNELS."}), 403
+        if get_history() is None:
+            return _bad_request("Channel summaries need SLACK_BOT_TOKEN on the server")
+        return _event_stream("summarize", summarize_work(channel=channel), channel=channel)
+
+    messages = params.get("messages") if request.method == "POST" else None
+    if messages is None and params.get("transcript"):
+        messages = str(params["transcript"]).splitlines()
+    if not isinstance(messages, list) or not messages:
+        return _bad_request("Send 'messages' (a list), 'transcript' (text) or 'channel'")
+    if sum(len(str(message)) for message in messages) > API_MAX_INPUT_CHARS:
+        return _bad_request(f"The transcript is longer than {API_MAX_INPUT_CHARS} characters")
+    return _event_stream("summarize", summarize_work(messages=messages))
+
+
+if __name__ == "__main__":
+    # Development server; in production run `gunicorn -c gunicorn.conf.py server:app`
+    start_metrics("server")
+    app.run(host=os.environ.get("SERVER_HOST", "127.0.0.1"), port=int(os.environ.get("SERVER_PORT", "5000")),
+            threaded=True)
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from metrics import cache_family, register_collector
+
+load_dotenv()
+
+# --- CONFIG ---
+SIMILARITY_ENABLED = os.environ.get("SIMILARITY_CACHE_ENABLED", "1") != "0"
+# Estimated Jaccard similarity (word 1- and 2-grams) needed to reuse an answer
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", "0.8"))
+# Only short, query-like inputs are matched; transcripts and agent hand-offs are not
+SIMILARITY_MAX_CHARS = int(os.environ.get("SIMILARITY_MAX_CHARS", "500"))
+MAX_ENTRIES = int(os.environ.get("SIMILARITY_CACHE_MAX_ENTRIES", "200000"))
+MAX_BYTES = int(os.environ.get("SIMILARITY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+NUM_PERM = 32   # MinHash signature length
+BANDS = 8       # LSH bands of NUM_PERM / BANDS rows each
+MAX_CANDIDATES = 64
+
+_MENTION_RE = re.compile(r"<[@#!][^>]*>")
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def clean_query(text):
+    return _WORD_RE.findall(_MENTION_RE.sub(" ", text.lower()))
+
+
+def shingles(text):
+    words = clean_query(text)
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+class MinHasher:
+    """
+    MinHash over 32-bit lanes of salted blake2b digests: each 64-byte digest
+    yields 16 independent hash values, and the per-lane minimum is taken in C
+    via map(min, zip(*rows)) instead of a Python loop per permutation.
+    """
+
+    LANES_PER_DIGEST = 16
+
+    def __init__(self, num_perm=NUM_PERM):
+        if num_perm % self.LANES_PER_DIGEST:
+            raise ValueError(f"num_perm must be a multiple of {self.LANES_PER_DIGEST}")
+        self.num_perm = num_perm
+        self._salts = [i.to_bytes(16, "little") for i in range(num_perm // self.LANES_PER_DIGEST)]
+
+    def signature(self, features):
+        if not features:
+            return None
+        rows = []
+        for feature in features:
+            data = feature.encode("utf-8")
+            row = array("I")
+            for salt in self._salts:
+                row.frombytes(hashlib.blake2b(data, digest_size=64, salt=salt).digest())
+            rows.append(row)
+        return array("I", map(min, zip(*rows)))
+
+
+class _Entry:
+    __slots__ = ("namespace", "signature", "value", "size")
+
+    def __init__(self, namespace, signature, value):
+        self.namespace = namespace
+        self.signature = signature
+        self.value = value
+        self.size = len(value) + signature.itemsize * len(signature)
+
+
+class SimilarityCache:
+    """
+    Near-duplicate answer cache. Queries are reduced to MinHash signatures and
+    indexed in banded LSH buckets; a lookup only compares against the handful
+    of entries sharing a bucket, so cost stays flat as the cache grows.
+    Bounded by entry count and total bytes (LRU eviction).
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, num_perm=NUM_PERM, bands=BANDS,
+                 max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._hasher = MinHasher(num_perm)
+
+        self._entries = OrderedDict()   # entry id -> _Entry (LRU order)
+        self._buckets = {}              # (namespace, band, band bytes) -> set of entry ids
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        register_collector(self.collect_metrics)
+
+    def _band_keys(self, namespace, signature):
+        raw = signature.tobytes()
+        step = self.rows * signature.itemsize
+        return [(namespace, band, raw[band * step:(band + 1) * step]) for band in range(self.bands)]
+
+    def lookup(self, namespace, text):
+        """Returns (value, similarity) for the closest cached query, or (None, 0.0)."""
+        signature = self._hasher.signature(shingles(text))
+        if signature is None:
+            return None, 0.0
+
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                bucket = self._buckets.get(key)
+                if bucket:
+                    candidates.update(bucket)
+                    if len(candidates) >= MAX_CANDIDATES:
+                        break
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                other = self._entries[entry_id].signature
+                score = sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                return self._entries[best_id].value, best_score
+
+            self.misses += 1
+            return None, best_score
+
+    def add(self, namespace, text, value):
+        signature = self._hasher.signature(shingles(text))
+        if signature is None or not value:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            entry = _Entry(namespace, signature, value)
+            self._entries[entry_id] = entry
+            self._bytes += entry.size
+            for key in self._band_keys(namespace, signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.size
+        self.evictions += 1
+        for key in self._band_keys(entry.namespace, entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+        }
+
+    def collect_metrics(self):
+        return [cache_family("llm_similar", self.hits, self.misses)]
+
+
+# --- SHARED INSTANCE ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_similarity_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SimilarityCache()
+    return _cache
+
+
+def similarity_target(kwargs):
+    """
+    (namespace, query) if this completion request is eligible for near-duplicate
+    matching, else None. Only plain [system, user] requests with a short user
+    message qualify; the namespace pins matches to the same model/persona/format.
+
+    Callers opt in per call site (similar=True in llm_cache): only prompts whose
+    user message is the raw user query (router, single-agent answers) may be
+    answered by a near match. Transcripts and summary folds must not be, since
+    one new line can change the right answer completely.
+    """
+    if not SIMILARITY_ENABLED:
+        return None
+    messages = kwargs.get("messages") or []
+    if len(messages) != 2 or messages[0].get("role") != "system" or messages[1].get("role") != "user":
+        return None
+    query = messages[1].get("content") or ""
+    if len(query) > SIMILARITY_MAX_CHARS:
+        return None
+    persona = f"{kwargs.get('model')}|{kwargs.get('response_format')}|{messages[0].get('content')}"
+    namespace = hashlib.blake2b(persona.encode("utf-8"), digest_size=8).hexdigest()
+    return namespace, query
@@ -0,0 +1,221 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from slack_sdk import WebClient
+from slack_sdk.http_retry import RetryHandler, default_retry_handlers
+
+from metrics import COUNTER, EXTERNAL_ERRORS, EXTERNAL_RETRIES, cache_family, register_collector
+from tracing import span
+
+load_dotenv()
+
+# --- CONFIG ---
+SLACK_API_URL = os.environ.get("SLACK_API_URL", "https://slack.com/api/")
+MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", "3"))          # Per call, on HTTP 429
+MAX_RETRY_WAIT = float(os.environ.get("SLACK_MAX_RETRY_WAIT", "30"))  # Give up instead of sleeping longer
+RETRY_JITTER = 0.5            # Wait Retry-After * (1 + up to 50%) so released callers don't stampede
+IDENTITY_TTL = float(os.environ.get("SLACK_IDENTITY_TTL", "3600"))   # auth.test / team.info
+CHANNEL_TTL = float(os.environ.get("SLACK_CHANNEL_TTL", "300"))      # conversations.info
+
+
+class RetryAfterHandler(RetryHandler):
+    """
+    Retries HTTP 429 responses after the Retry-After delay plus jitter.
+    Delays above `max_wait` are not retried, so a heavily limited method
+    fails fast instead of parking a worker thread.
+    """
+
+    def __init__(self, max_retry_count=MAX_RETRIES, max_wait=MAX_RETRY_WAIT, jitter=RETRY_JITTER):
+        super().__init__(max_retry_count=max_retry_count)
+        self.max_wait = max_wait
+        self.jitter = jitter
+        self.rate_limited = 0
+        self.retries = 0
+
+    @staticmethod
+    def _retry_after(response):
+        for name, values in response.headers.items():
+            if name.lower() == "retry-after":
+                value = values[0] if isinstance(values, list) else values
+                try:
+                    return max(float(value), 0.0)
+                except ValueError:
+                    break
+        return 1.0
+
+    def _can_retry(self, *, state, request, response=None, error=None):
+        if response is None or response.status_code != 429:
+            return False
+        self.rate_limited += 1
+        return self._retry_after(response) <= self.max_wait
+
+    def prepare_for_next_attempt(self, *, state, request, response=None, error=None):
+        if response is None:
+            raise error
+        retry_after = self._retry_after(response)
+        delay = max(retry_after, 1.0) * (1 + random.random() * self.jitter)
+        logging.warning(f"Slack rate limited; retrying in {delay:.1f}s (Retry-After {retry_after:g}s)")
+        self.retries += 1
+        EXTERNAL_RETRIES.inc(service="slack")
+        state.next_attempt_requested = True
+        time.sleep(delay)
+        state.increment_current_attempt()
+
+
+class SlackClient(WebClient):
+    """
+    WebClient with the extras every bot needs:
+    - bot identity, workspace and channel metadata cached with TTLs
+    - 429 Retry-After handling with jittered retries (RetryAfterHandler)
+    - chat_update coalescing: while an edit of a message is in flight, newer
+      edits of the same message replace each other and only the latest is sent
+    - per-method API call counts (stats())
+    """
+
+    def __init__(self, token=None, base_url=SLACK_API_URL, retry_handlers=None, **kwargs):
+        self.rate_limit_handler = RetryAfterHandler()
+        if retry_handlers is None:
+            retry_handlers = default_retry_handlers() + [self.rate_limit_handler]
+        super().__init__(token=token, base_url=base_url, retry_handlers=retry_handlers, **kwargs)
+
+        self._calls = Counter()
+        self._calls_lock = threading.Lock()
+
+        self._metadata = {}   # key -> (value, expires_at)
+        self._metadata_lock = threading.Lock()
+        self.metadata_hits = 0
+        self.metadata_misses = 0
+
+        self._updates = {}    # (channel, ts) -> latest edit waiting behind the in-flight one
+        self._updates_lock = threading.Lock()
+        self.coalesced_updates = 0
+        register_collector(self.collect_metrics)
+
+    # --- CALL COUNTING ---
+
+    def api_call(self, api_method, **kwargs):
+        with self._calls_lock:
+            self._calls[api_method] += 1
+        with span(f"slack.{api_method}"):
+            try:
+                return super().api_call(api_method, **kwargs)
+            except Exception:
+                EXTERNAL_ERRORS.inc(service="slack")
+                raise
+
+    # --- METADATA ---
+
+    def _cached(self, key, ttl, loader):
+        now = time.monotonic()
+        with self._metadata_lock:
+            entry = self._metadata.get(key)
+            if entry is not None and entry[1] > now:
+                self.metadata_hits += 1
+                return entry[0]
+            self.metadata_misses += 1
+        # Loaded outside the lock; concurrent misses at worst fetch twice
+        value = loader()
+        with self._metadata_lock:
+            self._metadata[key] = (value, now + ttl)
+        return value
+
+    def bot_identity(self):
+        """auth.test result (user_id, bot_id, team_id, ...), cached."""
+        return self._cached(("auth",), IDENTITY_TTL, lambda: self.auth_test().data)
+
+    def bot_user_id(self):
+        return self.bot_identity()["user_id"]
+
+    def team(self):
+        return self._cached(("team",), IDENTITY_TTL, lambda: self.team_info()["team"])
+
+    def channel(self, channel_id):
+        return self._cached(("channel", channel_id), CHANNEL_TTL,
+                            lambda: self.conversations_info(channel=channel_id)["channel"])
+
+    def invalidate(self, *key):
+        """Drops one cached metadata entry (e.g. ("channel", "C123")), or all of them."""
+        with self._metadata_lock:
+            if key:
+                self._metadata.pop(key, None)
+            else:
+                self._metadata.clear()
+
+    # --- CHAT.UPDATE COALESCING ---
+
+    def chat_update(self, *, channel, ts, **kwargs):
+        """
+        Returns the Slack response, or None when the edit was merged into an
+        edit of the same message already in flight (which then sends the
+        newest text once it completes).
+        """
+        key = (channel, ts)
+        with self._updates_lock:
+            if key in self._updates:
+                if self._updates[key] is not None:
+                    self.coalesced_updates += 1
+                self._updates[key] = kwargs
+                return None
+            self._updates[key] = None
+
+        try:
+            response = super().chat_update(channel=channel, ts=ts, **kwargs)
+            while True:
+                with self._updates_lock:
+                    pending = self._updates[key]
+                    if pending is None:
+                        del self._updates[key]
+                        return response
+                    self._updates[key] = None
+                response = super().chat_update(channel=channel, ts=ts, **pending)
+        except Exception:
+            with self._updates_lock:
+                self._updates.pop(key, None)
+            raise
+
+    # --- STATS ---
+
+    def stats(self):
+        with self._calls_lock:
+            calls = dict(self._calls)
+        return {
+            "calls": calls,
+            "total_calls": sum(calls.values()),
+            "rate_limited": self.rate_limit_handler.rate_limited,
+            "retries": self.rate_limit_handler.retries,
+            "coalesced_updates": self.coalesced_updates,
+            "metadata_hits": self.metadata_hits,
+            "metadata_misses": self.metadata_misses,
+        }
+
+    def collect_metrics(self):
+        with self._calls_lock:
+            calls = dict(self._calls)
+        return [
+            ("slackbot_slack_api_calls_total", COUNTER, "Slack Web API calls by method.",
+             [({"method": method}, count) for method, count in calls.items()]),
+            ("slackbot_slack_rate_limited_total", COUNTER, "Slack responses with HTTP 429.",
+             [({}, self.rate_limit_handler.rate_limited)]),
+            cache_family("slack_metadata", self.metadata_hits, self.metadata_misses),
+        ]
+
+
+def share_client(app):
+    """
+    Bolt builds a fresh WebClient for every request, so say() and the
+    injected `client` would bypass the shared caches and counters. This
+    middleware hands them app.client instead.
+    """
+    client = app.client
+
+    @app.middleware
+    def use_shared_client(context, next):
+        context["client"] = client
+        next()
+
+    return app
@@ -1,5 +1,4 @@
 import os
-import json
 import logging
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
@@ -8,22 +7,34 @@ from dotenv import load_dotenv
 # --- IMPORT LOGIC FROM YOUR CLI TOOL ---
 # This ensures the Slack bot behaves exactly like your CLI test
 from orchestrator import (
-    client, # Reuse the OpenAI client connection
-    ROUTER_SYSTEM_PROMPT,
-    SYNTHESIZER_SYSTEM_PROMPT,
     TECH_SYSTEM_PROMPT,
     BUSINESS_SYSTEM_PROMPT,
-    get_agent_response
+    stream_agent_response,
+    route_request,
+    run_collaboration
 )
+from slack_stream import SlackMessageStream
+from slack_api import SlackClient, share_client
+from event_trace import listener_executor, record_events
+from llm_usage import event_scope
+from metrics import start_metrics
+from tracing import traced
 
 # --- SETUP ---
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 # Initialize Slack
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+# SlackClient caches bot/channel metadata, retries 429s and coalesces chat_update bursts
+# EVENT_TRACE_PATH=events.jsonl records incoming events for replay (benchmarks/soak.py)
+app = record_events(share_client(App(
+    client=SlackClient(token=os.environ.get("SLACK_BOT_TOKEN")),
+    listener_executor=listener_executor(),
+)))
 
 @app.event("app_mention")
+@traced("orchestrate")   # One trace per mention: router, agent, LLM and Slack spans
+@event_scope("orchestrate")   # LLM usage accounted to the mention's channel and user
 def handle_mentions(body, say, logger):
     event = body.get("event", {})
     text = event.get("text", "")
@@ -31,7 +42,7 @@ def handle_mentions(body, say, logger):
     channel = event.get("channel")
 
     # Clean the text (remove @BotName)
-    bot_id = app.client.auth_test()["user_id"]
+    bot_id = app.client.bot_user_id()
     cleaned_text = text.replace(f"<@{bot_id}>", "").strip()
 
     if not cleaned_text:
@@ -41,20 +52,11 @@ def handle_mentions(body, say, logger):
     # 1. ROUTING STEP
     # Send a temporary "Thinking" message
     status_msg = say(f"🧠 *Orchestrator:* Analyzing request...")
+    reply = None
     
     try:
-        # Call the Router (Using the same prompt as orchestrator.py)
-        router_response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
-                {"role": "user", "content": cleaned_text}
-            ]
-        )
-        routing = json.loads(router_response.choices[0].message.content)
-        decision = routing.get("decision")
-        reasoning = routing.get("reasoning")
+        # Call the Router (local fast-path first, same LLM prompt as orchestrator.py as fallback)
+        decision, reasoning = route_request(cleaned_text)
 
         # Update the status message on Slack
         app.client.chat_update(
@@ -63,39 +65,45 @@ def handle_mentions(body, say, logger):
             text=f"🧠 *Orchestrator:* Routing to *{decision}* Agent.\n_Reasoning: {reasoning}_"
         )
 
-        final_response = ""
-
         # 2. EXECUTION STEP
+        # The final answer is streamed into a placeholder message as tokens arrive
+        reply = SlackMessageStream(app.client, channel, prefix="*Final Response:*\n\n")
+
         if decision == "TECH":
             say(f"🛠️ *Tech Agent* is working...", thread_ts=status_msg["ts"])
-            final_response = get_agent_response(TECH_SYSTEM_PROMPT, cleaned_text)
+            reply.start()
+            for chunk in stream_agent_response(TECH_SYSTEM_PROMPT, cleaned_text, persona="tech", similar=True):
+                reply.append(chunk)
 
         elif decision == "BUSINESS":
             say(f"💼 *Business Agent* is working...", thread_ts=status_msg["ts"])
-            final_response = get_agent_response(BUSINESS_SYSTEM_PROMPT, cleaned_text)
+            reply.start()
+            for chunk in stream_agent_response(BUSINESS_SYSTEM_PROMPT, cleaned_text, persona="business",
+                                               similar=True):
+                reply.append(chunk)
 
         elif decision == "BOTH":
             say(f"🔄 *Collaborating* (Tech ⇄ Business)...", thread_ts=status_msg["ts"])
+            reply.start()
             
-            # Step A: Tech Agent
-            tech_res = get_agent_response(TECH_SYSTEM_PROMPT, cleaned_text)
-            
-            # Step B: Business Agent (Critique)
-            biz_context = f"User Query: {cleaned_text}\n\nTech Proposal: {tech_res}\n\nTask: Analyze cost/ROI."
-            biz_res = get_agent_response(BUSINESS_SYSTEM_PROMPT, biz_context)
-
-            # Step C: Synthesis
-            syn_context = f"Query: {cleaned_text}\n\nTech: {tech_res}\n\nBusiness: {biz_res}"
-            final_response = get_agent_response(SYNTHESIZER_SYSTEM_PROMPT, syn_context)
+            # Tech + Business run concurrently, Synthesizer reconciles and streams into the reply
+            dag_run = run_collaboration(cleaned_text, deliver=reply.append)
+            dag_run.result("synthesizer")  # re-raises if any agent failed
+            dag_run.result("deliver")      # ...or if streaming into Slack did
+            logger.info(f"[BOTH] {dag_run.timing_summary()}")
 
         # 3. FINAL OUTPUT
-        say(f"*Final Response:*\n\n{final_response}")
+        reply.finish()
 
     except Exception as e:
         logger.error(f"Error: {e}")
-        say(f"❌ Something went wrong: {e}")
+        if reply is not None and reply.ts:
+            reply.fail(f"❌ Something went wrong: {e}")
+        else:
+            say(f"❌ Something went wrong: {e}")
 
 if __name__ == "__main__":
     print("⚡️ Slack Orchestrator is running!")
+    start_metrics("slack_orchestrator")   # Scraped through server.py's /metrics
     handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
     handler.start()
\ No newline at end of file
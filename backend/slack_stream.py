@@ -0,0 +1,138 @@
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+UPDATE_INTERVAL = float(os.environ.get("SLACK_STREAM_INTERVAL_MS", "1000")) / 1000  # Normal edit cadence
+UPDATE_CHARS = int(os.environ.get("SLACK_STREAM_CHARS", "400"))      # ...or sooner once this much text is pending
+MIN_INTERVAL = 0.3            # Hard floor between edits, even when UPDATE_CHARS is reached
+MAX_MESSAGE_CHARS = 3900      # Slack truncates / rejects long messages; continue in a follow-up
+CURSOR = " ▌"
+
+
+class SlackMessageStream:
+    """
+    Progressively renders a token stream into one Slack message.
+
+    start() posts a placeholder, append() buffers chunks and edits the message
+    with chat_update at most every UPDATE_INTERVAL (or sooner for the first
+    tokens / once UPDATE_CHARS are pending, never faster than MIN_INTERVAL). When the text nears Slack's
+    size limit the current message is sealed and a follow-up is posted.
+    """
+
+    def __init__(self, client, channel, prefix="", placeholder="_Thinking..._", thread_ts=None,
+                 interval=UPDATE_INTERVAL, chars=UPDATE_CHARS, max_chars=MAX_MESSAGE_CHARS):
+        self.client = client
+        self.channel = channel
+        self.prefix = prefix
+        self.placeholder = placeholder
+        self.thread_ts = thread_ts
+        self.interval = interval
+        self.chars = chars
+        self.max_chars = max_chars
+
+        self.ts = None             # ts of the message currently being edited
+        self.message_ts = []       # every message this stream posted
+        self._sealed = []          # text of earlier, already completed messages
+        self._text = ""            # text of the current message (without prefix)
+        self._rendered = 0         # len(self._text) at the last edit
+        self._last_update = 0.0
+        self.updates = 0
+
+    def start(self):
+        self._post(self.prefix + self.placeholder)
+        return self
+
+    def append(self, chunk):
+        if not chunk:
+            return
+        if self.ts is None:
+            self.start()
+        self._text += chunk
+
+        while len(self.prefix) + len(self._text) > self.max_chars:
+            self._roll_over()
+
+        # The first tokens are shown as soon as the floor allows; after that, coalesce
+        pending = len(self._text) - self._rendered
+        elapsed = time.monotonic() - self._last_update
+        eager = self._rendered == 0 or pending >= self.chars
+        if elapsed >= self.interval or (eager and elapsed >= MIN_INTERVAL):
+            self._update(self._text + CURSOR)
+
+    def finish(self, fallback_text=None):
+        """
+        Writes the final text without the cursor. fallback_text is shown when
+        nothing was streamed (e.g. an error message).
+        """
+        if not self._sealed and not self._text and fallback_text:
+            self._text = fallback_text
+            while len(self.prefix) + len(self._text) > self.max_chars:
+                self._roll_over()
+        if self.ts is None:
+            self.start()
+        self._update(self._text or self.placeholder)
+
+    def fail(self, text):
+        """
+        Reports an error. Replaces the placeholder if nothing was streamed yet,
+        otherwise seals the partial answer and posts the error after it.
+        """
+        if self._sealed or self._text:
+            self.finish()
+            self._post(text)
+            return
+        self.prefix = ""
+        self._text = text
+        if self.ts is None:
+            self._post(text)
+        else:
+            self._update(text)
+
+    def full_text(self):
+        return "".join(self._sealed) + self._text
+
+    # --- INTERNALS ---
+
+    def _roll_over(self):
+        """Seal the current message at a sensible boundary and continue in a new one."""
+        limit = self.max_chars - len(self.prefix)
+        cut = max(self._text.rfind("\n", 0, limit), self._text.rfind(" ", 0, limit))
+        if cut <= limit // 2:
+            cut = limit
+        head, tail = self._text[:cut], self._text[cut:].lstrip()
+        separator = self._text[cut:len(self._text) - len(tail)]
+
+        self._text = head
+        self._update(head)
+        self._sealed.append(head + separator)
+
+        # Follow-ups carry no prefix and go to the same channel/thread
+        self.prefix = ""
+        self._text = tail
+        self._rendered = 0
+        self._post(tail + CURSOR if tail else self.placeholder)
+
+    def _post(self, text):
+        try:
+            response = self.client.chat_postMessage(channel=self.channel, text=text, thread_ts=self.thread_ts)
+            self.ts = response["ts"]
+            self.message_ts.append(self.ts)
+        except Exception as e:
+            logging.error(f"Slack stream post failed: {e}")
+        self._last_update = time.monotonic()
+
+    def _update(self, text):
+        self._rendered = len(self._text)
+        self._last_update = time.monotonic()
+        if self.ts is None:
+            return
+        try:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=self.prefix + text)
+            self.updates += 1
+        except Exception as e:
+            logging.error(f"Slack stream update failed: {e}")
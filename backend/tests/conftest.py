@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before any backend module is imported (load_dotenv() does not override them):
+# no on-disk caches, logs or exporters, and no real credentials needed.
+os.environ.update(
+    OPENAI_API_KEY="test",
+    LLM_CACHE_PATH="",
+    OUTBOX_PATH=":memory:",
+    ROUTER_LOG_PATH="",
+    RECAP_LOG_PATH="",
+    TRACE_EXPORTER="none",
+    FAST_ROUTER_AUDIT_RATE="0",
+)
+
+
+class Recorder:
+    """What the local HTTP server received, plus the status codes to answer with."""
+
+    def __init__(self):
+        self.requests = []      # (path, headers, body)
+        self.hits = {}          # path -> count
+        self.responses = {}     # path -> callable(hit number) -> status code
+        self.lock = threading.Lock()
+
+    def count(self, path):
+        with self.lock:
+            return self.hits.get(path, 0)
+
+
+@pytest.fixture
+def http_server():
+    """A local HTTP server on a free port; yields (base url, Recorder). Unknown paths answer 204."""
+    recorder = Recorder()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with recorder.lock:
+                recorder.requests.append((self.path, dict(self.headers), body))
+                hit = recorder.hits[self.path] = recorder.hits.get(self.path, 0) + 1
+            respond = recorder.responses.get(self.path)
+            self.send_response(respond(hit) if respond else 204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", recorder
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def wait_for(predicate, timeout=5.0, interval=0.02):
+    """Polls predicate() until it is true or `timeout` seconds pass; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
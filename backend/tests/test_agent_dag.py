@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent_dag import AgentDAG, Node, build_collaboration_plan
+
+
+def fake_stream(answers, fail=(), barrier=None):
+    """stream_fn for build_collaboration_plan: yields answers[prompt] word by word, raises for prompts in `fail`."""
+    def stream_fn(system_prompt, user_input):
+        if barrier is not None and system_prompt in ("TECH", "BUSINESS"):
+            barrier.wait(timeout=5)   # Both agents must be running at the same time
+        if system_prompt in fail:
+            raise RuntimeError(f"{system_prompt} agent is down")
+        for word in answers[system_prompt].split(" "):
+            yield word + " "
+    return stream_fn
+
+
+def fake_astream(answers, fail=()):
+    """Async stream_fn (plans for run_async); Tech and Business each wait until both are running."""
+    running, both_running = set(), asyncio.Event()
+
+    async def stream_fn(system_prompt, user_input):
+        if system_prompt in ("TECH", "BUSINESS"):
+            running.add(system_prompt)
+            if len(running) == 2:
+                both_running.set()
+            await asyncio.wait_for(both_running.wait(), timeout=5)
+        if system_prompt in fail:
+            raise RuntimeError(f"{system_prompt} agent is down")
+        for word in answers[system_prompt].split(" "):
+            await asyncio.sleep(0)
+            yield word + " "
+    return stream_fn
+
+
+ANSWERS = {"TECH": "use a queue", "BUSINESS": "costs little", "SYNTH": "ship the queue"}
+
+
+def test_collaboration_plan_runs_agents_concurrently_and_delivers_the_synthesis():
+    delivered = []
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH",
+                                    fake_stream(ANSWERS, barrier=threading.Barrier(2)), deliver=delivered.append)
+
+    dag_run = plan.run()
+
+    assert dag_run.result("synthesizer") == "ship the queue "
+    assert dag_run.result("deliver") == ""
+    assert "".join(delivered) == "ship the queue "
+    assert set(dag_run.timings) == {"tech", "business", "synthesizer", "deliver"}
+    assert dag_run.timings["synthesizer"]["start"] >= dag_run.timings["tech"]["end"]
+
+
+def test_failed_agent_fails_its_dependants_but_not_its_siblings():
+    delivered = []
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH",
+                                    fake_stream(ANSWERS, fail=("TECH",)), deliver=delivered.append)
+
+    dag_run = plan.run()
+
+    assert dag_run.result("business") == "costs little "
+    for name in ("tech", "synthesizer", "deliver"):
+        with pytest.raises(RuntimeError, match="TECH agent is down"):
+            dag_run.result(name)
+    assert dag_run.outputs["synthesizer"].error is dag_run.outputs["tech"].error
+    assert delivered == []
+    assert "synthesizer" not in dag_run.timings   # Never started
+
+
+def test_failing_stream_consumer_surfaces_through_its_own_result():
+    # The Synthesizer finishes, but delivering its chunks (e.g. to Slack) fails
+    def deliver(chunk):
+        raise ConnectionError("slack is unreachable")
+
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH", fake_stream(ANSWERS), deliver=deliver)
+    dag_run = plan.run()
+
+    assert dag_run.result("synthesizer") == "ship the queue "
+    with pytest.raises(ConnectionError):
+        dag_run.result("deliver")
+
+
+def test_plan_validation():
+    with pytest.raises(ValueError, match="unknown node"):
+        AgentDAG([Node("a", lambda inputs, emit: "", deps=("missing",))])
+    with pytest.raises(ValueError, match="Cycle"):
+        AgentDAG([Node("a", lambda inputs, emit: "", deps=("b",)), Node("b", lambda inputs, emit: "", deps=("a",))])
+
+
+def test_async_plan_runs_the_same_nodes_on_the_event_loop():
+    delivered = []
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH", fake_astream(ANSWERS), deliver=delivered.append)
+
+    dag_run = asyncio.run(plan.run_async())
+
+    assert dag_run.result("synthesizer") == "ship the queue "
+    assert dag_run.result("deliver") == ""
+    assert delivered == ["ship ", "the ", "queue "]
+    assert set(dag_run.timings) == {"tech", "business", "synthesizer", "deliver"}
+    assert dag_run.timings["synthesizer"]["start"] >= dag_run.timings["business"]["end"]
+
+
+def test_async_plan_surfaces_agent_and_deliver_failures():
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH", fake_astream(ANSWERS, fail=("BUSINESS",)),
+                                    deliver=lambda chunk: None)
+    dag_run = asyncio.run(plan.run_async())
+    assert dag_run.result("tech") == "use a queue "
+    with pytest.raises(RuntimeError, match="BUSINESS agent is down"):
+        dag_run.result("deliver")
+
+    def deliver(chunk):
+        raise ConnectionError("slack is unreachable")
+
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH", fake_astream(ANSWERS), deliver=deliver)
+    dag_run = asyncio.run(plan.run_async())
+    assert dag_run.result("synthesizer") == "ship the queue "
+    with pytest.raises(ConnectionError):
+        dag_run.result("deliver")
+
+
+def test_async_runs_need_coroutine_nodes():
+    plan = build_collaboration_plan("q", "TECH", "BUSINESS", "SYNTH", fake_stream(ANSWERS))
+
+    with pytest.raises(TypeError, match="coroutine"):
+        asyncio.run(plan.run_async())
@@ -0,0 +1,64 @@
+from channel_history import ChannelHistory
+from rolling_summary import ts_key
+
+
+class FakeSlack:
+    """conversations_history over a list of messages, newest first, with cursor pagination."""
+
+    def __init__(self, messages):
+        self.messages = sorted(messages, key=lambda m: ts_key(m["ts"]), reverse=True)
+        self.calls = []
+
+    def conversations_history(self, channel, limit, cursor=None, oldest=None, latest=None):
+        self.calls.append({"limit": limit, "cursor": cursor, "oldest": oldest, "latest": latest})
+        matching = [m for m in self.messages
+                    if (oldest is None or ts_key(m["ts"]) > ts_key(oldest))
+                    and (latest is None or ts_key(m["ts"]) < ts_key(latest))]
+        start = int(cursor or 0)
+        page = matching[start:start + limit]
+        more = start + limit < len(matching)
+        return {"messages": page, "has_more": more,
+                "response_metadata": {"next_cursor": str(start + limit) if more else ""}}
+
+
+def message(i, **extra):
+    return {"ts": f"{1700000000 + i}.000100", "user": f"U{i}", "text": f"message {i}", **extra}
+
+
+def test_messages_are_served_from_the_cache_after_the_first_fetch():
+    slack = FakeSlack([message(i) for i in range(5)])
+    history = ChannelHistory(slack, page_size=2, resync_seconds=300)
+
+    assert [line for _, line in history.messages("C1", 3)] == ["User U2: message 2", "User U3: message 3",
+                                                              "User U4: message 4"]
+    calls = len(slack.calls)
+    assert [line for _, line in history.messages("C1", 2)] == ["User U3: message 3", "User U4: message 4"]
+    assert len(slack.calls) == calls and history.cache_hits == 1
+
+
+def test_events_update_the_cache_but_thread_replies_are_skipped():
+    slack = FakeSlack([message(i) for i in range(3)])
+    history = ChannelHistory(slack, resync_seconds=300)
+    history.messages("C1", 10)
+
+    history.ingest({"channel": "C1", **message(3)})
+    history.ingest({"channel": "C1", **message(4, thread_ts=message(1)["ts"])})     # Reply in a thread
+    history.ingest({"channel": "C1", **message(5, thread_ts=message(5)["ts"])})     # Thread parent
+    history.ingest({"channel": "C1", "subtype": "message_changed", "message": {**message(0), "text": "edited"}})
+    history.ingest({"channel": "C1", "subtype": "message_deleted", "deleted_ts": message(2)["ts"]})
+    history.ingest({"channel": "C1", "subtype": "channel_join", **message(6)})
+
+    assert [line for _, line in history.messages("C1", 10)] == [
+        "User U0: edited", "User U1: message 1", "User U3: message 3", "User U5: message 5"
+    ]
+    assert len(slack.calls) == 1
+
+
+def test_resync_only_fetches_messages_newer_than_the_cursor():
+    slack = FakeSlack([message(i) for i in range(3)])
+    history = ChannelHistory(slack, resync_seconds=0)
+    history.messages("C1", 10)
+    slack.messages.insert(0, message(3))     # Arrived while no event reached us
+
+    assert history.messages("C1", 10)[-1][1] == "User U3: message 3"
+    assert slack.calls[-1]["oldest"] == message(2)["ts"]
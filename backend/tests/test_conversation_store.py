@@ -0,0 +1,30 @@
+from conversation_store import ConversationStore
+
+
+def test_transcript_is_kept_joined_as_the_ring_wraps():
+    store = ConversationStore(max_messages=3)
+    for i in range(5):
+        store.append("C1", f"User U{i}: message {i}")
+
+    assert store.transcript("C1") == "User U2: message 2\nUser U3: message 3\nUser U4: message 4"
+    assert store.transcript("C2") == ""
+
+
+def test_transcript_after_a_sequence_number_is_the_newer_suffix():
+    store = ConversationStore(max_messages=4)
+    seqs = [store.append("C1", f"line {i}") for i in range(6)]
+
+    assert seqs == [1, 2, 3, 4, 5, 6]
+    assert store.transcript("C1", after=4) == "line 4\nline 5"
+    assert store.transcript("C1", after=6) == ""
+    # Older than the ring: everything still held
+    assert store.transcript("C1", after=0) == "line 2\nline 3\nline 4\nline 5"
+
+
+def test_character_caps_drop_the_oldest_lines_first():
+    store = ConversationStore(max_messages=10, max_channel_chars=20)
+    for line in ("aaaaaaaa", "bbbbbbbb", "cccccccc"):
+        store.append("C1", line)
+
+    assert store.transcript("C1") == "bbbbbbbb\ncccccccc"
+    assert store.stats()["chars"] == 16
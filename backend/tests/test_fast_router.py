@@ -0,0 +1,29 @@
+from fast_router import FastRouter
+
+
+def test_keyword_router_never_skips_the_llm_without_a_model():
+    router = FastRouter(model=None, threshold=0.9, audit_rate=0)
+    calls = []
+
+    def llm_route(text):
+        calls.append(text)
+        return "BUSINESS", "llm says so"
+
+    decision, confidence = router.predict("fix the python api bug in the database server")
+    assert decision == "TECH" and confidence < router.threshold
+    assert router.route("fix the python api bug in the database server", llm_route) == (
+        "BUSINESS", "llm says so", "llm")
+    assert len(calls) == 1 and router.llm_fallbacks == 1
+
+
+def test_confident_model_predictions_are_answered_locally():
+    model = {
+        "classes": ["TECH", "BUSINESS", "BOTH"],
+        "class_log_prior": {"TECH": 0.0, "BUSINESS": -9.0, "BOTH": -9.0},
+        "feature_log_prob": {"TECH": {}, "BUSINESS": {}, "BOTH": {}},
+        "unknown_log_prob": {"TECH": -1.0, "BUSINESS": -1.0, "BOTH": -1.0},
+    }
+    router = FastRouter(model=model, threshold=0.9, audit_rate=0)
+
+    decision, _, source = router.route("deploy the new cluster", lambda text: ("BOTH", "unused"))
+    assert (decision, source, router.local_hits) == ("TECH", "local", 1)
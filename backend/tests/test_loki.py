@@ -0,0 +1,146 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import wait_for
+from loki_encoding import FORMAT_JSON, FORMAT_PROTOBUF, encode, protobuf_available
+from loki_exporter import LokiExporter
+
+BATCH = [
+    ({"app": "slack-bot-latency"}, 1_700_000_000_000_000_002, '{"agent": "LLM_Agent"}'),
+    ({"app": "token-tracker"}, 1_700_000_000_500_000_000, '{"Tokens": "Saved"}'),
+    ({"app": "slack-bot-latency"}, 1_700_000_000_000_000_001, '{"agent": "Full_Process"}'),
+]
+
+
+# --- Minimal protobuf reader for logproto.PushRequest ---
+
+def _varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _fields(data):
+    pos = 0
+    while pos < len(data):
+        tag, pos = _varint(data, pos)
+        number, wire_type = tag >> 3, tag & 0x07
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        else:
+            assert wire_type == 2
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield number, value
+
+
+def decode_push_request(data):
+    """{labels string: [(timestamp_ns, line), ...]}"""
+    streams = {}
+    for _, stream in _fields(data):
+        labels, entries = None, []
+        for number, value in _fields(stream):
+            if number == 1:
+                labels = value.decode("utf-8")
+                continue
+            timestamp, line = 0, None
+            for entry_number, entry_value in _fields(value):
+                if entry_number == 1:
+                    parts = dict(_fields(entry_value))
+                    timestamp = parts.get(1, 0) * 1_000_000_000 + parts.get(2, 0)
+                else:
+                    line = entry_value.decode("utf-8")
+            entries.append((timestamp, line))
+        streams[labels] = entries
+    return streams
+
+
+def test_json_groups_streams_and_sorts_entries():
+    body, headers = encode(BATCH, FORMAT_JSON)
+
+    assert headers["Content-Encoding"] == "gzip"
+    streams = {json.dumps(s["stream"]): s["values"] for s in json.loads(gzip.decompress(body))["streams"]}
+    assert streams == {
+        '{"app": "slack-bot-latency"}': [
+            ["1700000000000000001", '{"agent": "Full_Process"}'],
+            ["1700000000000000002", '{"agent": "LLM_Agent"}'],
+        ],
+        '{"app": "token-tracker"}': [["1700000000500000000", '{"Tokens": "Saved"}']],
+    }
+
+
+@pytest.mark.skipif(not protobuf_available(), reason="python-snappy is not installed")
+def test_protobuf_round_trip():
+    import snappy
+
+    batch = BATCH + [({"app": 'quote"d', "env": "prod"}, 5, "línea ✅")]
+    body, headers = encode(batch, FORMAT_PROTOBUF)
+
+    assert headers["Content-Type"] == "application/x-protobuf"
+    assert decode_push_request(snappy.decompress(body)) == {
+        '{app="slack-bot-latency"}': [
+            (1_700_000_000_000_000_001, '{"agent": "Full_Process"}'),
+            (1_700_000_000_000_000_002, '{"agent": "LLM_Agent"}'),
+        ],
+        '{app="token-tracker"}': [(1_700_000_000_500_000_000, '{"Tokens": "Saved"}')],
+        '{app="quote\\"d", env="prod"}': [(5, "línea ✅")],
+    }
+
+
+def _pushed_lines(recorder):
+    lines = []
+    for _, _, body in recorder.requests:
+        for stream in json.loads(gzip.decompress(body))["streams"]:
+            lines.extend(line for _, line in stream["values"])
+    return lines
+
+
+def test_exporter_flushes_full_batches_then_the_rest_on_close(http_server):
+    url, recorder = http_server
+    exporter = LokiExporter(f"{url}/loki/api/v1/push", "user", "token", batch_size=3, flush_interval=60,
+                            push_format=FORMAT_JSON)
+
+    for i in range(7):
+        assert exporter.enqueue({"app": "test"}, i, f"line {i}")
+    # Two full batches go out right away; the seventh record waits for the interval...
+    assert wait_for(lambda: exporter.sent == 6)
+    assert len(recorder.requests) == 2
+
+    # ...or for close(), which flushes it
+    exporter.close()
+    assert exporter.sent == 7 and exporter.failed == 0
+    assert sorted(_pushed_lines(recorder)) == [f"line {i}" for i in range(7)]
+    assert recorder.requests[0][1]["Content-Encoding"] == "gzip"
+    assert not exporter.enqueue({"app": "test"}, 8, "after close")
+
+
+def test_exporter_flushes_a_partial_batch_after_the_interval(http_server):
+    url, recorder = http_server
+    exporter = LokiExporter(f"{url}/loki/api/v1/push", "user", "token", batch_size=500, flush_interval=0.1,
+                            push_format=FORMAT_JSON)
+    try:
+        exporter.enqueue({"app": "test"}, 1, "only line")
+        assert wait_for(lambda: exporter.sent == 1)
+        assert _pushed_lines(recorder) == ["only line"]
+    finally:
+        exporter.close()
+
+
+def test_exporter_counts_rejected_pushes(http_server):
+    url, recorder = http_server
+    recorder.responses["/loki/api/v1/push"] = lambda hit: 500
+    exporter = LokiExporter(f"{url}/loki/api/v1/push", "user", "token", batch_size=2, flush_interval=60,
+                            push_format=FORMAT_JSON)
+
+    exporter.enqueue({"app": "test"}, 1, "a")
+    exporter.enqueue({"app": "test"}, 2, "b")
+    exporter.close()
+
+    assert exporter.sent == 0 and exporter.failed == 2
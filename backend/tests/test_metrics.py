@@ -0,0 +1,66 @@
+from metrics import COUNTER, GAUGE, Registry, cache_family, merge, render
+
+
+def _registry():
+    registry = Registry()
+    registry.counter("test_errors_total", "Errors.", ("service",)).inc(2, service="n8n")
+    registry.gauge("test_depth", "Depth.").set(3.0)
+    histogram = registry.histogram("test_seconds", "Latency.", ("pipeline",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 7.0):
+        histogram.observe(value, pipeline="summarize")
+    return registry
+
+
+def test_render_writes_the_prometheus_text_format():
+    text = render(merge([_registry().snapshot("agent")]))
+
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert lines[:4] == [
+        "# HELP test_depth Depth.",
+        "# TYPE test_depth gauge",
+        'test_depth{process="agent"} 3',
+        "# HELP test_errors_total Errors.",
+    ]
+    assert 'test_errors_total{process="agent",service="n8n"} 2' in lines
+    # Histogram buckets are cumulative and end with +Inf == _count
+    assert lines[-6:] == [
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{pipeline="summarize",process="agent",le="0.1"} 1',
+        'test_seconds_bucket{pipeline="summarize",process="agent",le="1"} 3',
+        'test_seconds_bucket{pipeline="summarize",process="agent",le="+Inf"} 4',
+        'test_seconds_sum{pipeline="summarize",process="agent"} 8.05',
+        'test_seconds_count{pipeline="summarize",process="agent"} 4',
+    ]
+
+
+def test_merge_sums_identical_series_across_snapshots():
+    text = render(merge([_registry().snapshot("server"), _registry().snapshot("server")]))
+
+    assert 'test_errors_total{process="server",service="n8n"} 4' in text
+    assert 'test_seconds_count{pipeline="summarize",process="server"} 8' in text
+    assert 'test_seconds_bucket{pipeline="summarize",process="server",le="1"} 6' in text
+
+
+def test_collectors_label_values_and_hit_ratios():
+    registry = Registry()
+    registry.register_collector(lambda: [
+        cache_family("llm", 3, 1),
+        ("test_queue", GAUGE, "Queue.", [({"name": 'say "hi"\n'}, 1)]),
+        ("test_jobs_total", COUNTER, "Jobs.", [({}, 5)]),
+    ])
+
+    text = render(merge([registry.snapshot("mp3")]))
+
+    assert 'slackbot_cache_lookups_total{cache="llm",process="mp3",result="hit"} 3' in text
+    assert 'slackbot_cache_hit_ratio{cache="llm",process="mp3"} 0.75' in text
+    assert 'test_queue{name="say \\"hi\\"\\n",process="mp3"} 1' in text
+    assert 'test_jobs_total{process="mp3"} 5' in text
+
+
+def test_failing_collector_does_not_break_the_scrape():
+    registry = Registry()
+    registry.counter("test_ok_total", "Ok.").inc()
+    registry.register_collector(lambda: 1 / 0)
+
+    assert 'test_ok_total{process="agent"} 1' in render(merge([registry.snapshot("agent")]))
@@ -0,0 +1,28 @@
+from recap_filter import RecapFilter
+
+# A model that rates every message as a likely recap request
+RECAP_MODEL = {
+    "classes": ["RECAP", "OTHER"],
+    "class_log_prior": {"RECAP": 0.0, "OTHER": -5.0},
+    "feature_log_prob": {"RECAP": {}, "OTHER": {}},
+    "unknown_log_prob": {"RECAP": -1.0, "OTHER": -1.0},
+}
+
+
+def test_recap_cooldown_only_limits_model_passes():
+    recap_filter = RecapFilter(RECAP_MODEL, threshold=0.3, cooldown=60)
+
+    assert recap_filter.check("C1", "what about the launch date") == (True, "model")
+    assert recap_filter.check("C1", "and the pricing page") == (False, "cooldown")
+    # Explicit recap phrasings and mentions are never swallowed by the cooldown
+    assert recap_filter.check("C1", "can you recap this thread as audio") == (True, "rule")
+    assert recap_filter.check("C1", "anything", mentioned=True) == (True, "mention")
+    # The cooldown is per channel
+    assert recap_filter.check("C2", "what about the launch date") == (True, "model")
+    assert recap_filter.stats()["skipped"] == {"filtered": 0, "cooldown": 1}
+
+
+def test_messages_below_the_threshold_are_filtered():
+    recap_filter = RecapFilter(None, threshold=0.3, cooldown=0)
+
+    assert recap_filter.check("C1", "lunch at noon?") == (False, "filtered")
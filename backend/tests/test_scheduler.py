@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from scheduler import AsyncChannelScheduler, ChannelScheduler
+
+# A1..A3 from one busy channel, then B and C: channels take turns, each in arrival order
+SUBMISSIONS = [("A", "A1"), ("A", "A2"), ("A", "A3"), ("B", "B1"), ("B", "B2"), ("C", "C1")]
+ROUND_ROBIN = ["A1", "B1", "C1", "A2", "B2", "A3"]
+
+
+def test_channels_take_turns_round_robin():
+    scheduler = ChannelScheduler(workers=1, max_pending=100, name="test-rr")
+    gate = threading.Event()
+    order = []
+    try:
+        scheduler.submit("gate", gate.wait, 5)   # Holds the only worker while everything is queued
+        for channel, name in SUBMISSIONS:
+            assert scheduler.submit(channel, order.append, name)
+        gate.set()
+    finally:
+        scheduler.close()
+
+    assert order == ROUND_ROBIN
+    assert scheduler.stats()["completed"] == len(SUBMISSIONS) + 1
+
+
+def test_one_job_per_channel_at_a_time():
+    scheduler = ChannelScheduler(workers=4, max_pending=100, name="test-serial")
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def job():
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        threading.Event().wait(0.01)
+        with lock:
+            running["now"] -= 1
+
+    for _ in range(10):
+        scheduler.submit("C1", job)
+    scheduler.close()
+
+    assert running["max"] == 1
+
+
+def test_sheds_once_max_pending_jobs_are_waiting():
+    scheduler = ChannelScheduler(workers=1, max_pending=2, name="test-shed")
+    gate = threading.Event()
+    started = threading.Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    try:
+        assert scheduler.submit("A", blocker)
+        assert started.wait(5)            # Running, so no longer pending
+        assert scheduler.submit("A", lambda: None)
+        assert scheduler.submit("B", lambda: None)
+        assert not scheduler.submit("C", lambda: None)
+        stats = scheduler.stats()
+        assert (stats["queue_depth"], stats["running"], stats["shed"]) == (2, 1, 1)
+    finally:
+        gate.set()
+        scheduler.close()
+
+    stats = scheduler.stats()
+    assert (stats["completed"], stats["failed"], stats["shed"]) == (3, 0, 1)
+    assert not scheduler.submit("A", lambda: None)   # Closed
+
+
+def test_failed_job_does_not_stop_the_channel():
+    scheduler = ChannelScheduler(workers=1, max_pending=10, name="test-fail")
+    done = []
+    scheduler.submit("A", lambda: 1 / 0)
+    scheduler.submit("A", done.append, "next")
+    scheduler.close()
+
+    assert done == ["next"]
+    assert (scheduler.stats()["failed"], scheduler.stats()["completed"]) == (1, 1)
+
+
+def test_async_scheduler_round_robin_and_shedding():
+    async def main():
+        scheduler = AsyncChannelScheduler(workers=1, max_pending=len(SUBMISSIONS) + 1, name="test-async")
+        gate = asyncio.Event()
+        order = []
+
+        async def record(name):
+            order.append(name)
+
+        scheduler.submit("gate", gate.wait)
+        await asyncio.sleep(0)              # The worker picks up the gate job
+        for channel, name in SUBMISSIONS:
+            assert scheduler.submit(channel, record, name)
+        assert scheduler.submit("D", record, "D1")
+        assert not scheduler.submit("E", record, "E1")
+        gate.set()
+        await scheduler.close()
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(main())
+
+    assert order == ["A1", "B1", "C1", "D1", "A2", "B2", "A3"]
+    assert (stats["completed"], stats["shed"], stats["queue_depth"]) == (len(SUBMISSIONS) + 2, 1, 0)
@@ -0,0 +1,100 @@
+import pytest
+
+import llm_cache
+import similarity_cache
+from llm_cache import ResponseCache, lookup_cached, store_cached
+from similarity_cache import SimilarityCache, similarity_target
+
+QUERY = "How do I fix this python api bug in the database code?"
+TRANSCRIPT = "\n".join([
+    "User U1: the launch plan for friday is final, marketing has the assets ready",
+    "User U2: engineering signed off on the release build this morning",
+    "User U3: support docs are published and the faq page is live",
+    "User U4: pricing page goes live at nine with the new annual tier",
+    "User U5: press embargo lifts at ten so the blog post is scheduled",
+])
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """Fresh, memory-only exact and near-duplicate caches behind llm_cache.lookup_cached."""
+    exact, similar = ResponseCache(path=None), SimilarityCache()
+    monkeypatch.setattr(llm_cache, "_cache", exact)
+    monkeypatch.setattr(similarity_cache, "_cache", similar)
+    return exact, similar
+
+
+def request(system, user):
+    return {"model": "gpt-4o", "temperature": 0.5,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}]}
+
+
+def test_near_duplicates_match_above_the_threshold_only():
+    cache = SimilarityCache(threshold=0.8)
+    cache.add("ns", QUERY, "answer")
+
+    # Case, punctuation and mentions are ignored
+    assert cache.lookup("ns", "<@U123> how do I fix this Python API bug in the database code??") == ("answer", 1.0)
+    value, score = cache.lookup("ns", "How do I fix this python api bug in the database layer?")
+    assert value == "answer" and 0.8 <= score < 1.0
+    value, score = cache.lookup("ns", "How do I fix the python api bug in our database code?")
+    assert value is None and score < 0.8
+    assert cache.lookup("ns", "What is our marketing budget for Q3?") == (None, 0.0)
+    assert cache.lookup("other-namespace", QUERY) == (None, 0.0)
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_a_stricter_threshold_rejects_the_same_near_duplicate():
+    cache = SimilarityCache(threshold=0.95)
+    cache.add("ns", QUERY, "answer")
+
+    value, score = cache.lookup("ns", "How do I fix this python api bug in the database layer?")
+    assert value is None and score >= 0.8
+
+
+def test_entries_are_evicted_least_recently_used_first():
+    cache = SimilarityCache(max_entries=2)
+    cache.add("ns", "first question about kubernetes autoscaling", "1")
+    cache.add("ns", "second question about quarterly revenue targets", "2")
+    cache.lookup("ns", "first question about kubernetes autoscaling")      # Now the most recent
+    cache.add("ns", "third question about hiring a data engineer", "3")
+
+    assert cache.lookup("ns", "first question about kubernetes autoscaling")[0] == "1"
+    assert cache.lookup("ns", "second question about quarterly revenue targets")[0] is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_only_short_system_user_requests_are_eligible():
+    assert similarity_target(request("SYSTEM", QUERY))[1] == QUERY
+    assert similarity_target(request("SYSTEM", "x" * 501)) is None
+    assert similarity_target({"model": "gpt-4o", "messages": [{"role": "user", "content": QUERY}]}) is None
+    # Different system prompts (personas) never share answers
+    assert similarity_target(request("TECH", QUERY))[0] != similarity_target(request("BUSINESS", QUERY))[0]
+
+
+def test_lookup_cached_uses_near_matches_only_when_the_call_site_opts_in(caches):
+    kwargs = request("ROUTER", QUERY)
+    key, target, _ = lookup_cached(kwargs, similar=True)
+    store_cached(key, target, '{"decision": "TECH"}')
+
+    rephrased = request("ROUTER", "How do I fix this python api bug in the database layer?")
+    assert lookup_cached(rephrased, similar=True)[2] == '{"decision": "TECH"}'
+    assert lookup_cached(rephrased, similar=False)[2] is None
+
+
+def test_stale_transcript_is_never_answered_by_a_near_match(caches):
+    _, near = caches
+    summary_request = request("SUMMARY", f"TRANSCRIPT:\n{TRANSCRIPT}")
+    key, target, _ = lookup_cached(summary_request, similar=False)
+    store_cached(key, target, "Launch is on for Friday!")
+
+    # One new line flips the right answer...
+    updated = request("SUMMARY", f"TRANSCRIPT:\n{TRANSCRIPT}\nUser U9: actually cancel the launch, legal blocked it")
+    namespace, query = similarity_target(updated)
+    near.add(namespace, f"TRANSCRIPT:\n{TRANSCRIPT}", "Launch is on for Friday!")
+    value, score = near.lookup(namespace, query)
+    assert value is not None and score >= near.threshold   # ...yet the transcripts are near-duplicates
+
+    # The summary call site does not opt in, so only an exact match could answer it
+    assert lookup_cached(updated, similar=False)[2] is None
+    assert lookup_cached(summary_request, similar=False)[2] == "Launch is on for Friday!"
@@ -0,0 +1,69 @@
+from tts import _frame_length, stitch_mp3, strip_mp3_metadata
+
+
+def frame(fill, padding=0, marker=b""):
+    """One MPEG-1 Layer III frame, 128 kbps / 44.1 kHz: 417 bytes (418 with the padding bit)."""
+    header = bytes([0xFF, 0xFB, 0x90 | (padding << 1), 0x64])
+    body = marker + bytes([fill]) * (144 * 128000 // 44100 + padding - 4 - len(marker))
+    return header + body
+
+
+def id3v2(size, footer=False):
+    """An ID3v2.4 tag with `size` bytes of frames (syncsafe size), optionally followed by its footer."""
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    tag = b"ID3\x04\x00" + bytes([0x10 if footer else 0]) + syncsafe + b"\x00" * size
+    return tag + (b"3DI" + b"\x00" * 7 if footer else b"")
+
+
+ID3V1 = b"TAG" + b"\x00" * 125
+# Side-info padding, then the tag an encoder writes into its first (silent) frame
+XING, INFO, NO_TAG = (b"\x00" * 32 + tag for tag in (b"Xing", b"Info", b"data"))
+
+
+def frame_lengths(data):
+    """Walks the data frame by frame; fails if a frame boundary does not hold a valid header."""
+    lengths, pos = [], 0
+    while pos < len(data):
+        length = _frame_length(data, pos)
+        assert length, f"no MP3 frame header at byte {pos}"
+        lengths.append(length)
+        pos += length
+    assert pos == len(data)
+    return lengths
+
+
+def test_frame_length_follows_bitrate_sample_rate_and_padding():
+    assert _frame_length(frame(1), 0) == 417
+    assert _frame_length(frame(1, padding=1), 0) == 418
+    assert _frame_length(b"\x00" * 8, 0) == 0
+    assert _frame_length(bytes([0xFF, 0xFB, 0xF0, 0x64]), 0) == 0   # Bitrate index 15 is invalid
+
+
+def test_strip_drops_id3_tags_and_the_xing_frame():
+    audio = frame(1) + frame(2, padding=1) + frame(3)
+    clip = id3v2(300) + frame(0, marker=XING) + audio + ID3V1
+
+    assert strip_mp3_metadata(clip) == audio
+
+
+def test_strip_handles_an_id3v2_footer_and_plain_clips():
+    audio = frame(4) + frame(5)
+
+    assert strip_mp3_metadata(id3v2(20, footer=True) + audio) == audio
+    assert strip_mp3_metadata(audio) == audio
+    # A first frame without a Xing/Info/VBRI tag is audio and must be kept
+    assert strip_mp3_metadata(frame(6, marker=NO_TAG) + audio) == frame(6, marker=NO_TAG) + audio
+
+
+def test_stitched_clips_are_whole_frames_back_to_back():
+    first = [frame(1), frame(2, padding=1)]
+    second = [frame(3), frame(4), frame(5, padding=1)]
+    clips = [
+        id3v2(100) + frame(0, marker=INFO) + b"".join(first) + ID3V1,
+        id3v2(50) + b"".join(second),
+    ]
+
+    stitched = stitch_mp3(clips)
+
+    assert stitched == b"".join(first + second)
+    assert frame_lengths(stitched) == [417, 418, 417, 417, 418]
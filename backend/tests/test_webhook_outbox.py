@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from conftest import wait_for
+from webhook_outbox import Outbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(path=str(tmp_path / "outbox.sqlite3"), base_backoff=0.05, max_backoff=0.2, max_attempts=3, timeout=2)
+    yield box
+    box.close()
+
+
+def test_transient_failures_are_retried_until_delivered(outbox, http_server):
+    url, recorder = http_server
+    recorder.responses["/flaky"] = lambda hit: 503 if hit < 3 else 200
+
+    row_id = outbox.enqueue(f"{url}/flaky", {"summary": "launch recap", "user_id": "U1"})
+
+    assert wait_for(lambda: outbox.stats()["delivered"] == 1)
+    assert recorder.count("/flaky") == 3
+    assert json.loads(recorder.requests[-1][2]) == {"summary": "launch recap", "user_id": "U1"}
+    assert (outbox.retried, outbox.dead, outbox.due()) == (2, 0, 0)
+    assert row_id == 1
+
+
+def test_permanent_client_errors_are_dead_lettered_at_once(outbox, http_server):
+    url, recorder = http_server
+    recorder.responses["/bad"] = lambda hit: 400
+
+    outbox.enqueue(f"{url}/bad", {"n": 1})
+
+    assert wait_for(lambda: outbox.stats()["dead"] == 1)
+    assert recorder.count("/bad") == 1
+    [dead] = outbox.dead_letters()
+    assert (dead["payload"], dead["attempts"]) == ({"n": 1}, 1)
+    assert dead["last_error"].startswith("HTTP 400")
+
+
+def test_retryable_statuses_are_dead_lettered_after_max_attempts_and_can_be_requeued(outbox, http_server):
+    url, recorder = http_server
+    recorder.responses["/down"] = lambda hit: 429 if hit <= 3 else 200
+
+    row_id = outbox.enqueue(f"{url}/down", {"n": 2})
+
+    assert wait_for(lambda: outbox.stats()["dead"] == 1)
+    assert recorder.count("/down") == 3
+    assert outbox.dead_letters()[0]["attempts"] == 3
+
+    assert outbox.requeue([row_id]) == 1
+    assert wait_for(lambda: outbox.stats()["delivered"] == 1)
+    assert outbox.stats()["dead"] == 0 and recorder.count("/down") == 4
+
+
+def test_pending_rows_survive_a_restart(tmp_path, http_server):
+    url, recorder = http_server
+    path = str(tmp_path / "outbox.sqlite3")
+    recorder.responses["/later"] = lambda hit: 503 if hit == 1 else 200
+
+    first = Outbox(path=path, base_backoff=0.5, max_attempts=5)
+    first.enqueue(f"{url}/later", {"n": 3})
+    assert wait_for(lambda: first.retried == 1)
+    first.close()   # Stops before the retry is due
+
+    # The next process sends what the previous one left pending
+    second = Outbox(path=path, base_backoff=0.5, max_attempts=5)
+    try:
+        assert second.stats()["pending"] == 1
+        second.start()
+        assert wait_for(lambda: second.stats()["delivered"] == 1)
+        assert recorder.count("/later") == 2
+    finally:
+        second.close()
+
+
+def test_batches_are_posted_as_one_json_array(tmp_path, http_server):
+    url, recorder = http_server
+    path = str(tmp_path / "outbox.sqlite3")
+    # A stopped outbox still stores payloads, so the next one finds all three due at once
+    stopped = Outbox(path=path)
+    stopped.close()
+    for i in range(3):
+        stopped.enqueue(f"{url}/batch", {"n": i})
+
+    box = Outbox(path=path, batch_size=10, concurrency=1)
+    try:
+        box.start()
+        assert wait_for(lambda: box.stats()["delivered"] == 3)
+    finally:
+        box.close()
+
+    assert [json.loads(body) for _, _, body in recorder.requests] == [[{"n": 0}, {"n": 1}, {"n": 2}]]
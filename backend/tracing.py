@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from loki_exporter import get_exporter
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# "loki" (default when GRAFANA_URL is set), "stdout", "file", "none", or a name added with register_exporter()
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "loki" if os.environ.get("GRAFANA_URL") else "none")
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(BASE_DIR, "traces.jsonl"))
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_LOKI_LABELS = {"app": "slack-bot-traces"}
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "duration", "attributes", "error", "_t0")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.duration = None
+        self.attributes = attributes
+        self.error = None
+        self._t0 = time.perf_counter()
+        trace._span_started(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace._span_ended(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_s": round(self.duration, 6) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """The spans of one request; exported (if sampled) when the root span ends."""
+
+    def __init__(self, tracer, name, sampled=True):
+        self.tracer = tracer
+        self.name = name
+        self.sampled = sampled
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.root = None
+        self._lock = threading.Lock()
+
+    def _span_started(self, span):
+        for listener in self.tracer.listeners:
+            listener(span, True)
+
+    def _span_ended(self, span):
+        if self.sampled:
+            with self._lock:
+                self.spans.append(span)
+        for listener in self.tracer.listeners:
+            listener(span, False)
+        if span is self.root and self.sampled:
+            self.tracer.export(self)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_s": round(self.root.duration, 6),
+            "error": self.root.error,
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+class _SpanContext:
+    """Context manager for one span; a no-op (span=None) when there is no trace to attach to."""
+
+    __slots__ = ("span", "activate", "_token")
+
+    def __init__(self, span, activate):
+        self.span = span
+        self.activate = activate
+        self._token = None
+
+    def __enter__(self):
+        if self.span is not None and self.activate:
+            self._token = _current.set(self.span)
+        return self.span if self.span is not None else _NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        if self._token is not None:
+            _current.reset(self._token)
+        # A generator closed early (GeneratorExit) is not a failure
+        self.span.end(None if isinstance(exc, GeneratorExit) else exc)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Lightweight in-process tracing. trace() opens a request's root span
+    (new trace id); span() opens a child of the current span, found through
+    a contextvar, so nested helpers need no plumbing. Outside a trace span()
+    costs one contextvar lookup. Finished traces go to `exporter`.
+
+    Span listeners (listener(span, started)) see every span of every trace,
+    sampled or not; metrics.py uses them for its latency histograms.
+    """
+
+    def __init__(self, exporter, sample_rate=TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.listeners = []
+        self.exported = 0
+
+    def trace(self, name, **attributes):
+        sampled = self.exporter is not None and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+        if not sampled and not self.listeners:
+            return _SpanContext(None, False)
+        trace = Trace(self, name, sampled)
+        trace.root = Span(trace, name, None, attributes)
+        return _SpanContext(trace.root, True)
+
+    def span(self, name, activate=True, **attributes):
+        """
+        Child span of the current one. activate=False keeps it from becoming
+        the parent of spans opened meanwhile (for generators that are
+        consumed piecemeal by other code).
+        """
+        parent = _current.get()
+        if parent is None:
+            return _SpanContext(None, False)
+        return _SpanContext(Span(parent.trace, name, parent.span_id, attributes), activate)
+
+    def export(self, trace):
+        self.exported += 1
+        try:
+            self.exporter.export(trace.to_dict())
+        except Exception as e:
+            logging.warning(f"⚠️ Trace export failed: {e}")
+
+
+# --- EXPORTERS ---
+
+class StdoutExporter:
+    def export(self, trace):
+        sys.stdout.write(json.dumps(trace) + "\n")
+        sys.stdout.flush()
+
+
+class FileExporter:
+    """Appends one JSON trace per line."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class LokiTraceExporter:
+    """Hands traces to the shared batching Loki exporter (one log line per trace)."""
+
+    def __init__(self, loki_url, user_id, api_token, labels=TRACE_LOKI_LABELS):
+        self.labels = labels
+        self._exporter = get_exporter(loki_url, user_id, api_token)
+
+    def export(self, trace):
+        self._exporter.enqueue(self.labels, time.time_ns(), json.dumps(trace))
+
+
+def _loki_from_env():
+    url = os.environ.get("GRAFANA_URL")
+    if not url:
+        logging.warning("TRACE_EXPORTER=loki but GRAFANA_URL is not set; tracing disabled.")
+        return None
+    return LokiTraceExporter(url, os.environ.get("GRAFANA_USER_ID"), os.environ.get("GRAFANA_API_TOKEN"))
+
+
+EXPORTERS = {
+    "none": lambda: None,
+    "stdout": StdoutExporter,
+    "file": FileExporter,
+    "loki": _loki_from_env,
+}
+
+
+def register_exporter(name, factory):
+    """Makes TRACE_EXPORTER=<name> use factory() (an object with export(trace_dict))."""
+    EXPORTERS[name] = factory
+
+
+# --- SHARED INSTANCE ---
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                factory = EXPORTERS.get(TRACE_EXPORTER)
+                if factory is None:
+                    logging.warning(f"Unknown TRACE_EXPORTER '{TRACE_EXPORTER}'; tracing disabled.")
+                _tracer = Tracer(factory() if factory else None)
+    return _tracer
+
+
+def add_span_listener(listener):
+    """listener(span, started) is called as every span starts and ends."""
+    tracer = get_tracer()
+    if listener not in tracer.listeners:
+        tracer.listeners.append(listener)
+
+
+def trace(name, **attributes):
+    """Root span of a new trace (one per request)."""
+    return get_tracer().trace(name, **attributes)
+
+
+def span(name, activate=True, **attributes):
+    """Child span of the current span; a no-op outside a trace."""
+    return get_tracer().span(name, activate, **attributes)
+
+
+def traced(name, **attributes):
+    """Decorator: each call of the function (or coroutine function) is the root span of a new trace."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with trace(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace.trace_id if current is not None else None
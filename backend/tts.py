@@ -0,0 +1,258 @@
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+from metrics import EXTERNAL_ERRORS, EXTERNAL_RETRIES
+from tracing import span
+from tts_cache import audio_key, get_audio_cache
+
+load_dotenv()
+
+# --- ELEVENLABS CONFIG ---
+ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
+ELEVENLABS_BASE_URL = os.environ.get("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+ELEVENLABS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM" # Example Voice ID
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+ELEVENLABS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.5}
+TTS_TIMEOUT = 30
+
+# --- PIPELINE CONFIG ---
+TTS_CHUNK_CHARS = int(os.environ.get("TTS_CHUNK_CHARS", "300"))   # Target size of one synthesis request
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "4"))             # Chunks synthesized at once
+TTS_CHUNK_TIMEOUT = float(os.environ.get("TTS_CHUNK_TIMEOUT", "20"))
+TTS_CHUNK_RETRIES = int(os.environ.get("TTS_CHUNK_RETRIES", "2"))  # Extra attempts per failed chunk
+RETRY_BACKOFF = 0.5
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|(?<=[.!?…][\"')\]])\s+|\n+")
+_PROSODY_RE = re.compile(r"(?<=[,;:—–])\s+")
+
+
+def tts_request(text_content, voice_id=ELEVENLABS_VOICE_ID, previous_text=None, next_text=None):
+    """Returns (url, headers, payload) for one ElevenLabs text-to-speech call."""
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{voice_id}"
+    headers = {
+        "xi-api-key": ELEVENLABS_API_KEY,
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "text": text_content,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": ELEVENLABS_VOICE_SETTINGS
+    }
+    # Neighbouring text keeps intonation continuous across separately rendered chunks
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+    return url, headers, payload
+
+
+# --- SPLITTING ---
+
+def _pieces(text, pattern, max_chars):
+    """Splits text at `pattern`, falling back to word boundaries for overlong pieces."""
+    for piece in pattern.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if len(piece) <= max_chars:
+            yield piece
+            continue
+        if pattern is _SENTENCE_RE:
+            yield from _pieces(piece, _PROSODY_RE, max_chars)
+            continue
+        line = ""
+        for word in piece.split():
+            if line and len(line) + 1 + len(word) > max_chars:
+                yield line
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            yield line
+
+
+def split_for_tts(text, max_chars=TTS_CHUNK_CHARS):
+    """
+    Splits text into chunks of at most ~max_chars at sentence boundaries (then
+    clause boundaries, then words), packing short sentences together so the
+    voice keeps its rhythm and the request count stays low.
+    """
+    chunks = []
+    current = ""
+    for piece in _pieces(text, _SENTENCE_RE, max_chars):
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- MP3 STITCHING ---
+
+_BITRATES = {  # kbps, Layer III, indexed by the header's bitrate index
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _frame_length(data, pos):
+    """Length of the MPEG Layer III frame starting at `pos`, or 0 if there is none."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return 0
+    version = (data[pos + 1] >> 3) & 0x03       # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    layer = (data[pos + 1] >> 1) & 0x03         # 1 = Layer III
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    padding = (data[pos + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+
+def strip_mp3_metadata(data):
+    """
+    Returns just the audio frames of an MP3: drops the ID3v2 header, a leading
+    Xing/Info/VBRI frame (its length/seek table would be wrong for the stitched
+    clip) and a trailing ID3v1 tag.
+    """
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data) - 128 if len(data) - start >= 128 and data[-128:-125] == b"TAG" else len(data)
+
+    length = _frame_length(data, start)
+    if length and start + length <= end:
+        header = data[start:start + min(length, 64)]
+        if b"Xing" in header or b"Info" in header or b"VBRI" in header:
+            start += length
+    return data[start:end]
+
+
+def stitch_mp3(parts):
+    """Concatenates MP3 clips frame-wise, without re-encoding."""
+    return b"".join(strip_mp3_metadata(part) for part in parts)
+
+
+# --- SYNTHESIS ---
+
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=TTS_WORKERS * 2))
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=TTS_WORKERS * 2))
+_stats_lock = threading.Lock()
+stats = {"clips": 0, "chunks": 0, "chunk_retries": 0, "failed_clips": 0}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        stats[name] += amount
+
+
+def synthesize_chunk(text, previous_text=None, next_text=None, voice_id=ELEVENLABS_VOICE_ID,
+                     retries=TTS_CHUNK_RETRIES, timeout=TTS_CHUNK_TIMEOUT):
+    """One ElevenLabs call with its own retries; returns MP3 bytes or None."""
+    url, headers, payload = tts_request(text, voice_id, previous_text, next_text)
+    for attempt in range(retries + 1):
+        if attempt:
+            _count("chunk_retries")
+            EXTERNAL_RETRIES.inc(service="elevenlabs")
+            time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            response = _session.post(url, json=payload, headers=headers, timeout=timeout)
+            if response.status_code == 200:
+                return response.content
+            logging.error(f"ElevenLabs Error [{response.status_code}]: {response.text[:200]}")
+            EXTERNAL_ERRORS.inc(service="elevenlabs")
+            if response.status_code in (400, 401, 403, 422):
+                return None  # Retrying will not help
+        except Exception as e:
+            logging.error(f"ElevenLabs connection failed: {e}")
+            EXTERNAL_ERRORS.inc(service="elevenlabs")
+    return None
+
+
+def clip_key(text, voice_id=ELEVENLABS_VOICE_ID):
+    return audio_key(text, voice_id, ELEVENLABS_MODEL_ID, ELEVENLABS_VOICE_SETTINGS)
+
+
+def synthesize_speech(text_content, voice_id=ELEVENLABS_VOICE_ID, max_chars=TTS_CHUNK_CHARS, workers=TTS_WORKERS):
+    """
+    Renders text as one MP3: the text is split into sentence-aligned chunks,
+    up to `workers` chunks are synthesized at once (each retried on its own)
+    and the results are stitched in order. Returns None if any chunk fails.
+
+    Whole clips and individual chunks are looked up in the audio cache first
+    (keyed by text + voice + model + settings, not by the neighbouring text),
+    so repeated summaries and recurring sentences skip ElevenLabs entirely.
+    """
+    with span("tts", chars=len(text_content)) as s:
+        audio = _synthesize_speech(text_content, voice_id, max_chars, workers, s)
+        s.set(bytes=len(audio) if audio else 0)
+        return audio
+
+
+def _synthesize_speech(text_content, voice_id, max_chars, workers, s):
+    cache = get_audio_cache()
+    key = clip_key(text_content, voice_id)
+    if cache is not None:
+        audio = cache.get(key)
+        if audio is not None:
+            s.set(cache_hit=True)
+            return audio
+
+    chunks = split_for_tts(text_content, max_chars)
+    if not chunks:
+        return None
+    _count("clips")
+    _count("chunks", len(chunks))
+    s.set(cache_hit=False, chunks=len(chunks))
+
+    def render(i):
+        with span("tts.chunk", index=i, chars=len(chunks[i])) as chunk_span:
+            chunk_key = clip_key(chunks[i], voice_id)
+            if cache is not None:
+                audio = cache.get(chunk_key)
+                if audio is not None:
+                    chunk_span.set(cache_hit=True)
+                    return audio
+            previous_text = chunks[i - 1] if i > 0 else None
+            next_text = chunks[i + 1] if i + 1 < len(chunks) else None
+            audio = synthesize_chunk(chunks[i], previous_text, next_text, voice_id)
+            if cache is not None and audio is not None:
+                cache.set(chunk_key, audio)
+            chunk_span.set(cache_hit=False, ok=audio is not None)
+            return audio
+
+    if len(chunks) == 1:
+        parts = [render(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix="tts") as pool:
+            # One context copy per task (a context cannot be entered by two threads at once)
+            futures = [pool.submit(contextvars.copy_context().run, render, i) for i in range(len(chunks))]
+            parts = [future.result() for future in futures]
+
+    if any(part is None for part in parts):
+        _count("failed_clips")
+        logging.error(f"TTS failed for {sum(part is None for part in parts)}/{len(parts)} chunks")
+        return None
+    if len(parts) == 1:
+        return parts[0]  # Cached under the same key as its only chunk
+
+    audio = stitch_mp3(parts)
+    if cache is not None:
+        cache.set(key, audio)
+    return audio
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from metrics import cache_family, register_collector
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE_ENABLED", "1") != "0"
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(BASE_DIR, "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def audio_key(text, voice_id, model_id, voice_settings):
+    """Content address of a rendered clip: everything that changes the audio."""
+    material = json.dumps(
+        {"text": text, "voice_id": voice_id, "model_id": model_id, "voice_settings": voice_settings},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Content-addressed MP3 store on disk (one file per key, fanned out into
+    256 sub-directories). An in-memory index keeps LRU order and the total
+    size; the least recently used clips are deleted once `max_bytes` is
+    exceeded. Hits are served as read-only mmaps, so a clip is paged in by
+    the kernel rather than copied into the Python heap.
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()   # key -> size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        register_collector(self.collect_metrics)
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _load_index(self):
+        """Rebuilds the LRU index from disk, ordered by last access (mtime)."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        self._evict()
+
+    def get(self, key):
+        """Returns the clip as a read-only mmap, or None."""
+        with self._lock:
+            size = self._index.get(key)
+            if size is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)  # Persist the LRU position across restarts
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ TTS cache read failed ({e}); dropping {key[:12]}")
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._bytes -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"⚠️ TTS cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": len(self._index),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+        }
+
+    def collect_metrics(self):
+        return [cache_family("tts", self.hits, self.misses)]
+
+
+# --- SHARED INSTANCE ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """The process-wide AudioCache, or None when TTS_CACHE_ENABLED=0."""
+    global _cache
+    if not TTS_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AudioCache()
+    return _cache
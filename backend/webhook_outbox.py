@@ -0,0 +1,403 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from metrics import COUNTER, GAUGE, EXTERNAL_ERRORS, EXTERNAL_RETRIES, register_collector
+
+load_dotenv()
+
+# --- CONFIG ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", os.path.join(BASE_DIR, "webhook_outbox.sqlite3"))
+CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", "4"))            # Deliveries in flight at once
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))          # Then the payload is dead-lettered
+BASE_BACKOFF = float(os.environ.get("OUTBOX_BASE_BACKOFF", "2"))        # Seconds before the first retry, doubling
+MAX_BACKOFF = float(os.environ.get("OUTBOX_MAX_BACKOFF", "600"))
+REQUEST_TIMEOUT = float(os.environ.get("OUTBOX_TIMEOUT", "10"))
+# >1 posts up to this many queued payloads for the same URL as one JSON array (batch-capable endpoints only)
+BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "1"))
+RETENTION = float(os.environ.get("OUTBOX_RETENTION", str(7 * 24 * 3600)))  # Delivered rows are kept this long
+IDLE_POLL = 5.0            # Seconds between scans when nothing is due (enqueue wakes the dispatcher anyway)
+PRUNE_EVERY = 500          # Prune delivered rows every N deliveries
+PERMANENT_STATUSES = range(400, 500)
+RETRYABLE_STATUSES = (408, 425, 429)
+
+PENDING, DELIVERED, DEAD = "pending", "delivered", "dead"
+
+
+class Outbox:
+    """
+    Durable outbox for webhook deliveries. enqueue() only inserts the payload
+    into a local SQLite table (WAL, one fsync-free write), so the caller never
+    waits on the receiver. A dispatcher thread hands due rows to a small pool
+    that POSTs them over one pooled session:
+
+    - 2xx: delivered
+    - other 4xx (except 408/425/429): dead-lettered at once, retrying will not help
+    - 5xx, 408/425/429, timeouts, connection errors: retried with exponential
+      backoff and jitter (Retry-After is honoured), dead-lettered after
+      `max_attempts`
+
+    Rows survive restarts: anything still pending when the process stops is
+    sent by the next one. Delivery is at-least-once; a crash between the POST
+    and the status update sends that payload again.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, concurrency=CONCURRENCY, max_attempts=MAX_ATTEMPTS,
+                 base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF, timeout=REQUEST_TIMEOUT,
+                 batch_size=BATCH_SIZE, retention=RETENTION):
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.batch_size = max(batch_size, 1)
+        self.retention = retention
+
+        self._db = self._open(path)
+        self._lock = threading.Lock()           # Guards the connection and _in_flight
+        self._in_flight = set()                 # Row ids handed to the pool
+        self._busy = 0                          # Deliveries (batches) handed to the pool
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher = None
+        self._pool = None
+        self._deliveries = 0
+
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency))
+        self._session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency))
+
+        # Counters (read them for debugging / health checks)
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        register_collector(self.collect_metrics)
+
+    @staticmethod
+    def _open(path):
+        try:
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Webhook outbox at {path} unavailable ({e}); queued payloads will not survive a restart.")
+            db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL, status TEXT NOT NULL DEFAULT 'pending',"
+            " last_error TEXT, delivered_at REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt_at)")
+        return db
+
+    # --- PRODUCER SIDE ---
+
+    def enqueue(self, url, payload):
+        """Stores the payload for delivery and returns its row id; never touches the network."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (url, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(payload), now, now),
+            )
+            self.enqueued += 1
+        self._ensure_dispatcher()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None:
+            with self._lock:
+                if self._dispatcher is None and not self._stop.is_set():
+                    self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox")
+                    self._dispatcher = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+                    self._dispatcher.start()
+                    atexit.register(self.close)
+
+    def start(self):
+        """Starts delivering rows left over from a previous run without waiting for a new enqueue()."""
+        self._ensure_dispatcher()
+        self._wake.set()
+
+    # --- DISPATCHER ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()   # Before the scan, so an enqueue() during it is not missed
+            try:
+                wait = self._dispatch_due()
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Webhook outbox scan failed: {e}")
+                wait = IDLE_POLL
+            self._wake.wait(wait)
+
+    def _dispatch_due(self):
+        """Hands due rows to the pool (up to the free slots); returns how long to sleep."""
+        now = time.time()
+        with self._lock:
+            free = self.concurrency - self._busy
+            if free <= 0:
+                return IDLE_POLL   # A finishing delivery wakes us
+            rows = self._db.execute(
+                "SELECT id, url, payload, attempts FROM outbox WHERE status = ? AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at, id LIMIT ?",
+                (PENDING, now, free * self.batch_size + len(self._in_flight)),
+            ).fetchall()
+            rows = [row for row in rows if row[0] not in self._in_flight]
+
+            batches = []
+            by_url = {}
+            for row in rows:
+                batch = by_url.get(row[1])
+                if batch is None or len(batch) >= self.batch_size:
+                    if len(batches) >= free:
+                        continue
+                    batch = by_url[row[1]] = []
+                    batches.append(batch)
+                batch.append(row)
+            for batch in batches:
+                self._in_flight.update(row[0] for row in batch)
+            self._busy += len(batches)
+
+            (next_due,) = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ? AND next_attempt_at > ?", (PENDING, now)
+            ).fetchone()
+
+        for batch in batches:
+            try:
+                self._pool.submit(self._deliver, batch)
+            except RuntimeError:   # close() shut the pool down meanwhile; the rows stay pending
+                self._release([row[0] for row in batch])
+        if len(rows) > sum(len(batch) for batch in batches):
+            return IDLE_POLL
+        return min(IDLE_POLL, next_due - now) if next_due is not None else IDLE_POLL
+
+    def _deliver(self, batch):
+        ids = [row[0] for row in batch]
+        url = batch[0][1]
+        payloads = [json.loads(row[2]) for row in batch]
+        body = payloads if self.batch_size > 1 else payloads[0]
+        retry_after = None
+        try:
+            response = self._session.post(url, json=body, timeout=self.timeout)
+            if 200 <= response.status_code < 300:
+                self._mark_delivered(ids)
+                return
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            permanent = response.status_code in PERMANENT_STATUSES and response.status_code not in RETRYABLE_STATUSES
+            retry_after = _retry_after(response)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            permanent = False
+        except BaseException:
+            self._release(ids)
+            raise
+
+        EXTERNAL_ERRORS.inc(service="n8n")
+        logging.error(f"n8n delivery failed ({len(ids)} payload(s)): {error}")
+        self._mark_failed(batch, error, permanent, retry_after)
+
+    def _mark_delivered(self, ids):
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "UPDATE outbox SET status = ?, delivered_at = ?, last_error = NULL WHERE id = ?",
+                    [(DELIVERED, now, row_id) for row_id in ids],
+                )
+                self.delivered += len(ids)
+                self._deliveries += len(ids)
+                if self._deliveries >= PRUNE_EVERY:
+                    self._deliveries = 0
+                    self._db.execute("DELETE FROM outbox WHERE status = ? AND delivered_at < ?",
+                                     (DELIVERED, now - self.retention))
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Webhook outbox update failed (payloads may be sent again): {e}")
+            finally:
+                self._finished(ids)
+        self._wake.set()
+
+    def _mark_failed(self, batch, error, permanent, retry_after):
+        now = time.time()
+        updates = []
+        for row_id, _, _, attempts in batch:
+            attempts += 1
+            if permanent or attempts >= self.max_attempts:
+                updates.append((DEAD, attempts, now, error, row_id))
+                continue
+            delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+            delay = max(delay * (0.5 + random.random()), retry_after or 0)   # Jitter so retries don't stampede
+            updates.append((PENDING, attempts, now + delay, error, row_id))
+
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    updates,
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Webhook outbox update failed: {e}")
+            finally:
+                self._finished([row[-1] for row in updates])
+        for status, attempts, _, _, row_id in updates:
+            if status == DEAD:
+                self.dead += 1
+                logging.error(f"n8n payload {row_id} dead-lettered after {attempts} attempt(s): {error}")
+            else:
+                self.retried += 1
+                EXTERNAL_RETRIES.inc(service="n8n")
+        self._wake.set()
+
+    def _finished(self, ids):
+        # Caller holds the lock
+        self._in_flight.difference_update(ids)
+        self._busy -= 1
+
+    def _release(self, ids):
+        with self._lock:
+            self._finished(ids)
+
+    # --- READING / REPAIR ---
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            in_flight = len(self._in_flight)
+        return {
+            "pending": counts.get(PENDING, 0),
+            "delivered": counts.get(DELIVERED, 0),
+            "dead": counts.get(DEAD, 0),
+            "in_flight": in_flight,
+            "enqueued": self.enqueued,
+            "retried": self.retried,
+        }
+
+    def due(self):
+        """Pending rows whose next attempt is due, plus deliveries in flight."""
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ? AND next_attempt_at <= ?", (PENDING, time.time())
+            ).fetchone()
+            return count + len(self._in_flight)
+
+    def dead_letters(self, limit=50):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, url, payload, attempts, last_error, created_at FROM outbox WHERE status = ?"
+                " ORDER BY id DESC LIMIT ?",
+                (DEAD, limit),
+            ).fetchall()
+        return [
+            {"id": row_id, "url": url, "payload": json.loads(payload), "attempts": attempts,
+             "last_error": last_error, "created_at": created_at}
+            for row_id, url, payload, attempts, last_error, created_at in rows
+        ]
+
+    def requeue(self, ids=None):
+        """Moves dead-lettered rows (all, or the given ids) back to pending with fresh attempts."""
+        now = time.time()
+        with self._lock:
+            if ids:
+                cursor = self._db.executemany(
+                    "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE id = ? AND status = ?",
+                    [(PENDING, now, row_id, DEAD) for row_id in ids],
+                )
+            else:
+                cursor = self._db.execute(
+                    "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+                    (PENDING, now, DEAD),
+                )
+        self._wake.set()
+        return cursor.rowcount
+
+    def collect_metrics(self):
+        stats = self.stats()
+        return [
+            ("slackbot_webhook_outbox_rows", GAUGE, "Webhook outbox rows by status.",
+             [({"status": status}, stats[status]) for status in (PENDING, DELIVERED, DEAD)]),
+            ("slackbot_webhook_outbox_in_flight", GAUGE, "Webhook deliveries currently in flight.",
+             [({}, stats["in_flight"])]),
+            ("slackbot_webhook_outbox_enqueued_total", COUNTER, "Payloads written to the webhook outbox.",
+             [({}, stats["enqueued"])]),
+        ]
+
+    def close(self, timeout=REQUEST_TIMEOUT):
+        """Stops dispatching and waits (up to `timeout`) for in-flight deliveries; pending rows stay on disk."""
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+# --- SHARED INSTANCE ---
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox()
+    return _outbox
+
+
+# --- CLI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and repair the n8n webhook outbox.")
+    parser.add_argument("--path", default=OUTBOX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats", help="Row counts by status")
+    dead_cmd = sub.add_parser("dead", help="List dead-lettered payloads")
+    dead_cmd.add_argument("-n", "--limit", type=int, default=20)
+    requeue_cmd = sub.add_parser("requeue", help="Retry dead-lettered payloads (all, or the given ids)")
+    requeue_cmd.add_argument("ids", nargs="*", type=int)
+    sub.add_parser("drain", help="Deliver everything that is due now, then exit")
+
+    args = parser.parse_args()
+    outbox = Outbox(path=args.path)
+
+    if args.command == "stats":
+        print(json.dumps(outbox.stats(), indent=2))
+    elif args.command == "dead":
+        for entry in outbox.dead_letters(args.limit):
+            print(f"#{entry['id']} attempts={entry['attempts']} {entry['url']}\n  {entry['last_error']}")
+    elif args.command == "requeue":
+        print(f"Requeued {outbox.requeue(args.ids)} payload(s).")
+    else:
+        outbox.start()
+        while outbox.due():
+            time.sleep(0.5)
+        outbox.close()
+        print(json.dumps(outbox.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()